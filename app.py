@@ -1,11 +1,45 @@
-from flask import Flask, request, jsonify
+import os
+import json
+import threading
+from flask import Flask, Response, request, jsonify
 from controller.instagram_scrap import InstagramScraperController
+from service.llm_scrap.streaming import get_partial_result_broker
+from service.metrics_service import MetricsService
+from service.event_loop import get_background_loop
+from service.jobs.workers import get_job_workers
+from controller.instagram_scrap import BULK_SCRAPE_CONCURRENCY
+from exceptions.common import DeadlineExceededException, SingleFlightTimeoutException
+
+# Largest list of URLs, and highest concurrency, a bulk scrape request may ask for.
+BULK_SCRAPE_MAX_URLS = int(os.environ.get('BULK_SCRAPE_MAX_URLS', 10000))
+BULK_SCRAPE_MAX_CONCURRENCY = int(os.environ.get('BULK_SCRAPE_MAX_CONCURRENCY', 32))
 
 app = Flask(__name__)
 
 controller = InstagramScraperController()
 
 
+def _scrape_instagram_post_job(payload, on_stage):
+    return controller.scrape_instagram_post(payload['post_url'], payload['trace_id'], on_stage=on_stage).to_dict()
+
+
+JOB_HANDLERS = {'scrape_instagram_post': _scrape_instagram_post_job}
+
+
+def _job_workers():
+    """
+    The process's job worker pool, started on first use rather than at import:
+    processes that only import the app (the HTML worker farm's children) must
+    not claim jobs.
+    """
+    return get_job_workers(JOB_HANDLERS)
+
+
+@app.before_request
+def _start_job_workers():
+    _job_workers()
+
+
 @app.route('/api/scrape_instagram_post', methods=['POST'])
 def scrape_instagram_post():
     """
@@ -14,11 +48,14 @@ def scrape_instagram_post():
     Request JSON structure:
     {
         "post_url": "string",
-        "trace_id": "string"
+        "trace_id": "string",
+        "stream": false
     }
 
     Returns:
-        JSON containing the extracted post data or an error message.
+        JSON containing the extracted post data or an error message. With
+        "stream": true, NDJSON lines: one {"field", "value"} per post field as
+        soon as it is extracted, then the final success or error object.
     """
     try:
         # Parse JSON request
@@ -29,6 +66,9 @@ def scrape_instagram_post():
         post_url = data['post_url']
         trace_id = data['trace_id']
 
+        if data.get('stream'):
+            return _stream_scrape(post_url, trace_id)
+
         # Scrape the Instagram post
         extracted_data = controller.scrape_instagram_post(post_url, trace_id)
 
@@ -37,9 +77,210 @@ def scrape_instagram_post():
 
     except Exception as e:
         # Handle errors
-        return jsonify({"status": "error", "message": str(e)}), 500
+        return jsonify({"status": "error", "message": str(e)}), _error_status(e)
+
+
+# Model calls that ran out of time, or waits on another request's scrape of the same post.
+_TIMEOUT_ERRORS = (SingleFlightTimeoutException, DeadlineExceededException)
+
+
+def _error_status(e):
+    """
+    Errors caused by one of `_TIMEOUT_ERRORS` are reported as a gateway timeout.
+    """
+    seen = set()
+    while e is not None and id(e) not in seen:
+        if isinstance(e, _TIMEOUT_ERRORS):
+            return 504
+        seen.add(id(e))
+        e = e.__cause__ or e.__context__
+    return 500
+
+
+def _error_type_status(error_type):
+    """
+    `_error_status` for an error known only by its class name, as stored for a failed job.
+    """
+    return 504 if error_type in {cls.__name__ for cls in _TIMEOUT_ERRORS} else 500
+
+
+@app.route('/api/scrape_instagram_post/<trace_id>/progress', methods=['GET'])
+def scrape_instagram_post_progress(trace_id):
+    """
+    Endpoint streaming the partial results of an in-flight streamed scrape.
+
+    Returns:
+        NDJSON lines, starting with the fields extracted so far, or 404 when no
+        streamed scrape is running under `trace_id`.
+    """
+    broker = get_partial_result_broker()
+    events = broker.subscribe(trace_id)
+    if events is None:
+        return jsonify({"status": "error", "message": f"No streamed scrape running for {trace_id}."}), 404
+    return Response(_ndjson(broker.listen(events)), mimetype='application/x-ndjson')
+
+
+@app.route('/api/scrape_instagram_posts', methods=['POST'])
+def scrape_instagram_posts():
+    """
+    Endpoint to scrape many Instagram posts under one trace ID.
+
+    Request JSON structure:
+    {
+        "post_urls": ["string"],
+        "trace_id": "string",
+        "concurrency": 8
+    }
+
+    or a multipart form with a `trace_id` field and a `file` of URLs, one per line.
+
+    Returns:
+        NDJSON lines, one per URL as soon as its post is scraped: {"index", "url",
+        "status": "success", "data"} or {"index", "url", "status": "error", "message"};
+        one per BigQuery insert ({"status": "stored", "ids"} or an error with
+        "stage": "store"); then {"status": "done"} with the counts.
+    """
+    if 'file' in request.files:
+        trace_id = request.form.get('trace_id')
+        post_urls = _read_urls(request.files['file'].read().decode('utf-8', errors='replace'))
+        concurrency = request.form.get('concurrency', type=int)
+    else:
+        data = request.get_json(silent=True) or {}
+        trace_id = data.get('trace_id')
+        post_urls = data.get('post_urls')
+        concurrency = data.get('concurrency')
+
+    invalid = _invalid_bulk_request(trace_id, post_urls)
+    if invalid:
+        return jsonify({"error": invalid[0]}), invalid[1]
+
+    events = get_background_loop().iterate(
+        controller.astream_instagram_posts(post_urls, trace_id, concurrency=_bulk_concurrency(concurrency)))
+    return Response(_ndjson(events), mimetype='application/x-ndjson')
+
+
+def _invalid_bulk_request(trace_id, post_urls):
+    """
+    Returns:
+        The error message and status of an invalid bulk request, None for a valid one.
+    """
+    if not trace_id or not isinstance(post_urls, list) or not post_urls \
+            or not all(isinstance(post_url, str) for post_url in post_urls):
+        return "Invalid request. 'trace_id' and a non-empty 'post_urls' list or 'file' are required.", 400
+    if len(post_urls) > BULK_SCRAPE_MAX_URLS:
+        return f"Too many URLs, at most {BULK_SCRAPE_MAX_URLS} per request.", 413
+    return None
+
+
+def _bulk_concurrency(concurrency):
+    return max(1, min(int(concurrency or BULK_SCRAPE_CONCURRENCY), BULK_SCRAPE_MAX_CONCURRENCY))
+
+
+def _read_urls(text):
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.lstrip().startswith('#')]
+
+
+def _stream_scrape(post_url, trace_id):
+    """
+    Run the scrape on a worker thread, publishing each field to the partial
+    result broker, and stream the published events back as NDJSON.
+    """
+    broker = get_partial_result_broker()
+    broker.open(trace_id)
+    events = broker.subscribe(trace_id)
+
+    def run():
+        try:
+            post_model = controller.scrape_instagram_post(
+                post_url, trace_id,
+                on_field=lambda field, value: broker.publish(trace_id, {"field": field, "value": value}))
+            broker.publish(trace_id, {"status": "success", "data": post_model.to_dict()})
+        except Exception as e:
+            broker.publish(trace_id, {"status": "error", "message": str(e)})
+        finally:
+            broker.close(trace_id)
+
+    threading.Thread(target=run, name=f'scrape-{trace_id}', daemon=True).start()
+    return Response(_ndjson(broker.listen(events)), mimetype='application/x-ndjson')
+
+
+def _ndjson(events):
+    for event in events:
+        yield json.dumps(event, default=str) + '\n'
+
+
+@app.route('/api/jobs/scrape_instagram_post', methods=['POST'])
+def submit_scrape_instagram_post_job():
+    """
+    Endpoint queueing the scrape of an Instagram post for the background workers.
+
+    Request JSON structure:
+    {
+        "post_url": "string",
+        "trace_id": "string"
+    }
+
+    Returns:
+        202 with the job's ID, stage and the URLs to poll for its status and result.
+    """
+    data = request.get_json(silent=True)
+    if not data or 'post_url' not in data or 'trace_id' not in data:
+        return jsonify({"error": "Invalid request. 'post_url' and 'trace_id' are required."}), 400
+
+    job = _job_workers().submit('scrape_instagram_post', {"post_url": data['post_url'], "trace_id": data['trace_id']},
+                                trace_id=data['trace_id'])
+    return jsonify({"status": "success", "data": {
+        **job.to_dict(),
+        "status_url": f"/api/jobs/{job.id}",
+        "result_url": f"/api/jobs/{job.id}/result",
+    }}), 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Endpoint reporting a job's status, current stage and the time spent in each stage.
+
+    Returns:
+        JSON with the job's state, or 404 for an unknown (or expired) job.
+    """
+    job = _job_workers().get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"No job {job_id}."}), 404
+    return jsonify({"status": "success", "data": job.to_dict()}), 200
+
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """
+    Endpoint returning the result of a finished job.
+
+    Returns:
+        The post data once the job succeeded, its error once it failed (504 when it
+        ran out of time, 500 otherwise), or
+        202 with the job's state while it is queued or running.
+    """
+    job = _job_workers().get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"No job {job_id}."}), 404
+    if not job.done:
+        return jsonify({"status": job.status, "data": job.to_dict()}), 202
+    if job.error is not None:
+        return jsonify({"status": "error", "message": job.error, "data": job.to_dict()}), _error_type_status(job.error_type)
+    return jsonify({"status": "success", "data": job.result}), 200
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """
+    Endpoint exposing runtime stats of the scraping pipeline (browser pool, caches, ...).
+
+    Returns:
+        JSON mapping each registered component to its stats.
+    """
+    return jsonify({"status": "success", "data": MetricsService.snapshot()}), 200
 
 
-# Run the Flask application
+# Run the Flask development server; production serving goes through asgi.py
 if __name__ == "__main__":
-    app.run(debug=True)
+    app.run(debug=os.environ.get('FLASK_DEBUG', 'false').lower() == 'true')
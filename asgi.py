@@ -0,0 +1,213 @@
+"""
+Production entry point: serves the app with uvicorn.
+
+The scrape endpoints are answered natively on the event loop, awaiting page
+fetches and model calls instead of holding a thread per request; every other
+route is served by the Flask app on a thread pool.
+
+    python asgi.py
+
+or, with any ASGI server, `asgi:application`.
+"""
+import os
+import json
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+import uvicorn
+from a2wsgi import WSGIMiddleware
+
+from app import app, controller, _bulk_concurrency, _error_status, _invalid_bulk_request, _job_workers
+
+HOST = os.environ.get('HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', 8080))
+# Server processes; each has its own event loop, Flask threads and job workers.
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+# Threads per process serving the Flask routes.
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 32))
+# Seconds an idle client connection is kept open; keep it above the load balancer's.
+KEEP_ALIVE_TIMEOUT = int(os.environ.get('KEEP_ALIVE_TIMEOUT', 75))
+# Seconds in-flight requests and running jobs get to finish after SIGTERM.
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.environ.get('GRACEFUL_SHUTDOWN_TIMEOUT', 30))
+# Concurrent connections per process before new ones are answered 503; unset for no limit.
+LIMIT_CONCURRENCY = int(os.environ['LIMIT_CONCURRENCY']) if os.environ.get('LIMIT_CONCURRENCY') else None
+BACKLOG = int(os.environ.get('BACKLOG', 2048))
+
+logger = logging.getLogger(__name__)
+
+Send = Callable[[dict], Awaitable[None]]
+Receive = Callable[[], Awaitable[dict]]
+
+
+class ScraperASGIApp():
+    """
+    ASGI application answering JSON requests to the scrape endpoints with the
+    controller's async pipeline and handing everything else (streamed scrapes,
+    file uploads, jobs, metrics) to the WSGI app. Starts the job workers on
+    lifespan startup and stops them on shutdown.
+    """
+
+    def __init__(self, wsgi_app, threads: int = WSGI_THREADS) -> None:
+        self.wsgi = WSGIMiddleware(wsgi_app, workers=threads)
+        self.routes = {
+            ('POST', '/api/scrape_instagram_post'): self.scrape_instagram_post,
+            ('POST', '/api/scrape_instagram_posts'): self.scrape_instagram_posts,
+        }
+
+    async def __call__(self, scope: dict, receive: Receive, send: Send) -> None:
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        handler = self.routes.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+        if handler is None or not _is_json(scope):
+            await self.wsgi(scope, receive, send)
+            return
+        body = await _read_body(receive)
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            data = None
+        if not await handler(data, receive, send):
+            await self.wsgi(scope, _replay(body, receive), send)
+
+    async def scrape_instagram_post(self, data: Optional[dict], receive: Receive, send: Send) -> bool:
+        """
+        Async counterpart of `app.scrape_instagram_post`; streamed scrapes are left to it.
+
+        Returns:
+            bool: False when the request must be handled by the Flask route.
+        """
+        if isinstance(data, dict) and data.get('stream'):
+            return False
+        if not isinstance(data, dict) or 'post_url' not in data or 'trace_id' not in data:
+            await _send_json(send, 400, {"error": "Invalid request. 'post_url' and 'trace_id' are required."})
+            return True
+        try:
+            post_model = await controller.ascrape_instagram_post(data['post_url'], data['trace_id'])
+        except Exception as e:
+            await _send_json(send, _error_status(e), {"status": "error", "message": str(e)})
+        else:
+            await _send_json(send, 200, {"status": "success", "data": post_model.to_dict()})
+        return True
+
+    async def scrape_instagram_posts(self, data: Optional[dict], receive: Receive, send: Send) -> bool:
+        """
+        Async counterpart of `app.scrape_instagram_posts` for JSON lists of URLs. A
+        client disconnect cancels the posts not scraped yet.
+        """
+        data = data if isinstance(data, dict) else {}
+        trace_id, post_urls = data.get('trace_id'), data.get('post_urls')
+        invalid = _invalid_bulk_request(trace_id, post_urls)
+        if invalid:
+            await _send_json(send, invalid[1], {"error": invalid[0]})
+            return True
+
+        events = controller.astream_instagram_posts(
+            post_urls, trace_id, concurrency=_bulk_concurrency(data.get('concurrency')))
+        disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'application/x-ndjson')]})
+        try:
+            while True:
+                next_event = asyncio.ensure_future(events.__anext__())
+                await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_event.done():
+                    next_event.cancel()
+                    await asyncio.wait({next_event})
+                    logger.info({'log': f"Client of bulk scrape {trace_id} disconnected"})
+                    return True
+                try:
+                    event = next_event.result()
+                except StopAsyncIteration:
+                    break
+                await send({'type': 'http.response.body', 'more_body': True,
+                            'body': (json.dumps(event, default=str) + '\n').encode('utf-8')})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await events.aclose()
+        return True
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await asyncio.to_thread(_job_workers)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.to_thread(_job_workers().stop, GRACEFUL_SHUTDOWN_TIMEOUT)
+                self.wsgi.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def _is_json(scope: dict) -> bool:
+    for name, value in scope.get('headers', []):
+        if name == b'content-type':
+            return value.split(b';')[0].strip().lower() == b'application/json'
+    return False
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] != 'http.request':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def _replay(body: bytes, receive: Receive) -> Receive:
+    """
+    A `receive` yielding the already read request body once, then the client's further messages.
+    """
+    sent = False
+
+    async def replay() -> dict:
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        return await receive()
+
+    return replay
+
+
+async def _wait_disconnect(receive: Receive) -> None:
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _send_json(send: Send, status: int, payload: dict) -> None:
+    # Encoded like `jsonify`, so both paths return the same representation.
+    body = (app.json.dumps(payload) + '\n').encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode('ascii')),
+    ]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+application = ScraperASGIApp(app)
+
+
+def main() -> None:
+    uvicorn.run(
+        'asgi:application',
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        timeout_keep_alive=KEEP_ALIVE_TIMEOUT,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+        limit_concurrency=LIMIT_CONCURRENCY,
+        backlog=BACKLOG,
+        lifespan='on',
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 from enum import Enum
 
+from constants.prompt.template import PromptTemplate
+
 
 class InstagramTarget(Enum):
     SINGLE_POST = "SINGLE_POST"
@@ -10,8 +12,10 @@ class InstagramTarget(Enum):
     LIVE = "LIVE"
 
 
+# Static instructions come first and the page content last, so the prefix is
+# byte-identical on every call and can be served from the provider's cache.
 INSTAGRAM_PROMPT = {
-    InstagramTarget.SINGLE_POST: """
+    InstagramTarget.SINGLE_POST: PromptTemplate('instagram_single_post', prefix="""
         Extract Instagram posts data from the provided input HTML and return as Json Object.
 
         The information you need to extract includes:
@@ -27,7 +31,7 @@ INSTAGRAM_PROMPT = {
         - Is the post a video? (boolean)
 
         Return the extracted information in JSON format, with the following structure:
-        {{
+        {
             "shortcode": "string",
             "post_type": "string",
             "likes": int,
@@ -38,11 +42,85 @@ INSTAGRAM_PROMPT = {
             "owner_username": "string",
             "timestamp": "datetime",
             "is_video": bool
-        }}
+        }
 
+        parse the provided HTML content and return the structured data in the required JSON format.
+        """, suffix="""
         HTML input:
         {html_content}
+        """)
+}
 
-        parse the provided HTML content and return the structured data in the required JSON format.
-        """
+INSTAGRAM_SELECTOR_PROMPT = {
+    InstagramTarget.SINGLE_POST: PromptTemplate('instagram_single_post_selectors', prefix="""
+        You are given the skeleton of an Instagram post page (scripts removed, text shortened).
+        Write selectors that locate the following fields on this page and on any other
+        post rendered with the same layout. Prefer XPath; use structural attributes
+        (tag names, role, datetime, property, aria-label) over text or obfuscated class names.
+
+        Fields:
+        - likes: number of likes
+        - comments: number of comments
+        - caption: caption text
+        - owner_username: username of the post's owner
+        - timestamp: publication date of the post
+
+        For each field return an object with:
+        - "xpath": XPath expression (or "css": CSS selector)
+        - "attr": attribute to read instead of the element text (optional)
+        - "regex": regular expression whose first group extracts the value (optional)
+
+        Return only a JSON object with the following structure:
+        {
+            "likes": {"xpath": "string", "attr": "string", "regex": "string"},
+            "comments": {"xpath": "string", "attr": "string", "regex": "string"},
+            "caption": {"xpath": "string", "attr": "string", "regex": "string"},
+            "owner_username": {"xpath": "string", "attr": "string", "regex": "string"},
+            "timestamp": {"xpath": "string", "attr": "string", "regex": "string"}
+        }
+        """, suffix="""
+        HTML input:
+        {html_content}
+        """)
+}
+
+INSTAGRAM_BATCH_PROMPT = {
+    InstagramTarget.SINGLE_POST: PromptTemplate('instagram_batch', prefix="""
+        Extract Instagram posts data from each of the provided input items and return a Json Array.
+        Every item is delimited by <item id="..." url="..."> and </item> and holds one post page.
+
+        The information you need to extract for each item includes:
+        - Post ID (shortcode) get it from url /p/shortcode
+        - Post type (image or video)
+        - Number of likes
+        - Number of comments
+        - Caption text
+        - Hashtags in the caption
+        - URL of the post
+        - Username of the post's owner
+        - Timestamp of the post (if available)
+        - Is the post a video? (boolean)
+
+        Return one object per item, in any order, copying the item's id into "id":
+        [
+            {
+                "id": "string",
+                "shortcode": "string",
+                "post_type": "string",
+                "likes": int,
+                "comments": int,
+                "caption": "string",
+                "hashtags": "string",
+                "url": "string",
+                "owner_username": "string",
+                "timestamp": "datetime",
+                "is_video": bool
+            }
+        ]
+
+        parse every item and return the structured data in the required JSON format.
+        """, suffix="""
+        Items:
+        {items}
+        """)
 }
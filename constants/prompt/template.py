@@ -0,0 +1,20 @@
+class PromptTemplate():
+    """
+    A prompt split into a static prefix (instructions, identical on every call)
+    and a dynamic suffix holding the `str.format` placeholders.
+
+    `format` returns the whole prompt like a plain template string would. The
+    prefix comes first so it is byte-identical on every call, which is what
+    provider-side prefix caching keys on.
+    """
+
+    def __init__(self, name: str, prefix: str, suffix: str) -> None:
+        self.name = name
+        self.prefix = prefix
+        self.suffix = suffix
+
+    def format(self, **values) -> str:
+        return self.prefix + self.suffix.format(**values)
+
+    def __repr__(self) -> str:
+        return f"<PromptTemplate {self.name}>"
@@ -1,15 +1,47 @@
 from datetime import datetime
+import asyncio
 import traceback
 from model.Post import PostModel
 from model.Error.ErrorModel import ErrorModel, ErrorCode
 from service.llm_scrap.gemini_scrapper import GeminiScraperService
+from service.llm_scrap.batching import BatchCollector, BatchItem
+from service.llm_scrap.streaming import FieldCallback
+from service.llm_scrap.resilience import deadline_scope
 from service.logger_service import LoggerService
 from service.bigquery_service import BigQueryService
-from constants.prompt.instagram import InstagramTarget, INSTAGRAM_PROMPT
+from constants.prompt.instagram import InstagramTarget, INSTAGRAM_PROMPT, INSTAGRAM_SELECTOR_PROMPT, INSTAGRAM_BATCH_PROMPT
+from service.parser.html_extractor import extract_strings
+from service.parser.compaction import get_text_compactor
+from service.parser.og_description import OgDescriptionParser
+from service.parser.structured_output import loads_lenient
+from service.parser.selector_templates import dom_fingerprint, get_selector_template_store
+from service.metrics_service import MetricsService
+from service.single_flight import get_single_flight
+from service.cache.html_cache import canonical_url
+from collections import Counter
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+import os
 import json
 import re
 import typing
 
+RULE_BASED_EXTRACTION_ENABLED = os.environ.get(
+    'RULE_BASED_EXTRACTION_ENABLED', 'true').lower() == 'true'
+
+# Posts of a bulk request fetched and extracted at the same time, and posts per BigQuery insert.
+BULK_SCRAPE_CONCURRENCY = int(os.environ.get('BULK_SCRAPE_CONCURRENCY', 8))
+BULK_INSERT_BATCH_SIZE = int(os.environ.get('BULK_INSERT_BATCH_SIZE', 500))
+
+FETCHED_BY_LLM = "LLMScraperService"
+FETCHED_BY_RULES = "RuleBasedParser"
+FETCHED_BY_TEMPLATE = "SelectorTemplate"
+
+# Stages of a single post scrape, reported to `on_stage`.
+STAGE_FETCH = "fetch"
+STAGE_EXTRACT = "extract"
+STAGE_STORE = "store"
+StageCallback = Callable[[str], None]
+
 
 class Post(typing.TypedDict):
     shortcode: typing.Optional[str]
@@ -20,48 +52,50 @@ class Post(typing.TypedDict):
     hashtags: typing.Optional[str]
     url: typing.Optional[str]
     owner_username: str
-    timestamp: typing.Optional[datetime]
+    timestamp: typing.Optional[str]
     is_video: bool
 
 
+class BatchPost(Post):
+    id: str
+
+
 class InstagramHTMLparser:
+    META_PROPERTIES = ["og:description", "og:image", "og:title", "og:video"]
+
     @staticmethod
     def process(html_content: str) -> dict:
         """
         Processes the Instagram HTML content to extract relevant metadata and raw text.
 
+        Uses the single-pass lxml extractor; BeautifulSoup's html.parser stays
+        available as fallback (HTML_EXTRACTOR=soup) and produces the same output.
+        The visible text is compacted to a token budget and the result is
+        serialised without indentation, since every byte ends up in the prompt.
+
         Args:
             html_content (str): The raw HTML content of the Instagram page.
 
         Returns:
             dict: A dictionary containing the extracted data including caption, image URL, title, and raw text.
         """
-        from bs4 import BeautifulSoup
-
-        # Parse HTML with BeautifulSoup
-        soup = BeautifulSoup(html_content, "html.parser")
+        meta, strings = extract_strings(
+            html_content, InstagramHTMLparser.META_PROPERTIES)
 
-        # Extract metadata
-        caption = soup.find("meta", {"property": "og:description"})[
-            "content"] if soup.find("meta", {"property": "og:description"}) else None
-        image_url = soup.find("meta", {"property": "og:image"})[
-            "content"] if soup.find("meta", {"property": "og:image"}) else None
-        title = soup.find("meta", {"property": "og:title"})["content"] if soup.find(
-            "meta", {"property": "og:title"}) else None
-
-        # Remove unnecessary tags
-        for data in soup(['style', 'script']):
-            data.decompose()
-
-        # Retrieve raw text content
-        raw_text = ' '.join(soup.stripped_strings)
+        compactor = get_text_compactor()
+        if compactor:
+            raw_text = compactor.compact(
+                strings, anchors=[meta.get("og:description"), meta.get("og:title")])
+        else:
+            raw_text = ' '.join(strings)
 
         return json.dumps({
-            "caption": caption,
-            "image_url": image_url,
-            "title": title,
+            "caption": meta.get("og:description"),
+            "image_url": meta.get("og:image"),
+            "title": meta.get("og:title"),
+            "video_url": meta.get("og:video"),
             "raw_text": raw_text
-        }, indent=4)
+        }, ensure_ascii=False, separators=(',', ':'))
 
 
 class InstagramScraperController:
@@ -69,6 +103,9 @@ class InstagramScraperController:
         self.scrap_service = GeminiScraperService()
         self.bq_service = BigQueryService()
         self.logger = LoggerService()
+        self.extraction_paths = Counter()
+        MetricsService.register(
+            'extraction_paths', lambda: dict(self.extraction_paths))
 
     def find_short_code(self, post_url) -> str:
         pattern = r"\/p\/([a-zA-Z0-9_-]+)"
@@ -76,56 +113,179 @@ class InstagramScraperController:
 
         if match:
             shortcode = match.group(1)
-            print(f"Shortcode: {shortcode}")
+            self.logger.debug(f"Shortcode: {shortcode}")
             return shortcode
         else:
-            print("No shortcode found.")
+            self.logger.debug(f"No shortcode found in {post_url}")
 
-    def scrape_instagram_post(self, post_url: str, trace_id: str) -> PostModel:
+    def scrape_instagram_post(self, post_url: str, trace_id: str,
+                              on_field: Optional[FieldCallback] = None,
+                              on_stage: Optional[StageCallback] = None) -> PostModel:
         """
         Scrapes an Instagram post and returns it as a PostModel.
 
+        Concurrent requests for the same post, in this process or another worker,
+        share one fetch, extraction and insert and get the same PostModel; only
+        the request running the pipeline receives `on_field` events.
+
+        Args:
+            post_url (str): URL of the Instagram post to scrape.
+            on_field (Optional[FieldCallback]): Receives each post field as soon as it
+                is extracted; the model answer is then streamed.
+            on_stage (Optional[StageCallback]): Receives the name of each stage (fetch,
+                extract, store) as the pipeline enters it.
+
+        Returns:
+            PostModel: Structured data of the Instagram post.
+
+        Raises:
+            SingleFlightTimeoutException: If the scrape of the same post already running
+                does not finish within SINGLE_FLIGHT_WAIT_TIMEOUT.
+        """
+
+        flight = get_single_flight()
+        if flight is None:
+            return self._scrape_instagram_post(post_url, trace_id, on_field, on_stage)
+        return flight.run(self._flight_key(post_url),
+                          lambda: self._scrape_instagram_post(post_url, trace_id, on_field, on_stage),
+                          self._dump_post, self._load_post)
+
+    async def ascrape_instagram_post(self, post_url: str, trace_id: str,
+                                     on_field: Optional[FieldCallback] = None,
+                                     on_stage: Optional[StageCallback] = None) -> PostModel:
+        """
+        Awaitable variant of `scrape_instagram_post`, usable from async code.
+
         Args:
             post_url (str): URL of the Instagram post to scrape.
+            on_field (Optional[FieldCallback]): Receives each post field as soon as it
+                is extracted; the model answer is then streamed.
+            on_stage (Optional[StageCallback]): Receives the name of each stage as the
+                pipeline enters it.
 
         Returns:
             PostModel: Structured data of the Instagram post.
         """
 
+        flight = get_single_flight()
+        if flight is None:
+            return await self._ascrape_instagram_post(post_url, trace_id, on_field, on_stage)
+        return await flight.arun(self._flight_key(post_url),
+                                 lambda: self._ascrape_instagram_post(post_url, trace_id, on_field, on_stage),
+                                 self._dump_post, self._load_post)
+
+    async def astream_instagram_posts(self, post_urls: List[str], trace_id: str,
+                                      concurrency: int = BULK_SCRAPE_CONCURRENCY,
+                                      batch_size: int = BULK_INSERT_BATCH_SIZE) -> AsyncIterator[dict]:
+        """
+        Scrapes many Instagram posts with at most `concurrency` pages being fetched
+        at a time and yields each result as soon as it is ready, in completion
+        order. Pages that cannot be extracted locally are sent to Gemini together,
+        in batches (see `BatchCollector`). A failed post yields an error event and
+        does not stop the others.
+
+        Every post goes through the single-flight coordinator like a single scrape:
+        the same post listed twice, or already being scraped by another request,
+        is scraped once. Posts scraped by this call are stored `batch_size` at a
+        time, each insert yielding a store event; posts another request scraped
+        are stored by that request.
+
+        Args:
+            post_urls (List[str]): URLs of the Instagram posts to scrape.
+            concurrency (int): Pages fetched at the same time.
+            batch_size (int): Posts per BigQuery insert.
+
+        Returns:
+            AsyncIterator[dict]: One {"index", "url", "status", ...} event per URL, a
+            {"status": "stored" | "error", "stage": "store", "ids"} event per insert and
+            a final {"status": "done"} summary.
+        """
+        self.logger.set_trace_id(trace_id)
+        positions: Dict[str, List[int]] = {}
+        for index, post_url in enumerate(post_urls):
+            positions.setdefault(self._flight_key(post_url), []).append(index)
+        flight = get_single_flight()
+        batcher = BatchCollector(lambda items: self._aextract_batch(items, trace_id),
+                                 self.scrap_service.batch_sizer.limit)
+        slots = asyncio.Semaphore(max(1, concurrency))
+        finished: asyncio.Queue = asyncio.Queue()
+        # Posts still waiting for or holding a fetch slot; once none are left the
+        # pages waiting for the model cannot be joined by others.
+        fetching = len(positions)
+
+        async def scrape(key: str, indexes: List[int]) -> None:
+            nonlocal fetching
+            post_url = post_urls[indexes[0]]
+            led = released = False
+
+            def release() -> None:
+                nonlocal fetching, released
+                if released:
+                    return
+                released = True
+                slots.release()
+                fetching -= 1
+                if fetching == 0:
+                    batcher.flush()
+
+            async def run() -> PostModel:
+                nonlocal led
+                led = True
+                return await self._abulk_post_model(post_url, trace_id, str(indexes[0]), batcher, release)
+
+            await slots.acquire()
+            try:
+                if flight is None:
+                    result = await run()
+                else:
+                    result = await flight.arun(key, run, self._dump_post, self._load_post)
+            except Exception as e:
+                self.logger.error(ErrorModel(
+                    'create_post', ErrorCode.FLASK_ERR_CREATE, traceback.format_exc()))
+                result = e
+            finally:
+                release()
+            await finished.put((indexes, result, led))
+
+        tasks = [asyncio.ensure_future(scrape(key, indexes)) for key, indexes in positions.items()]
+        buffer: List[PostModel] = []
+        succeeded = failed = 0
+        try:
+            for _ in range(len(positions)):
+                indexes, result, led = await finished.get()
+                for index in indexes:
+                    yield self._bulk_item(index, post_urls[index], result)
+                if isinstance(result, PostModel):
+                    succeeded += len(indexes)
+                    if led:
+                        buffer.append(result)
+                else:
+                    failed += len(indexes)
+                if len(buffer) >= batch_size:
+                    yield await self._astore_batch(buffer, trace_id)
+                    buffer = []
+            if buffer:
+                yield await self._astore_batch(buffer, trace_id)
+        finally:
+            for task in tasks:
+                task.cancel()
+            batcher.close()
+        yield {"status": "done", "total": len(post_urls), "succeeded": succeeded, "failed": failed}
+
+    def _scrape_instagram_post(self, post_url: str, trace_id: str,
+                               on_field: Optional[FieldCallback] = None,
+                               on_stage: Optional[StageCallback] = None) -> PostModel:
         try:
             self.logger.set_trace_id(trace_id)
-            result = self.scrap_service.scrape_page(
-                prompt=INSTAGRAM_PROMPT[InstagramTarget.SINGLE_POST],
-                url=post_url,
-                response_schema=Post,
-                html_processor=InstagramHTMLparser.process,
-                trace_id=trace_id
-            )
-            clean_text = result.text.replace(
-                'json\n', '').replace('```', '').replace('\n', '')
-            data = json.loads(clean_text)
-            post_model = PostModel(
-                id=self.find_short_code(post_url),
-                post_type=data.get("type", 'GraphImage'),
-                likes=int(data.get("likes", 0)),
-                comments=int(data.get("comments", 0)),
-                is_video=True if data.get("type") == "video" else False,
-                owner_username=data.get("owner_username"),
-                batch_id=trace_id,
-                caption_hashtags=', '.join(re.findall(
-                    r"#(\w+)", data.get("caption", ""))),
-                caption=data.get("caption"),
-                url=post_url,
-                shortcode=self.find_short_code(post_url),
-                fetched_by="LLMScraperService",
-                uploaded_at=datetime.now(),
-                created_at=datetime.now(),
-                updated_at=datetime.now(),
-                label_annotations=None,
-                context=None,
-                label_list=None
-            )
+            self._report_stage(STAGE_FETCH, on_stage)
+            processed_html, html_content = self._fetch_post(post_url, trace_id)
+            self._report_stage(STAGE_EXTRACT, on_stage)
+            with deadline_scope():
+                data, fetched_by = self._extract(post_url, processed_html, trace_id, on_field, html_content)
+            post_model = self._to_post_model(
+                data, post_url, trace_id, fetched_by)
 
+            self._report_stage(STAGE_STORE, on_stage)
             self.bq_service.set_one(
                 post_model, trace_id=trace_id
             )
@@ -137,3 +297,307 @@ class InstagramScraperController:
             print(traceback.format_exc())
             raise ValueError(
                 f"Failed to parse Gemini response: {e.__traceback__}") from e
+
+    async def _ascrape_instagram_post(self, post_url: str, trace_id: str,
+                                      on_field: Optional[FieldCallback] = None,
+                                      on_stage: Optional[StageCallback] = None) -> PostModel:
+        try:
+            self.logger.set_trace_id(trace_id)
+            post_model = await self._ascrape_post_model(post_url, trace_id, on_field, on_stage)
+
+            self._report_stage(STAGE_STORE, on_stage)
+            await asyncio.to_thread(
+                self.bq_service.set_one, post_model, trace_id=trace_id
+            )
+
+            return post_model
+        except Exception as e:
+            self.logger.error(ErrorModel(
+                'create_post', ErrorCode.FLASK_ERR_CREATE, traceback.format_exc()))
+            print(traceback.format_exc())
+            raise ValueError(
+                f"Failed to parse Gemini response: {e.__traceback__}") from e
+
+    async def _ascrape_post_model(self, post_url: str, trace_id: str,
+                                  on_field: Optional[FieldCallback] = None,
+                                  on_stage: Optional[StageCallback] = None) -> PostModel:
+        self._report_stage(STAGE_FETCH, on_stage)
+        processed_html, html_content = await self._afetch_post(post_url, trace_id)
+        self._report_stage(STAGE_EXTRACT, on_stage)
+        with deadline_scope():
+            data, fetched_by = await self._aextract(post_url, processed_html, trace_id, on_field, html_content)
+        return self._to_post_model(data, post_url, trace_id, fetched_by)
+
+    async def _abulk_post_model(self, post_url: str, trace_id: str, item_id: str,
+                                batcher: BatchCollector, fetched: Callable[[], None]) -> PostModel:
+        """
+        Bulk variant of `_ascrape_post_model`: a page that cannot be extracted locally
+        is handed to `batcher`, and `fetched` is called as soon as the page no longer
+        needs its fetch slot.
+        """
+        processed_html, html_content = await self._afetch_post(post_url, trace_id)
+        data, fetched_by = await self._aextract_locally(post_url, processed_html, html_content, trace_id)
+        if data is None:
+            pending = batcher.submit(BatchItem(item_id, post_url, processed_html))
+            fetched()
+            data, fetched_by = await pending, FETCHED_BY_LLM
+        else:
+            fetched()
+        data, fetched_by = self._finish_extraction(data, fetched_by, processed_html)
+        return self._to_post_model(data, post_url, trace_id, fetched_by)
+
+    async def _aextract_batch(self, items: List[BatchItem], trace_id: str) -> Dict[str, Union[dict, Exception]]:
+        with deadline_scope():
+            return await self.scrap_service.aextract_batch(
+                prompt=INSTAGRAM_BATCH_PROMPT[InstagramTarget.SINGLE_POST],
+                items=items,
+                single_prompt=INSTAGRAM_PROMPT[InstagramTarget.SINGLE_POST],
+                response_schema=Post,
+                batch_schema=list[BatchPost],
+                validator=self._validate_post,
+                trace_id=trace_id
+            )
+
+    async def _astore_batch(self, post_models: List[PostModel], trace_id: str) -> dict:
+        ids = [post_model.id for post_model in post_models]
+        try:
+            await asyncio.to_thread(self.bq_service.set_many, post_models, trace_id=trace_id)
+            return {"status": "stored", "ids": ids}
+        except Exception as e:
+            return {"status": "error", "stage": "store", "ids": ids, "message": str(e)}
+
+    @staticmethod
+    def _bulk_item(index: int, post_url: str, result: Union[PostModel, Exception]) -> dict:
+        if isinstance(result, PostModel):
+            return {"index": index, "url": post_url, "status": "success", "data": result.to_dict()}
+        return {"index": index, "url": post_url, "status": "error",
+                "error": result.__class__.__name__, "message": str(result)}
+
+    def _flight_key(self, post_url: str) -> str:
+        shortcode = self.find_short_code(post_url)
+        return f"instagram:post:{shortcode}" if shortcode else f"instagram:url:{canonical_url(post_url)}"
+
+    @staticmethod
+    def _dump_post(post_model: PostModel) -> str:
+        return json.dumps(post_model.to_dict(), default=lambda value: value.isoformat())
+
+    @staticmethod
+    def _load_post(payload: str) -> PostModel:
+        data = json.loads(payload)
+        for field in ("uploaded_at", "created_at", "updated_at"):
+            data[field] = datetime.fromisoformat(data[field])
+        return PostModel.from_dict(data)
+
+    def _extract(self, post_url: str, processed_html: str, trace_id: str,
+                 on_field: Optional[FieldCallback] = None, html_content: Optional[str] = None) -> Tuple[dict, str]:
+        """
+        Extract the post fields locally when possible (og: tags, then a learned
+        selector template) and with the Gemini model cascade otherwise. With
+        `on_field` the model answer is streamed and each field reported once
+        complete; locally extracted fields are reported all at once. Templates need
+        the raw `html_content` and are skipped without it.
+
+        Returns:
+            Tuple[dict, str]: The post fields and the name of the path that produced them.
+        """
+        data, fetched_by = self._extract_locally(post_url, processed_html, html_content, trace_id)
+        if data is not None:
+            self._report_fields(data, on_field)
+        elif on_field is not None:
+            data, model_name = self.scrap_service.stream_validated(
+                prompt=INSTAGRAM_PROMPT[InstagramTarget.SINGLE_POST],
+                url=post_url,
+                processed_html=processed_html,
+                response_schema=Post,
+                validator=self._validate_post,
+                on_field=on_field,
+                trace_id=trace_id
+            )
+            self.logger.info(f"Post fields streamed from {model_name}")
+            fetched_by = FETCHED_BY_LLM
+        else:
+            data, model_name = self.scrap_service.extract_validated(
+                prompt=INSTAGRAM_PROMPT[InstagramTarget.SINGLE_POST],
+                url=post_url,
+                processed_html=processed_html,
+                response_schema=Post,
+                validator=self._validate_post,
+                trace_id=trace_id
+            )
+            self.logger.info(f"Post fields accepted from {model_name}")
+            fetched_by = FETCHED_BY_LLM
+        return self._finish_extraction(data, fetched_by, processed_html)
+
+    async def _aextract(self, post_url: str, processed_html: str, trace_id: str,
+                        on_field: Optional[FieldCallback] = None, html_content: Optional[str] = None) -> Tuple[dict, str]:
+        """
+        Awaitable variant of `_extract`.
+        """
+        data, fetched_by = await self._aextract_locally(post_url, processed_html, html_content, trace_id)
+        if data is not None:
+            self._report_fields(data, on_field)
+        elif on_field is not None:
+            data, model_name = await self.scrap_service.astream_validated(
+                prompt=INSTAGRAM_PROMPT[InstagramTarget.SINGLE_POST],
+                url=post_url,
+                processed_html=processed_html,
+                response_schema=Post,
+                validator=self._validate_post,
+                on_field=on_field,
+                trace_id=trace_id
+            )
+            self.logger.info(f"Post fields streamed from {model_name}")
+            fetched_by = FETCHED_BY_LLM
+        else:
+            data, model_name = await self.scrap_service.aextract_validated(
+                prompt=INSTAGRAM_PROMPT[InstagramTarget.SINGLE_POST],
+                url=post_url,
+                processed_html=processed_html,
+                response_schema=Post,
+                validator=self._validate_post,
+                trace_id=trace_id
+            )
+            self.logger.info(f"Post fields accepted from {model_name}")
+            fetched_by = FETCHED_BY_LLM
+        return self._finish_extraction(data, fetched_by, processed_html)
+
+    def _extract_locally(self, post_url: str, processed_html: str, html_content: Optional[str],
+                         trace_id: str) -> Tuple[Optional[dict], Optional[str]]:
+        data = self._extract_rule_based(processed_html)
+        if data is not None:
+            return data, FETCHED_BY_RULES
+        data = self._extract_with_template(post_url, processed_html, html_content, trace_id)
+        if data is not None:
+            return data, FETCHED_BY_TEMPLATE
+        return None, None
+
+    async def _aextract_locally(self, post_url: str, processed_html: str, html_content: Optional[str],
+                                trace_id: str) -> Tuple[Optional[dict], Optional[str]]:
+        data = self._extract_rule_based(processed_html)
+        if data is not None:
+            return data, FETCHED_BY_RULES
+        data = await asyncio.to_thread(self._extract_with_template, post_url, processed_html, html_content, trace_id)
+        if data is not None:
+            return data, FETCHED_BY_TEMPLATE
+        return None, None
+
+    def _fetch_post(self, post_url: str, trace_id: str) -> Tuple[str, Optional[str]]:
+        """
+        Fetch and process a post page, keeping the raw HTML when selector templates may need it.
+        """
+        if get_selector_template_store() is None:
+            return self.scrap_service.fetch_page_data(
+                url=post_url, html_processor=InstagramHTMLparser.process, trace_id=trace_id), None
+        return self.scrap_service.fetch_page_data_with_html(
+            url=post_url, html_processor=InstagramHTMLparser.process, trace_id=trace_id)
+
+    async def _afetch_post(self, post_url: str, trace_id: str) -> Tuple[str, Optional[str]]:
+        if get_selector_template_store() is None:
+            return await self.scrap_service.afetch_page_data(
+                url=post_url, html_processor=InstagramHTMLparser.process, trace_id=trace_id), None
+        return await self.scrap_service.afetch_page_data_with_html(
+            url=post_url, html_processor=InstagramHTMLparser.process, trace_id=trace_id)
+
+    @staticmethod
+    def _report_stage(stage: str, on_stage: Optional[StageCallback]) -> None:
+        if on_stage is not None:
+            on_stage(stage)
+
+    @staticmethod
+    def _report_fields(data: dict, on_field: Optional[FieldCallback]) -> None:
+        if on_field is not None:
+            for field, value in data.items():
+                on_field(field, value)
+
+    def _finish_extraction(self, data: dict, fetched_by: str, processed_html: str) -> Tuple[dict, str]:
+        if fetched_by != FETCHED_BY_LLM and json.loads(processed_html).get("video_url"):
+            data["type"] = "video"
+        self.extraction_paths[fetched_by] += 1
+        self.logger.info(f"Extracted post fields via {fetched_by}")
+        return data, fetched_by
+
+    @staticmethod
+    def _extract_rule_based(processed_html: str) -> Optional[dict]:
+        """
+        Try to fill the post fields from the og: meta tags without calling the model.
+
+        Returns:
+            Optional[dict]: The extracted fields, or None when they are incomplete.
+        """
+        if not RULE_BASED_EXTRACTION_ENABLED:
+            return None
+        page = json.loads(processed_html)
+        data = OgDescriptionParser.parse(page.get("caption"), page.get("title"))
+        return data if OgDescriptionParser.is_complete(data) else None
+
+    def _extract_with_template(self, post_url: str, processed_html: str, html_content: Optional[str],
+                               trace_id: str) -> Optional[dict]:
+        """
+        Extract the post fields from the raw page with the selector template learned
+        for its layout, asking Gemini for a new template when the layout has none.
+        Whatever the og: tags do give must agree with the template's values.
+
+        Returns:
+            Optional[dict]: The extracted fields, or None when no valid template exists
+            or the raw HTML is not at hand.
+        """
+        store = get_selector_template_store()
+        if store is None or html_content is None:
+            return None
+        page = json.loads(processed_html)
+        reference = OgDescriptionParser.reference(page.get("caption"), page.get("title"))
+        fingerprint = dom_fingerprint(html_content)
+        data = store.extract(html_content, fingerprint, reference)
+        if data is None and store.should_learn(fingerprint):
+            data = store.learn(html_content, lambda skeleton: loads_lenient(
+                self.scrap_service.extract_page_data(
+                    prompt=INSTAGRAM_SELECTOR_PROMPT[InstagramTarget.SINGLE_POST],
+                    url=post_url,
+                    processed_html=skeleton,
+                    trace_id=trace_id
+                ).text), fingerprint, reference)
+        return data
+
+    def _validate_post(self, data: dict, post_url: str) -> List[str]:
+        """
+        Sanity checks on a model answer that already matches `Post`; a non-empty
+        result sends the page to the next model of the cascade.
+
+        Returns:
+            List[str]: The problems found, empty when the answer is accepted.
+        """
+        errors = []
+        shortcode = self.find_short_code(post_url)
+        if data.get("shortcode") and shortcode and data["shortcode"] != shortcode:
+            errors.append(f"shortcode: {data['shortcode']!r} does not match {shortcode!r}")
+        for field in ("likes", "comments"):
+            if (data.get(field) or 0) < 0:
+                errors.append(f"{field}: negative")
+        if not (data.get("owner_username") or "").strip():
+            errors.append("owner_username: empty")
+        return errors
+
+    def _to_post_model(self, data: dict, post_url: str, trace_id: str, fetched_by: str = FETCHED_BY_LLM) -> PostModel:
+        shortcode = self.find_short_code(post_url)
+        post_model = PostModel(
+            id=shortcode,
+            post_type=data.get("type") or data.get("post_type") or 'GraphImage',
+            likes=int(data.get("likes", 0)),
+            comments=int(data.get("comments", 0)),
+            is_video=bool(data.get("is_video")) or data.get("type") == "video",
+            owner_username=data.get("owner_username"),
+            batch_id=trace_id,
+            caption_hashtags=', '.join(re.findall(
+                r"#(\w+)", data.get("caption") or "")),
+            caption=data.get("caption"),
+            url=post_url,
+            shortcode=shortcode,
+            fetched_by=fetched_by,
+            uploaded_at=datetime.now(),
+            created_at=datetime.now(),
+            updated_at=datetime.now(),
+            label_annotations=None,
+            context=None,
+            label_list=None
+        )
+        return post_model
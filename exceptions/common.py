@@ -1,2 +1,18 @@
 class DuplicateRecordException(Exception):
     pass
+
+
+class RateLimitedException(Exception):
+    pass
+
+
+class WorkerFarmException(Exception):
+    pass
+
+
+class DeadlineExceededException(TimeoutError):
+    pass
+
+
+class SingleFlightTimeoutException(TimeoutError):
+    pass
@@ -0,0 +1,221 @@
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from constants.prompt.instagram import InstagramTarget
+from service.parser.compaction import compaction_settings
+from service.metrics_service import MetricsService
+
+HTML_CACHE_ENABLED = os.environ.get('HTML_CACHE_ENABLED', 'true').lower() == 'true'
+HTML_CACHE_PATH = os.environ.get('HTML_CACHE_PATH', '/tmp/llm_scrapper/html_cache.sqlite')
+HTML_CACHE_MAX_BYTES = int(os.environ.get('HTML_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# Part of every processed key; bump it when a processor changes what it produces.
+HTML_CACHE_PROCESSED_VERSION = os.environ.get('HTML_CACHE_PROCESSED_VERSION', '1')
+
+# Seconds a cached page stays fresh, per target.
+HTML_CACHE_TTL: Dict[Optional[InstagramTarget], int] = {
+    InstagramTarget.SINGLE_POST: int(os.environ.get('HTML_CACHE_TTL_SINGLE_POST', 600)),
+    InstagramTarget.REELS: int(os.environ.get('HTML_CACHE_TTL_REELS', 600)),
+    InstagramTarget.PROFILE: int(os.environ.get('HTML_CACHE_TTL_PROFILE', 300)),
+    None: int(os.environ.get('HTML_CACHE_TTL_DEFAULT', 120)),
+}
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+CREATE INDEX IF NOT EXISTS entries_hash ON entries (hash);
+"""
+
+
+def canonical_url(url: str) -> str:
+    """
+    Normalise a page URL so tracking parameters and trailing slashes do not
+    split the cache, e.g. `https://instagram.com/p/abc?igsh=x` becomes
+    `https://www.instagram.com/p/abc/`.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    if host == 'instagram.com':
+        host = 'www.instagram.com'
+    path = parts.path if parts.path.endswith('/') else parts.path + '/'
+    return urlunsplit(('https', host, path, '', ''))
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _processing_signature() -> str:
+    """
+    Short hash of the settings that shape processed payloads, so changing them
+    (e.g. the compaction budget) stops old payloads from being served.
+    """
+    settings = f"{HTML_CACHE_PROCESSED_VERSION}:{compaction_settings()}"
+    return hashlib.sha256(settings.encode('utf-8')).hexdigest()[:12]
+
+
+class HTMLCache():
+    """
+    Content-addressed cache of raw and processed HTML shared by every worker
+    process on the host.
+
+    Entries map a key (canonical URL, plus the processor name and a hash of
+    the processing settings for processed payloads) to a zlib-compressed blob
+    addressed by its SHA-256, so identical pages are stored once. SQLite in WAL mode provides cross-process locking.
+    When the blobs exceed `max_bytes`, least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str = HTML_CACHE_PATH, max_bytes: int = HTML_CACHE_MAX_BYTES,
+                 ttl: Dict[Optional[InstagramTarget], int] = HTML_CACHE_TTL) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def get_raw(self, url: str) -> Optional[str]:
+        return self._get(self._raw_key(url), 'raw')
+
+    def set_raw(self, url: str, html: str, target: Optional[InstagramTarget] = None) -> None:
+        self._set(self._raw_key(url), html, target)
+
+    def get_processed(self, url: str, processor: str) -> Optional[str]:
+        return self._get(self._processed_key(url, processor), 'processed')
+
+    def set_processed(self, url: str, processor: str, payload: str,
+                      target: Optional[InstagramTarget] = None) -> None:
+        self._set(self._processed_key(url, processor), payload, target)
+
+    def invalidate(self, url: str) -> None:
+        canonical = canonical_url(url)
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM entries WHERE key = ? OR key LIKE ? ESCAPE '\\'",
+                         (f'raw:{canonical}', f'processed:%:{_escape_like(canonical)}'))
+            self._delete_orphans(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        conn = self._connection()
+        entries, = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        size, = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {**counters, "entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+    @staticmethod
+    def _raw_key(url: str) -> str:
+        return f'raw:{canonical_url(url)}'
+
+    @staticmethod
+    def _processed_key(url: str, processor: str) -> str:
+        return f'processed:{processor}:{_processing_signature()}:{canonical_url(url)}'
+
+    def _get(self, key: str, kind: str) -> Optional[str]:
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT b.data, e.expires_at FROM entries e JOIN blobs b ON b.hash = e.hash WHERE e.key = ?",
+            (key,)).fetchone()
+        if row is None or row[1] < now:
+            self._count(f'{kind}_misses')
+            return None
+        with self._transaction() as conn:
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+        self._count(f'{kind}_hits')
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def _set(self, key: str, value: str, target: Optional[InstagramTarget]) -> None:
+        now = time.time()
+        data = value.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        compressed = zlib.compress(data, 6)
+        expires_at = now + self.ttl.get(target, self.ttl[None])
+        with self._transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO blobs (hash, data, size) VALUES (?, ?, ?)",
+                         (digest, compressed, len(compressed)))
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, hash, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, digest, expires_at, now))
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        if conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,)).rowcount:
+            self._delete_orphans(conn)
+        size, = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        while size > self.max_bytes:
+            victim = conn.execute(
+                "SELECT key FROM entries ORDER BY last_access LIMIT 1").fetchone()
+            if victim is None:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", victim)
+            self._count('evictions')
+            self._delete_orphans(conn)
+            size, = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()
+
+    @staticmethod
+    def _delete_orphans(conn: sqlite3.Connection) -> None:
+        conn.execute("DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM entries)")
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+_cache: Optional[HTMLCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_html_cache() -> Optional[HTMLCache]:
+    """
+    Return the process-wide HTML cache, or None when caching is disabled.
+    """
+    global _cache
+    if not HTML_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HTMLCache()
+            MetricsService.register('html_cache', _cache.stats)
+        return _cache
@@ -0,0 +1,335 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+import typing
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Tuple
+
+from service.metrics_service import MetricsService
+
+# 'memory': per-process LRU, 'disk': SQLite file shared by the host's processes,
+# 'firestore': shared across hosts (set FIRESTORE_EMULATOR_HOST to run it locally), 'none': disabled
+LLM_CACHE_BACKEND = os.environ.get('LLM_CACHE_BACKEND', 'memory')
+LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 2048))
+LLM_CACHE_MAX_BYTES = int(os.environ.get('LLM_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+LLM_CACHE_PATH = os.environ.get('LLM_CACHE_PATH', '/tmp/llm_scrapper/llm_cache.sqlite')
+LLM_CACHE_COLLECTION = os.environ.get('LLM_CACHE_COLLECTION', 'llm_response_cache')
+# Firestore documents are limited to 1 MiB.
+LLM_CACHE_MAX_ENTRY_BYTES = int(os.environ.get('LLM_CACHE_MAX_ENTRY_BYTES', 900 * 1024))
+
+logger = logging.getLogger(__name__)
+
+
+def llm_cache_key(model_name: str, prompt: str, generation_config: Optional[dict] = None) -> str:
+    """
+    Hash of everything that determines the model's answer, the fields of the
+    response schema included.
+    """
+    payload = json.dumps({
+        "model": model_name,
+        "prompt": prompt,
+        "generation_config": generation_config or {},
+    }, sort_keys=True, ensure_ascii=False, default=_schema_dump)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _schema_dump(value) -> Any:
+    """
+    JSON form of a response schema: a TypedDict becomes its name, fields and
+    field types, recursively, and `list[X]` or `Optional[X]` their parts, so
+    editing a schema changes the keys of the answers shaped by it.
+    """
+    if typing.get_origin(value) is not None:
+        return {"origin": _schema_dump(typing.get_origin(value)),
+                "args": [_schema_dump(arg) for arg in typing.get_args(value)]}
+    if isinstance(value, type):
+        hints = typing.get_type_hints(value) if typing.is_typeddict(value) else {}
+        if not hints:
+            return value.__qualname__
+        return {"name": value.__qualname__,
+                "fields": {field: _schema_dump(hint) for field, hint in hints.items()},
+                "required": sorted(value.__required_keys__)}
+    return str(value)
+
+
+class CachedResponse():
+    """
+    Replayed model response, exposing the `text` attribute callers read from
+    a `GenerateContentResponse`. Only answers that finished normally are
+    stored, so a replay is never a truncated answer.
+    """
+
+    def __init__(self, text: str, model_name: Optional[str] = None) -> None:
+        self.text = text
+        self.model_name = model_name
+        self.cached = True
+
+    def __repr__(self) -> str:
+        return f"<CachedResponse (model={self.model_name}, chars={len(self.text)})>"
+
+
+class LLMCacheBackend():
+    """
+    Storage interface of the LLM response cache. `get` returns None for
+    missing or expired entries.
+    """
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryLLMCacheBackend(LLMCacheBackend):
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, max_bytes: int = LLM_CACHE_MAX_BYTES) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.time() + ttl)
+            self._bytes += len(value)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "evictions": self.evictions}
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+
+class SQLiteLLMCacheBackend(LLMCacheBackend):
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS responses (
+        key TEXT PRIMARY KEY,
+        data BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        expires_at REAL NOT NULL,
+        last_access REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self.evictions = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection().executescript(self._SCHEMA)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT data, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < now:
+            return None
+        with self._transaction() as conn:
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        now = time.time()
+        compressed = zlib.compress(value.encode('utf-8'), 6)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, data, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, compressed, len(compressed), now + ttl, now))
+            conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            size, = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+            while size > self.max_bytes:
+                victim = conn.execute(
+                    "SELECT key, size FROM responses ORDER BY last_access LIMIT 1").fetchone()
+                if victim is None:
+                    break
+                conn.execute("DELETE FROM responses WHERE key = ?", (victim[0],))
+                self.evictions += 1
+                size -= victim[1]
+
+    def stats(self) -> dict:
+        entries, size = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": entries, "bytes": size, "evictions": self.evictions}
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class FirestoreLLMCacheBackend(LLMCacheBackend):
+    """
+    Cache shared by every instance through a Firestore collection. The client
+    honours FIRESTORE_EMULATOR_HOST, so the emulator stands in for it locally.
+    Size is bounded per entry; expired documents are ignored on read and can be
+    purged with a Firestore TTL policy on `expires_at`.
+    """
+
+    def __init__(self, collection: str = LLM_CACHE_COLLECTION,
+                 max_entry_bytes: int = LLM_CACHE_MAX_ENTRY_BYTES) -> None:
+        from google.cloud import firestore
+
+        self._client = firestore.Client(project=os.environ.get('GCP_PROJECT_ID'))
+        self._collection = self._client.collection(collection)
+        self.max_entry_bytes = max_entry_bytes
+        self.skipped = 0
+
+    def get(self, key: str) -> Optional[str]:
+        snapshot = self._collection.document(key).get()
+        if not snapshot.exists:
+            return None
+        doc = snapshot.to_dict()
+        if doc.get('expires_at', 0) < time.time():
+            return None
+        return zlib.decompress(doc['data']).decode('utf-8')
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        compressed = zlib.compress(value.encode('utf-8'), 6)
+        if len(compressed) > self.max_entry_bytes:
+            self.skipped += 1
+            return
+        self._collection.document(key).set({
+            'data': compressed,
+            'expires_at': time.time() + ttl,
+        })
+
+    def stats(self) -> dict:
+        return {"skipped_oversized": self.skipped}
+
+
+class LLMResponseCache():
+    """
+    Exact-match cache of model responses keyed on model, prompt and generation
+    config. Only the response text is stored; hits are replayed as
+    `CachedResponse` objects. Backend errors are logged and treated as misses.
+    """
+
+    def __init__(self, backend: LLMCacheBackend, ttl: int = LLM_CACHE_TTL) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def get(self, key: str, model_name: Optional[str] = None) -> Optional[CachedResponse]:
+        try:
+            text = self.backend.get(key)
+        except Exception:
+            logger.exception({'log': "LLM cache read failed"})
+            self._count('errors')
+            text = None
+        self._count('hits' if text is not None else 'misses')
+        return CachedResponse(text, model_name) if text is not None else None
+
+    def set(self, key: str, response) -> None:
+        """
+        Store the text of a model response; responses without text (blocked,
+        empty) or that did not finish normally (cut off at MAX_TOKENS, stopped
+        by a safety filter) are not cached.
+        """
+        if _finish_reason(response) not in (None, 'STOP'):
+            self._count('skipped_unfinished')
+            return
+        try:
+            text = response.text
+        except Exception:
+            return
+        if not text:
+            return
+        try:
+            self.backend.set(key, text, self.ttl)
+            self._count('sets')
+        except Exception:
+            logger.exception({'log': "LLM cache write failed"})
+            self._count('errors')
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters.get('hits', 0) + counters.get('misses', 0)
+        return {
+            "backend": self.backend.__class__.__name__,
+            **counters,
+            "hit_rate": round(counters.get('hits', 0) / lookups, 4) if lookups else 0.0,
+            **self.backend.stats(),
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+
+def _finish_reason(response) -> Optional[str]:
+    candidates = getattr(response, 'candidates', None) or []
+    reason = getattr(candidates[0], 'finish_reason', None) if candidates else None
+    return None if reason is None else getattr(reason, 'name', str(reason))
+
+
+LLM_CACHE_BACKENDS = {
+    'memory': MemoryLLMCacheBackend,
+    'disk': SQLiteLLMCacheBackend,
+    'firestore': FirestoreLLMCacheBackend,
+}
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """
+    Return the process-wide LLM response cache, or None when LLM_CACHE_BACKEND is 'none'.
+    """
+    global _cache
+    if LLM_CACHE_BACKEND not in LLM_CACHE_BACKENDS:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache(LLM_CACHE_BACKENDS[LLM_CACHE_BACKEND]())
+            MetricsService.register('llm_cache', _cache.stats)
+        return _cache
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Awaitable, Iterator, Optional
+
+
+class BackgroundLoop():
+    """
+    An asyncio event loop running forever on a daemon thread.
+
+    Long-lived async resources (Playwright browsers, async gRPC channels) are
+    bound to the loop that created them. Keeping them on one shared loop lets
+    plain threads (`run`) and coroutines on any other loop (`arun`) use them.
+    """
+
+    def __init__(self, name: str = 'background-loop') -> None:
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """
+        Run `coro` on the background loop and block until it finishes.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout=timeout)
+
+    def iterate(self, agen: AsyncIterator) -> Iterator:
+        """
+        Drive the async generator `agen` on the background loop from a plain
+        thread, one item at a time. Closing the iterator early closes `agen`.
+        """
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(agen.aclose())
+
+    async def arun(self, coro: Awaitable) -> Any:
+        """
+        Await `coro` on the background loop from any other event loop.
+        """
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if current is self.loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+
+_background_loop: Optional[BackgroundLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> BackgroundLoop:
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = BackgroundLoop()
+        return _background_loop
@@ -0,0 +1,201 @@
+import os
+import asyncio
+import logging
+import threading
+import time
+from typing import List, Optional, Union
+
+from playwright.async_api import async_playwright
+
+from constants.prompt.instagram import InstagramTarget
+from service.event_loop import get_background_loop
+from service.fetch.readiness import get_readiness_strategy
+from service.fetch.interception import get_interception_profile
+from service.fetch.politeness import report_browser_response
+from service.metrics_service import LatencyRecorder, MetricsService
+
+FETCH_CONCURRENCY = int(os.environ.get('FETCH_CONCURRENCY', 16))
+FETCH_TIMEOUT = float(os.environ.get('FETCH_TIMEOUT', 60))
+BROWSER_MAX_PAGES = int(os.environ.get('BROWSER_MAX_PAGES', 100))
+BROWSER_HEADLESS = os.environ.get('BROWSER_HEADLESS', 'true').lower() == 'true'
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncFetchEngine():
+    """
+    Fetches many pages concurrently from a single Chromium on one event loop.
+
+    All Playwright objects live on the shared background loop; `fetch` blocks
+    the calling thread while `afetch` can be awaited from any event loop.
+    At most `concurrency` pages are open at once and every URL is bounded by
+    `timeout` seconds.
+    """
+
+    def __init__(self, concurrency: int = FETCH_CONCURRENCY, timeout: float = FETCH_TIMEOUT,
+                 max_pages_per_browser: int = BROWSER_MAX_PAGES,
+                 launch_options: Optional[dict] = None) -> None:
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_pages_per_browser = max_pages_per_browser
+        self.launch_options = launch_options or {'headless': BROWSER_HEADLESS}
+        self._background = get_background_loop()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._browser_lock: Optional[asyncio.Lock] = None
+        self._playwright = None
+        self._browser = None
+        self._browser_pages = 0
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._timeouts = 0
+        self._launches = 0
+        self.wait_time = LatencyRecorder()
+        self.fetch_time = LatencyRecorder()
+
+    def fetch(self, url: str, timeout: Optional[float] = None,
+              target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST) -> str:
+        """
+        Fetch a single page from synchronous code.
+        """
+        return self._background.run(self._fetch_with_timeout(url, timeout, target))
+
+    async def afetch(self, url: str, timeout: Optional[float] = None,
+                     target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST) -> str:
+        """
+        Fetch a single page from asynchronous code.
+        """
+        return await self._background.arun(self._fetch_with_timeout(url, timeout, target))
+
+    def fetch_many(self, urls: List[str], timeout: Optional[float] = None,
+                   target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST) -> List[Union[str, Exception]]:
+        """
+        Fetch several pages concurrently from synchronous code.
+
+        Returns:
+            List[Union[str, Exception]]: HTML or the raised exception, in input order.
+        """
+        return self._background.run(self._gather(urls, timeout, target))
+
+    async def afetch_many(self, urls: List[str], timeout: Optional[float] = None,
+                          target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST) -> List[Union[str, Exception]]:
+        return await self._background.arun(self._gather(urls, timeout, target))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "concurrency": self.concurrency,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "timeouts": self._timeouts,
+                "launches": self._launches,
+                "wait_time": self.wait_time.to_dict(),
+                "fetch_time": self.fetch_time.to_dict(),
+            }
+
+    def close(self) -> None:
+        self._background.run(self._close())
+
+    async def _gather(self, urls: List[str], timeout: Optional[float],
+                      target: Optional[InstagramTarget]) -> List[Union[str, Exception]]:
+        return await asyncio.gather(
+            *(self._fetch_with_timeout(url, timeout, target) for url in urls), return_exceptions=True)
+
+    async def _fetch_with_timeout(self, url: str, timeout: Optional[float],
+                                  target: Optional[InstagramTarget]) -> str:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._browser_lock = asyncio.Lock()
+        queued_at = time.monotonic()
+        async with self._semaphore:
+            self.wait_time.record(time.monotonic() - queued_at)
+            with self._stats_lock:
+                self._in_flight += 1
+            started_at = time.monotonic()
+            try:
+                html = await asyncio.wait_for(self._fetch(url, target), timeout or self.timeout)
+                with self._stats_lock:
+                    self._completed += 1
+                return html
+            except asyncio.TimeoutError:
+                with self._stats_lock:
+                    self._timeouts += 1
+                raise TimeoutError(f"Fetching {url} exceeded {timeout or self.timeout}s")
+            except Exception:
+                with self._stats_lock:
+                    self._failed += 1
+                raise
+            finally:
+                self.fetch_time.record(time.monotonic() - started_at)
+                with self._stats_lock:
+                    self._in_flight -= 1
+
+    async def _fetch(self, url: str, target: Optional[InstagramTarget]) -> str:
+        browser = await self._get_browser()
+        context = await browser.new_context()
+        try:
+            page = await context.new_page()
+            profile = get_interception_profile(target)
+            if profile:
+                await profile.install(page)
+            response = await page.goto(url, timeout=self.timeout * 1000, wait_until='domcontentloaded')
+            await asyncio.to_thread(report_browser_response, url, response, page.url)
+            await get_readiness_strategy(target).await_ready(page)
+            return await page.content()
+        finally:
+            await context.close()
+
+    async def _get_browser(self):
+        async with self._browser_lock:
+            recycle = self._browser is not None and (
+                not self._browser.is_connected()
+                or self._browser_pages >= self.max_pages_per_browser)
+            if recycle:
+                # Contexts already open keep working until they are closed.
+                retired, self._browser = self._browser, None
+                asyncio.ensure_future(self._close_browser(retired))
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            if self._browser is None:
+                self._browser = await self._playwright.chromium.launch(**self.launch_options)
+                self._browser_pages = 0
+                with self._stats_lock:
+                    self._launches += 1
+            self._browser_pages += 1
+            return self._browser
+
+    @staticmethod
+    async def _close_browser(browser) -> None:
+        # Give in-flight pages on the retired browser time to finish.
+        while browser.is_connected() and browser.contexts:
+            await asyncio.sleep(1)
+        try:
+            await browser.close()
+        except Exception:
+            pass
+
+    async def _close(self) -> None:
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+_engine: Optional[AsyncFetchEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_async_fetch_engine() -> AsyncFetchEngine:
+    """
+    Return the process-wide async fetch engine, creating it on first use.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AsyncFetchEngine()
+            MetricsService.register('async_fetch_engine', _engine.stats)
+        return _engine
@@ -0,0 +1,252 @@
+import os
+import queue
+import asyncio
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Optional
+
+from playwright.sync_api import sync_playwright, Page
+
+from service.metrics_service import LatencyRecorder, MetricsService
+
+BROWSER_POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', 2))
+BROWSER_MAX_PAGES = int(os.environ.get('BROWSER_MAX_PAGES', 100))
+BROWSER_HEADLESS = os.environ.get('BROWSER_HEADLESS', 'true').lower() == 'true'
+
+logger = logging.getLogger(__name__)
+
+
+class _PoolJob():
+    def __init__(self, fn: Callable[[Page], Any], context_options: dict) -> None:
+        self.fn = fn
+        self.context_options = context_options
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+
+
+class BrowserPool():
+    """
+    Long-lived pool of headless Chromium browsers.
+
+    Playwright's sync API binds a browser to the thread that launched it, so
+    every browser is owned by a dedicated worker thread. Callers submit a
+    callable that receives a fresh page in an isolated browser context; the
+    context is closed once the callable returns. A browser is relaunched after
+    `max_pages_per_browser` pages or as soon as it is found disconnected.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE,
+                 max_pages_per_browser: int = BROWSER_MAX_PAGES,
+                 launch_options: Optional[dict] = None) -> None:
+        self.size = size
+        self.max_pages_per_browser = max_pages_per_browser
+        self.launch_options = launch_options or {'headless': BROWSER_HEADLESS}
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._busy = 0
+        self._browsers_alive = 0
+        self._pages_served = 0
+        self._launches = 0
+        self._recycles = 0
+        self._crashes = 0
+        self._timeouts = 0
+        self._worker_failures = 0
+        self.wait_time = LatencyRecorder()
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f'browser-pool-{i}', daemon=True)
+            for i in range(size)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, fn: Callable[[Page], Any], context_options: Optional[dict] = None) -> Future:
+        """
+        Queue `fn(page)` to run on the next free browser.
+
+        Args:
+            fn (Callable[[Page], Any]): Work to perform with the page.
+            context_options (Optional[dict]): Keyword arguments for `browser.new_context`.
+
+        Returns:
+            Future: Resolves with the return value of `fn`.
+        """
+        if self._closed:
+            raise RuntimeError("BrowserPool is closed.")
+        job = _PoolJob(fn, context_options or {})
+        self._jobs.put(job)
+        return job.future
+
+    def run(self, fn: Callable[[Page], Any], context_options: Optional[dict] = None,
+            timeout: Optional[float] = None) -> Any:
+        """
+        Blocking variant of `submit`. A job still queued or running after
+        `timeout` seconds is cancelled (a running one finishes in the background)
+        and raises TimeoutError.
+        """
+        future = self.submit(fn, context_options)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self._timed_out(future)
+            raise TimeoutError(f"Browser job exceeded {timeout}s")
+
+    async def arun(self, fn: Callable[[Page], Any], context_options: Optional[dict] = None,
+                   timeout: Optional[float] = None) -> Any:
+        """
+        Awaitable variant of `run`.
+        """
+        future = self.submit(fn, context_options)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            self._timed_out(future)
+            raise TimeoutError(f"Browser job exceeded {timeout}s")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "browsers_alive": self._browsers_alive,
+                "busy": self._busy,
+                "queued": self._jobs.qsize(),
+                "pages_served": self._pages_served,
+                "launches": self._launches,
+                "recycles": self._recycles,
+                "crashes": self._crashes,
+                "timeouts": self._timeouts,
+                "worker_failures": self._worker_failures,
+                "wait_time": self.wait_time.to_dict(),
+            }
+
+    def close(self) -> None:
+        """
+        Stop accepting work, let queued jobs finish and shut every browser down.
+        """
+        self._closed = True
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _timed_out(self, future: Future) -> None:
+        future.cancel()
+        with self._lock:
+            self._timeouts += 1
+
+    def _launch(self, playwright):
+        browser = playwright.chromium.launch(**self.launch_options)
+        with self._lock:
+            self._launches += 1
+            self._browsers_alive += 1
+        return browser
+
+    def _retire(self, browser, crashed: bool = False) -> None:
+        try:
+            browser.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._browsers_alive -= 1
+            if crashed:
+                self._crashes += 1
+            else:
+                self._recycles += 1
+
+    def _worker_loop(self) -> None:
+        """
+        Serve jobs until the `None` sentinel. If Playwright fails outside a job
+        (e.g. the driver cannot start), the next queued job fails with that
+        error and Playwright is started afresh for the one after, so callers
+        never wait on a worker that is gone.
+        """
+        stopped = False
+        while not stopped:
+            try:
+                with sync_playwright() as playwright:
+                    stopped = self._serve(playwright)
+            except Exception as e:
+                logger.error({'log': traceback.format_exc()})
+                with self._lock:
+                    self._worker_failures += 1
+                if not stopped:
+                    stopped = self._fail_next(e)
+
+    def _fail_next(self, error: Exception) -> bool:
+        """
+        Returns:
+            bool: True when the sentinel was taken instead of a job.
+        """
+        job = self._jobs.get()
+        if job is None:
+            return True
+        if job.future.set_running_or_notify_cancel():
+            job.future.set_exception(error)
+        return False
+
+    def _serve(self, playwright) -> bool:
+        """
+        Returns:
+            bool: True once the sentinel was taken.
+        """
+        browser = None
+        pages = 0
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    return True
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                self.wait_time.record(time.monotonic() - job.submitted_at)
+                with self._lock:
+                    self._busy += 1
+                context = None
+                try:
+                    if browser is not None and not browser.is_connected():
+                        self._retire(browser, crashed=True)
+                        browser = None
+                    elif browser is not None and pages >= self.max_pages_per_browser:
+                        self._retire(browser)
+                        browser = None
+                    if browser is None:
+                        browser = self._launch(playwright)
+                        pages = 0
+                    context = browser.new_context(**job.context_options)
+                    page = context.new_page()
+                    job.future.set_result(job.fn(page))
+                except Exception as e:
+                    logger.error({'log': traceback.format_exc()})
+                    job.future.set_exception(e)
+                finally:
+                    if context is not None:
+                        try:
+                            context.close()
+                        except Exception:
+                            pass
+                    pages += 1
+                    with self._lock:
+                        self._busy -= 1
+                        self._pages_served += 1
+        finally:
+            if browser is not None:
+                self._retire(browser)
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """
+    Return the process-wide browser pool, starting it on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            MetricsService.register('browser_pool', _pool.stats)
+        return _pool
@@ -0,0 +1,158 @@
+import os
+import re
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+from constants.prompt.instagram import InstagramTarget
+from service.metrics_service import MetricsService
+
+INTERCEPTION_ENABLED = os.environ.get('INTERCEPTION_ENABLED', 'true').lower() == 'true'
+
+logger = logging.getLogger(__name__)
+
+# Aborted requests never report a size, so savings are estimated from typical
+# transfer sizes observed on Instagram post pages.
+ESTIMATED_BYTES = {
+    'image': 60_000,
+    'media': 400_000,
+    'font': 40_000,
+    'stylesheet': 25_000,
+    'script': 50_000,
+    'xhr': 2_000,
+    'fetch': 2_000,
+    'other': 5_000,
+}
+
+TRACKER_DOMAINS = [
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'connect.facebook.net',
+    'facebook.com',
+]
+
+TRACKER_URL_PATTERNS = [
+    r'/logging_client_events',
+    r'/ajax/bz',
+    r'/ajax/bulk-route-definitions',
+    r'/api/v1/web/log',
+]
+
+
+class InterceptionProfile():
+    """
+    Allow/deny rules deciding which subresources a page may download.
+
+    Allow rules win over deny rules. The main document is never blocked.
+    """
+
+    def __init__(self, name: str,
+                 blocked_resource_types: Iterable[str] = (),
+                 blocked_domains: Iterable[str] = (),
+                 blocked_url_patterns: Iterable[str] = (),
+                 allowed_domains: Iterable[str] = (),
+                 allowed_url_patterns: Iterable[str] = ()) -> None:
+        self.name = name
+        self.blocked_resource_types = set(blocked_resource_types)
+        self.blocked_domains = tuple(blocked_domains)
+        self.blocked_url_patterns = [re.compile(p) for p in blocked_url_patterns]
+        self.allowed_domains = tuple(allowed_domains)
+        self.allowed_url_patterns = [re.compile(p) for p in allowed_url_patterns]
+        self._lock = threading.Lock()
+        self._blocked = Counter()
+        self._allowed = 0
+        self._estimated_bytes_saved = 0
+
+    def block_reason(self, url: str, resource_type: str) -> Optional[str]:
+        """
+        Returns:
+            Optional[str]: Why the request should be aborted, or None to let it through.
+        """
+        if resource_type == 'document':
+            return None
+        host = urlsplit(url).hostname or ''
+        if self._matches_domain(host, self.allowed_domains) or any(
+                p.search(url) for p in self.allowed_url_patterns):
+            return None
+        if resource_type in self.blocked_resource_types:
+            return f'type:{resource_type}'
+        if self._matches_domain(host, self.blocked_domains):
+            return 'domain'
+        if any(p.search(url) for p in self.blocked_url_patterns):
+            return 'pattern'
+        return None
+
+    def install(self, page):
+        """
+        Route every request of `page` through this profile.
+
+        Works with both Playwright APIs: with the async API the return value is
+        a coroutine the caller must await, and the route handler's coroutines
+        are awaited by Playwright itself.
+        """
+        return page.route('**/*', self._handle)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "blocked": dict(self._blocked),
+                "allowed": self._allowed,
+                "estimated_bytes_saved": self._estimated_bytes_saved,
+            }
+
+    def _handle(self, route):
+        request = route.request
+        reason = self.block_reason(request.url, request.resource_type)
+        with self._lock:
+            if reason is None:
+                self._allowed += 1
+            else:
+                self._blocked[reason] += 1
+                self._estimated_bytes_saved += ESTIMATED_BYTES.get(
+                    request.resource_type, ESTIMATED_BYTES['other'])
+        if reason is None:
+            return route.continue_()
+        return route.abort('blockedbyclient')
+
+    @staticmethod
+    def _matches_domain(host: str, domains: tuple) -> bool:
+        return any(host == d or host.endswith('.' + d) for d in domains)
+
+
+_TEXT_ONLY = dict(
+    blocked_resource_types=['image', 'media', 'font', 'stylesheet', 'texttrack', 'eventsource', 'websocket', 'manifest'],
+    blocked_domains=TRACKER_DOMAINS,
+    blocked_url_patterns=TRACKER_URL_PATTERNS,
+)
+
+INTERCEPTION_PROFILES: Dict[InstagramTarget, InterceptionProfile] = {
+    InstagramTarget.SINGLE_POST: InterceptionProfile(InstagramTarget.SINGLE_POST.value, **_TEXT_ONLY),
+    InstagramTarget.REELS: InterceptionProfile(InstagramTarget.REELS.value, **_TEXT_ONLY),
+    InstagramTarget.PROFILE: InterceptionProfile(InstagramTarget.PROFILE.value, **_TEXT_ONLY),
+}
+
+DEFAULT_INTERCEPTION_PROFILE = InterceptionProfile(
+    'default',
+    blocked_resource_types=['image', 'media', 'font'],
+    blocked_domains=TRACKER_DOMAINS,
+    blocked_url_patterns=TRACKER_URL_PATTERNS,
+)
+
+
+def get_interception_profile(target: Optional[InstagramTarget]) -> Optional[InterceptionProfile]:
+    """
+    Returns:
+        Optional[InterceptionProfile]: Profile for `target`, or None when interception is disabled.
+    """
+    if not INTERCEPTION_ENABLED:
+        return None
+    return INTERCEPTION_PROFILES.get(target, DEFAULT_INTERCEPTION_PROFILE)
+
+
+MetricsService.register('interception', lambda: {
+    profile.name: profile.stats()
+    for profile in [*INTERCEPTION_PROFILES.values(), DEFAULT_INTERCEPTION_PROFILE]
+})
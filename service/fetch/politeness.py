@@ -0,0 +1,247 @@
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from exceptions.common import RateLimitedException
+from service.metrics_service import LatencyRecorder, MetricsService
+
+POLITENESS_ENABLED = os.environ.get('POLITENESS_ENABLED', 'true').lower() == 'true'
+# 'local': per-process state, 'sqlite': state shared by every worker on the host
+POLITENESS_STATE = os.environ.get('POLITENESS_STATE', 'sqlite')
+POLITENESS_STATE_PATH = os.environ.get('POLITENESS_STATE_PATH', '/tmp/llm_scrapper/politeness.sqlite')
+POLITENESS_RATE = float(os.environ.get('POLITENESS_RATE', 1.0))
+POLITENESS_BURST = int(os.environ.get('POLITENESS_BURST', 3))
+POLITENESS_MIN_DELAY = float(os.environ.get('POLITENESS_MIN_DELAY', 0.5))
+POLITENESS_MAX_WAIT = float(os.environ.get('POLITENESS_MAX_WAIT', 120))
+POLITENESS_BACKOFF_BASE = float(os.environ.get('POLITENESS_BACKOFF_BASE', 30))
+POLITENESS_BACKOFF_MAX = float(os.environ.get('POLITENESS_BACKOFF_MAX', 900))
+
+# Where Instagram redirects clients it is throttling.
+CHALLENGE_PATHS = ['/challenge/']
+# Where Instagram redirects clients it wants logged in; routine for anonymous HTTP requests.
+LOGIN_PATHS = ['/accounts/login']
+
+logger = logging.getLogger(__name__)
+
+
+def is_challenge_url(url: str) -> bool:
+    path = urlsplit(url).path
+    return any(path.startswith(p) for p in CHALLENGE_PATHS)
+
+
+def is_login_url(url: str) -> bool:
+    path = urlsplit(url).path
+    return any(path.startswith(p) for p in LOGIN_PATHS)
+
+
+class HostState():
+    """
+    Scheduling state of one host.
+
+    The token bucket is tracked as a theoretical arrival time (`tat`, GCRA):
+    a request may start once `tat - burst_tolerance <= now`.
+    """
+
+    def __init__(self, tat: float = 0.0, last_start: float = 0.0,
+                 backoff_until: float = 0.0, backoff_level: int = 0) -> None:
+        self.tat = tat
+        self.last_start = last_start
+        self.backoff_until = backoff_until
+        self.backoff_level = backoff_level
+
+    def to_tuple(self) -> Tuple[float, float, float, int]:
+        return self.tat, self.last_start, self.backoff_until, self.backoff_level
+
+
+class LocalHostStateStore():
+    """
+    In-process host state; enough for a single worker.
+    """
+
+    def __init__(self) -> None:
+        self._states: Dict[str, HostState] = {}
+        self._lock = threading.Lock()
+
+    def update(self, host: str, fn) -> float:
+        with self._lock:
+            state = self._states.setdefault(host, HostState())
+            return fn(state)
+
+
+class SQLiteHostStateStore():
+    """
+    Host state in a SQLite file so every worker process on the machine draws
+    from the same buckets. Updates run inside `BEGIN IMMEDIATE` transactions.
+    """
+
+    def __init__(self, path: str = POLITENESS_STATE_PATH) -> None:
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS hosts (host TEXT PRIMARY KEY, tat REAL, last_start REAL,"
+            " backoff_until REAL, backoff_level INTEGER)")
+
+    def update(self, host: str, fn) -> float:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tat, last_start, backoff_until, backoff_level FROM hosts WHERE host = ?",
+                (host,)).fetchone()
+            state = HostState(*row) if row else HostState()
+            result = fn(state)
+            conn.execute("INSERT OR REPLACE INTO hosts VALUES (?, ?, ?, ?, ?)",
+                         (host, *state.to_tuple()))
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+
+class PolitenessScheduler():
+    """
+    Per-host token buckets with a minimum inter-request delay and exponential
+    backoff on 429s and challenge pages.
+
+    `acquire` reserves the next free slot for a host and sleeps until it; the
+    time spent waiting is recorded separately from fetch time.
+    """
+
+    def __init__(self, store=None, rate: float = POLITENESS_RATE, burst: int = POLITENESS_BURST,
+                 min_delay: float = POLITENESS_MIN_DELAY, max_wait: float = POLITENESS_MAX_WAIT,
+                 backoff_base: float = POLITENESS_BACKOFF_BASE,
+                 backoff_max: float = POLITENESS_BACKOFF_MAX) -> None:
+        self.store = store or LocalHostStateStore()
+        self.interval = 1.0 / rate
+        self.burst_tolerance = (burst - 1) * self.interval
+        self.min_delay = min_delay
+        self.max_wait = max_wait
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_wait = LatencyRecorder()
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def acquire(self, url: str) -> float:
+        """
+        Block until a request to `url`'s host may start.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        delay = self._reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def aacquire(self, url: str) -> float:
+        delay = await asyncio.to_thread(self._reserve, url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def report(self, url: str, status_code: Optional[int] = None, challenge: bool = False,
+               retry_after: Optional[float] = None) -> None:
+        """
+        Feed the outcome of a request back; 429s and challenge pages push the
+        host into backoff, anything else resets it.
+        """
+        host = self._host(url)
+        throttled = challenge or status_code == 429
+
+        def apply(state: HostState) -> float:
+            now = time.time()
+            if not throttled:
+                state.backoff_level = 0
+                return 0.0
+            state.backoff_level += 1
+            backoff = min(self.backoff_base * 2 ** (state.backoff_level - 1), self.backoff_max)
+            state.backoff_until = max(state.backoff_until, now + max(backoff, retry_after or 0))
+            return state.backoff_until - now
+
+        backoff = self.store.update(host, apply)
+        if throttled:
+            self._count('challenges' if challenge else 'status_429')
+            logger.warning({'log': f"{host} throttled us, backing off {backoff:.0f}s"})
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {**counters, "queue_wait": self.queue_wait.to_dict()}
+
+    def _reserve(self, url: str) -> float:
+        host = self._host(url)
+
+        def reserve(state: HostState) -> float:
+            now = time.time()
+            start = max(now, state.tat - self.burst_tolerance,
+                        state.last_start + self.min_delay, state.backoff_until)
+            if start - now > self.max_wait:
+                return -(start - now)
+            state.tat = max(state.tat, start) + self.interval
+            state.last_start = start
+            return start - now
+
+        delay = self.store.update(host, reserve)
+        if delay < 0:
+            self._count('rejected')
+            raise RateLimitedException(
+                f"{host} is rate limited for another {-delay:.0f}s")
+        self.queue_wait.record(delay)
+        self._count('granted')
+        return delay
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    @staticmethod
+    def _host(url: str) -> str:
+        host = (urlsplit(url).hostname or '').lower()
+        return host[4:] if host.startswith('www.') else host
+
+
+_scheduler: Optional[PolitenessScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_politeness_scheduler() -> Optional[PolitenessScheduler]:
+    """
+    Return the process-wide scheduler, or None when politeness is disabled.
+    """
+    global _scheduler
+    if not POLITENESS_ENABLED:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            store = SQLiteHostStateStore() if POLITENESS_STATE == 'sqlite' else LocalHostStateStore()
+            _scheduler = PolitenessScheduler(store)
+            MetricsService.register('politeness', _scheduler.stats)
+        return _scheduler
+
+
+def report_browser_response(url: str, response, final_url: str) -> None:
+    """
+    Forward the status of a rendered page to the politeness scheduler. The
+    browser is the last resort, so a login wall there is treated as throttling.
+    """
+    scheduler = get_politeness_scheduler()
+    if scheduler:
+        scheduler.report(url, response.status if response else None,
+                         challenge=is_challenge_url(final_url) or is_login_url(final_url))
@@ -0,0 +1,212 @@
+import os
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from playwright.sync_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+from constants.prompt.instagram import InstagramTarget
+from service.metrics_service import LatencyRecorder, MetricsService
+
+READINESS_TIMEOUT_MS = int(os.environ.get('READINESS_TIMEOUT_MS', 5000))
+READINESS_POLLING_MS = int(os.environ.get('READINESS_POLLING_MS', 100))
+
+logger = logging.getLogger(__name__)
+
+
+class ReadinessCondition():
+    """
+    A page-side check evaluated repeatedly until it returns true.
+
+    `script` must be a JavaScript expression evaluating to a boolean; state
+    that has to survive between polls is kept on `window`.
+    """
+    name = 'condition'
+
+    def script(self) -> str:
+        raise NotImplementedError()
+
+
+class SelectorPresent(ReadinessCondition):
+    def __init__(self, selector: str) -> None:
+        self.selector = selector
+        self.name = f'selector:{selector}'
+
+    def script(self) -> str:
+        return f"!!document.querySelector({json.dumps(self.selector)})"
+
+
+class MetaTagsPopulated(ReadinessCondition):
+    def __init__(self, properties: List[str]) -> None:
+        self.properties = properties
+        self.name = 'meta:' + ','.join(properties)
+
+    def script(self) -> str:
+        return (
+            f"{json.dumps(self.properties)}.every(p => {{"
+            f" const m = document.querySelector(`meta[property=\"${{p}}\"]`);"
+            f" return !!(m && m.content && m.content.trim()); }})"
+        )
+
+
+class NetworkQuiet(ReadinessCondition):
+    """
+    No new resource timing entries for `quiet_ms` after the load event.
+    """
+
+    def __init__(self, quiet_ms: int = 500) -> None:
+        self.quiet_ms = quiet_ms
+        self.name = f'network_quiet:{quiet_ms}ms'
+
+    def script(self) -> str:
+        return (
+            "document.readyState === 'complete' && (() => {"
+            " const n = performance.getEntriesByType('resource').length;"
+            " const s = window.__readinessNet || (window.__readinessNet = {count: n, since: performance.now()});"
+            " if (n !== s.count) { s.count = n; s.since = performance.now(); }"
+            f" return performance.now() - s.since >= {self.quiet_ms}; }})()"
+        )
+
+
+class DomStable(ReadinessCondition):
+    """
+    No DOM mutation observed for `stable_ms`.
+    """
+
+    def __init__(self, stable_ms: int = 500) -> None:
+        self.stable_ms = stable_ms
+        self.name = f'dom_stable:{stable_ms}ms'
+
+    def script(self) -> str:
+        return (
+            "(() => {"
+            " const s = window.__readinessDom || (window.__readinessDom = (() => {"
+            "  const st = {last: performance.now()};"
+            "  new MutationObserver(() => { st.last = performance.now(); })"
+            "   .observe(document, {subtree: true, childList: true, attributes: true, characterData: true});"
+            "  return st; })());"
+            f" return performance.now() - s.last >= {self.stable_ms}; }})()"
+        )
+
+
+class ReadinessResult():
+    def __init__(self, condition: str, elapsed_ms: float) -> None:
+        self.condition = condition
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def timed_out(self) -> bool:
+        return self.condition == 'timeout'
+
+    def to_dict(self) -> dict:
+        return {"condition": self.condition, "elapsed_ms": round(self.elapsed_ms, 2)}
+
+    def __repr__(self) -> str:
+        return f"<ReadinessResult (condition={self.condition}, elapsed_ms={self.elapsed_ms:.0f})>"
+
+
+class ReadinessStrategy():
+    """
+    Waits until the first of `conditions` holds, or `timeout_ms` elapses.
+
+    Timing out is not an error: the page is used as-is, matching the old fixed
+    wait. The outcome of every wait is recorded under `name` for the metrics
+    endpoint.
+    """
+
+    def __init__(self, name: str, conditions: List[ReadinessCondition],
+                 timeout_ms: int = READINESS_TIMEOUT_MS,
+                 polling_ms: int = READINESS_POLLING_MS) -> None:
+        self.name = name
+        self.conditions = conditions
+        self.timeout_ms = timeout_ms
+        self.polling_ms = polling_ms
+        self._lock = threading.Lock()
+        self._fired = Counter()
+        self.elapsed = LatencyRecorder()
+
+    def predicate(self) -> str:
+        checks = ', '.join(
+            f"[{json.dumps(c.name)}, () => {c.script()}]" for c in self.conditions)
+        return (
+            f"() => {{ for (const [name, check] of [{checks}]) {{"
+            " try { if (check()) return name; } catch (e) {} }"
+            " return false; }"
+        )
+
+    def wait(self, page) -> ReadinessResult:
+        """
+        Block until `page` (sync API) is ready.
+        """
+        started_at = time.monotonic()
+        try:
+            handle = page.wait_for_function(
+                self.predicate(), timeout=self.timeout_ms, polling=self.polling_ms)
+            condition = handle.json_value()
+        except PlaywrightTimeoutError:
+            condition = 'timeout'
+        except PlaywrightError:
+            condition = 'error'
+        return self._record(condition, started_at)
+
+    async def await_ready(self, page) -> ReadinessResult:
+        """
+        Await until `page` (async API) is ready.
+        """
+        started_at = time.monotonic()
+        try:
+            handle = await page.wait_for_function(
+                self.predicate(), timeout=self.timeout_ms, polling=self.polling_ms)
+            condition = await handle.json_value()
+        except PlaywrightTimeoutError:
+            condition = 'timeout'
+        except PlaywrightError:
+            condition = 'error'
+        return self._record(condition, started_at)
+
+    def stats(self) -> dict:
+        with self._lock:
+            fired = dict(self._fired)
+        return {"timeout_ms": self.timeout_ms, "fired": fired, "elapsed": self.elapsed.to_dict()}
+
+    def _record(self, condition: str, started_at: float) -> ReadinessResult:
+        result = ReadinessResult(condition, (time.monotonic() - started_at) * 1000)
+        self.elapsed.record(result.elapsed_ms / 1000)
+        with self._lock:
+            self._fired[condition] += 1
+        logger.debug({'log': f"{self.name} ready: {result}"})
+        return result
+
+
+READINESS_STRATEGIES: Dict[InstagramTarget, ReadinessStrategy] = {
+    InstagramTarget.SINGLE_POST: ReadinessStrategy(InstagramTarget.SINGLE_POST.value, [
+        MetaTagsPopulated(['og:description', 'og:title']),
+        SelectorPresent('article'),
+    ]),
+    InstagramTarget.PROFILE: ReadinessStrategy(InstagramTarget.PROFILE.value, [
+        MetaTagsPopulated(['og:description']),
+        NetworkQuiet(500),
+    ]),
+    InstagramTarget.REELS: ReadinessStrategy(InstagramTarget.REELS.value, [
+        MetaTagsPopulated(['og:description', 'og:title']),
+        NetworkQuiet(500),
+    ]),
+}
+
+DEFAULT_READINESS_STRATEGY = ReadinessStrategy('default', [
+    NetworkQuiet(500),
+    DomStable(1000),
+])
+
+
+def get_readiness_strategy(target: Optional[InstagramTarget]) -> ReadinessStrategy:
+    return READINESS_STRATEGIES.get(target, DEFAULT_READINESS_STRATEGY)
+
+
+MetricsService.register('readiness', lambda: {
+    strategy.name: strategy.stats()
+    for strategy in [*READINESS_STRATEGIES.values(), DEFAULT_READINESS_STRATEGY]
+})
@@ -0,0 +1,288 @@
+import os
+import re
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from constants.prompt.instagram import InstagramTarget
+from service.event_loop import get_background_loop
+from service.fetch.browser_pool import get_browser_pool
+from service.fetch.async_engine import get_async_fetch_engine
+from service.fetch.readiness import get_readiness_strategy
+from service.fetch.interception import get_interception_profile
+from service.fetch.politeness import get_politeness_scheduler, is_challenge_url, is_login_url, report_browser_response
+from service.metrics_service import LatencyRecorder, MetricsService
+
+# 'pool': sync Playwright browser pool, 'async': playwright.async_api engine
+FETCH_ENGINE = os.environ.get('FETCH_ENGINE', 'pool')
+HTTP_FAST_PATH_ENABLED = os.environ.get('HTTP_FAST_PATH_ENABLED', 'true').lower() == 'true'
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', 10))
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', 20))
+# Seconds `page.goto` may take, and seconds a whole browser job may take,
+# waiting for a free browser and the readiness strategy included.
+BROWSER_PAGE_TIMEOUT = float(os.environ.get('BROWSER_PAGE_TIMEOUT', 60))
+BROWSER_JOB_TIMEOUT = float(os.environ.get('BROWSER_JOB_TIMEOUT', BROWSER_PAGE_TIMEOUT + 60))
+HTTP_USER_AGENT = os.environ.get(
+    'HTTP_USER_AGENT',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/131.0.0.0 Safari/537.36')
+
+TIER_HTTP = 'http'
+TIER_BROWSER = 'browser'
+
+logger = logging.getLogger(__name__)
+
+_META_TAG = re.compile(r'<meta\b[^>]*>', re.IGNORECASE)
+_META_PROPERTY = re.compile(r'\bproperty\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+_META_CONTENT = re.compile(r'\bcontent\s*=\s*["\']([^"\']*)["\']', re.IGNORECASE)
+
+
+class FetchResult():
+    def __init__(self, url: str, html: str, tier: str, elapsed_ms: float,
+                 fallback_reason: Optional[str] = None, queue_wait_ms: float = 0.0,
+                 sufficient: bool = True) -> None:
+        self.url = url
+        self.html = html
+        self.tier = tier
+        self.elapsed_ms = elapsed_ms
+        self.fallback_reason = fallback_reason
+        self.queue_wait_ms = queue_wait_ms
+        # False when the page failed its target's sufficiency check (a login wall
+        # or challenge the browser rendered too); such pages must not be cached.
+        self.sufficient = sufficient
+
+    def __repr__(self) -> str:
+        return (f"<FetchResult (url={self.url}, tier={self.tier}, elapsed_ms={self.elapsed_ms:.0f}, "
+                f"queue_wait_ms={self.queue_wait_ms:.0f}, fallback_reason={self.fallback_reason}, "
+                f"sufficient={self.sufficient})>")
+
+
+class SufficiencyCheck():
+    """
+    Decides whether server-rendered HTML is good enough to skip the browser.
+    """
+
+    def __init__(self, required_meta_properties: List[str]) -> None:
+        self.required_meta_properties = required_meta_properties
+
+    def check(self, response: httpx.Response) -> Optional[str]:
+        """
+        Returns:
+            Optional[str]: Why the response is insufficient, or None if it can be used.
+        """
+        if response.status_code != 200:
+            return f'status:{response.status_code}'
+        if is_challenge_url(str(response.url)):
+            return 'challenge'
+        if is_login_url(str(response.url)):
+            return 'login_wall'
+        return self.check_html(response.text)
+
+    def check_html(self, html: str) -> Optional[str]:
+        """
+        The content part of `check`, for pages that did not come from the fast path.
+
+        Returns:
+            Optional[str]: Why the page is insufficient, or None if it can be used.
+        """
+        populated = set()
+        for tag in _META_TAG.findall(html):
+            prop = _META_PROPERTY.search(tag)
+            content = _META_CONTENT.search(tag)
+            if prop and content and content.group(1).strip():
+                populated.add(prop.group(1))
+        missing = [p for p in self.required_meta_properties if p not in populated]
+        if missing:
+            return 'missing_meta:' + ','.join(missing)
+        return None
+
+
+SUFFICIENCY_CHECKS: Dict[InstagramTarget, SufficiencyCheck] = {
+    InstagramTarget.SINGLE_POST: SufficiencyCheck(['og:description', 'og:title']),
+    InstagramTarget.REELS: SufficiencyCheck(['og:description', 'og:title']),
+    InstagramTarget.PROFILE: SufficiencyCheck(['og:description']),
+}
+
+
+def fetch_with_browser(url: str, target: Optional[InstagramTarget]) -> str:
+    """
+    Render `url` in Chromium using the configured fetch engine.
+    """
+    if FETCH_ENGINE == 'async':
+        return get_async_fetch_engine().fetch(url, target=target)
+    return get_browser_pool().run(_load_page(url, target), timeout=BROWSER_JOB_TIMEOUT)
+
+
+async def afetch_with_browser(url: str, target: Optional[InstagramTarget]) -> str:
+    """
+    Awaitable variant of `fetch_with_browser`.
+    """
+    if FETCH_ENGINE == 'async':
+        return await get_async_fetch_engine().afetch(url, target=target)
+    return await get_browser_pool().arun(_load_page(url, target), timeout=BROWSER_JOB_TIMEOUT)
+
+
+def _load_page(url: str, target: Optional[InstagramTarget]) -> Callable:
+    def load(page) -> str:
+        profile = get_interception_profile(target)
+        if profile:
+            profile.install(page)
+        response = page.goto(url, timeout=BROWSER_PAGE_TIMEOUT * 1000, wait_until='domcontentloaded')
+        report_browser_response(url, response, page.url)
+        get_readiness_strategy(target).wait(page)
+        return page.content()
+
+    return load
+
+
+class TieredFetcher():
+    """
+    Tries a pooled HTTP/2 request first and falls back to Chromium only when
+    the response fails the target's `SufficiencyCheck`. Targets without a
+    check always go straight to the browser.
+
+    A fetch takes one politeness token, whichever tier serves it; only a fast
+    path that was throttled (429 or challenge page) waits for another before
+    the browser goes out.
+    """
+
+    def __init__(self, checks: Dict[InstagramTarget, SufficiencyCheck] = SUFFICIENCY_CHECKS,
+                 http_enabled: bool = HTTP_FAST_PATH_ENABLED) -> None:
+        self.checks = checks
+        self.http_enabled = http_enabled
+        self._background = get_background_loop()
+        self._client = httpx.Client(**self._client_options())
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+        self._served = Counter()
+        self._fallbacks = Counter()
+        self._insufficient = 0
+        self.latency = {TIER_HTTP: LatencyRecorder(), TIER_BROWSER: LatencyRecorder()}
+
+    def fetch(self, url: str, target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST) -> FetchResult:
+        started_at = time.monotonic()
+        scheduler = get_politeness_scheduler()
+        queue_wait = 0.0
+        check = self.checks.get(target) if self.http_enabled else None
+        reason = 'no_fast_path'
+        if scheduler:
+            queue_wait += scheduler.acquire(url)
+        if check:
+            try:
+                response = self._client.get(url)
+                reason = self._check(check, url, response)
+                if reason is None:
+                    return self._record(url, response.text, TIER_HTTP, started_at, queue_wait)
+            except httpx.HTTPError as e:
+                reason = f'http_error:{e.__class__.__name__}'
+            if scheduler and _throttled(reason):
+                queue_wait += scheduler.acquire(url)
+        html = fetch_with_browser(url, target)
+        return self._record(url, html, TIER_BROWSER, started_at, queue_wait, reason, self._sufficient(target, html))
+
+    async def afetch(self, url: str, target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST) -> FetchResult:
+        started_at = time.monotonic()
+        scheduler = get_politeness_scheduler()
+        queue_wait = 0.0
+        check = self.checks.get(target) if self.http_enabled else None
+        reason = 'no_fast_path'
+        if scheduler:
+            queue_wait += await scheduler.aacquire(url)
+        if check:
+            try:
+                response = await self._background.arun(self._aget(url))
+                reason = self._check(check, url, response)
+                if reason is None:
+                    return self._record(url, response.text, TIER_HTTP, started_at, queue_wait)
+            except httpx.HTTPError as e:
+                reason = f'http_error:{e.__class__.__name__}'
+            if scheduler and _throttled(reason):
+                queue_wait += await scheduler.aacquire(url)
+        html = await afetch_with_browser(url, target)
+        return self._record(url, html, TIER_BROWSER, started_at, queue_wait, reason, self._sufficient(target, html))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "served": dict(self._served),
+                "fallback_reasons": dict(self._fallbacks),
+                "insufficient": self._insufficient,
+                "latency": {tier: recorder.to_dict() for tier, recorder in self.latency.items()},
+            }
+
+    def _sufficient(self, target: Optional[InstagramTarget], html: str) -> bool:
+        # The browser is the last resort, so its page is returned either way, but
+        # one still failing the check is flagged for callers not to cache it.
+        check = self.checks.get(target)
+        return check is None or check.check_html(html) is None
+
+    @staticmethod
+    def _check(check: SufficiencyCheck, url: str, response: httpx.Response) -> Optional[str]:
+        reason = check.check(response)
+        scheduler = get_politeness_scheduler()
+        if scheduler:
+            retry_after = response.headers.get('Retry-After', '')
+            # A login wall is the expected reason to fall back, not throttling.
+            scheduler.report(url, response.status_code, challenge=reason == 'challenge',
+                             retry_after=float(retry_after) if retry_after.isdigit() else None)
+        return reason
+
+    async def _aget(self, url: str) -> httpx.Response:
+        # The async client is bound to the background loop that first uses it.
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(**self._client_options())
+        return await self._async_client.get(url)
+
+    def _record(self, url: str, html: str, tier: str, started_at: float, queue_wait: float,
+                fallback_reason: Optional[str] = None, sufficient: bool = True) -> FetchResult:
+        # Time spent waiting on the politeness scheduler is reported separately.
+        elapsed = time.monotonic() - started_at - queue_wait
+        self.latency[tier].record(elapsed)
+        with self._lock:
+            self._served[tier] += 1
+            if fallback_reason:
+                self._fallbacks[fallback_reason.split(':')[0]] += 1
+            if not sufficient:
+                self._insufficient += 1
+        result = FetchResult(url, html, tier, elapsed * 1000, fallback_reason, queue_wait * 1000, sufficient)
+        logger.debug({'log': repr(result)})
+        return result
+
+    @staticmethod
+    def _client_options() -> dict:
+        return dict(
+            http2=True,
+            follow_redirects=True,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+            headers={
+                'User-Agent': HTTP_USER_AGENT,
+                'Accept': 'text/html,application/xhtml+xml',
+                'Accept-Language': 'en-US,en;q=0.9',
+            },
+        )
+
+
+def _throttled(reason: Optional[str]) -> bool:
+    return reason in ('challenge', 'status:429')
+
+
+_fetcher: Optional[TieredFetcher] = None
+_fetcher_lock = threading.Lock()
+
+
+def get_tiered_fetcher() -> TieredFetcher:
+    """
+    Return the process-wide tiered fetcher, creating it on first use.
+    """
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = TieredFetcher()
+            MetricsService.register('tiered_fetcher', _fetcher.stats)
+        return _fetcher
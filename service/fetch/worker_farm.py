@@ -0,0 +1,431 @@
+import os
+import time
+import asyncio
+import uuid
+import atexit
+import logging
+import threading
+import traceback
+import multiprocessing
+from collections import deque
+from multiprocessing import connection
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Deque, Dict, Optional
+
+from constants.prompt.instagram import InstagramTarget
+from exceptions.common import WorkerFarmException
+from service.fetch.politeness import POLITENESS_MAX_WAIT
+from service.fetch.tiered_fetcher import BROWSER_JOB_TIMEOUT, HTTP_TIMEOUT
+from service.metrics_service import LatencyRecorder, MetricsService
+
+# 0 disables the farm and fetches in the API process.
+WORKER_FARM_WORKERS = int(os.environ.get('WORKER_FARM_WORKERS', 0))
+WORKER_FARM_HEARTBEAT_INTERVAL = float(os.environ.get('WORKER_FARM_HEARTBEAT_INTERVAL', 2))
+WORKER_FARM_HEARTBEAT_TIMEOUT = float(os.environ.get('WORKER_FARM_HEARTBEAT_TIMEOUT', 15))
+# Seconds a job may run before its worker is killed. The default fits the slowest
+# healthy fetch: two politeness waits (fast path, then browser after throttling),
+# the HTTP request and a full browser job.
+WORKER_FARM_JOB_TIMEOUT = float(os.environ.get(
+    'WORKER_FARM_JOB_TIMEOUT', 2 * POLITENESS_MAX_WAIT + HTTP_TIMEOUT + BROWSER_JOB_TIMEOUT + 30))
+WORKER_FARM_MAX_ATTEMPTS = int(os.environ.get('WORKER_FARM_MAX_ATTEMPTS', 2))
+# Seconds a caller waits for a farm job, waiting for a free worker included.
+WORKER_FARM_RESULT_TIMEOUT = float(os.environ.get(
+    'WORKER_FARM_RESULT_TIMEOUT', WORKER_FARM_JOB_TIMEOUT * WORKER_FARM_MAX_ATTEMPTS))
+
+logger = logging.getLogger(__name__)
+
+# Set in farm processes, which must fetch themselves instead of starting a farm of their own.
+_farm_child = False
+
+
+class _FarmJob():
+    def __init__(self, url: str, target: Optional[InstagramTarget],
+                 html_processor: Optional[Callable[[str], str]], keep_raw: bool = False) -> None:
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.target = target
+        self.html_processor = html_processor
+        self.keep_raw = keep_raw
+        self.future = Future()
+        self.attempts = 0
+        self.submitted_at = time.monotonic()
+
+    def message(self) -> tuple:
+        return self.id, self.url, self.target, self.html_processor, self.keep_raw
+
+
+def _worker_main(worker_id: int, conn, heartbeat_interval: float) -> None:
+    """
+    Entry point of a farm process: fetch and parse the jobs sent over `conn`
+    until a `None` sentinel. Each process lazily starts its own browser pool
+    through the tiered fetcher.
+
+    Every worker talks to the farm over its own pipe, so a worker killed
+    mid-write can only break that pipe, never a queue the others share.
+    """
+    global _farm_child
+    _farm_child = True
+    from service.fetch.tiered_fetcher import get_tiered_fetcher
+
+    stop = threading.Event()
+    send_lock = threading.Lock()
+
+    def send(message: tuple) -> None:
+        with send_lock:
+            conn.send(message)
+
+    def beat() -> None:
+        while not stop.is_set():
+            try:
+                send(('heartbeat', worker_id, None, None))
+            except OSError:
+                return
+            stop.wait(heartbeat_interval)
+
+    threading.Thread(target=beat, daemon=True).start()
+    fetcher = get_tiered_fetcher()
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        job_id, url, target, html_processor, keep_raw = message
+        try:
+            fetched = fetcher.fetch(url, target)
+            payload = html_processor(fetched.html) if html_processor else fetched.html
+            send(('done', worker_id, job_id,
+                  (payload, fetched.tier, fetched.html if keep_raw else None, fetched.sufficient)))
+        except Exception as e:
+            send(('error', worker_id, job_id,
+                  (e.__class__.__name__, str(e), traceback.format_exc())))
+    stop.set()
+    with send_lock:
+        conn.close()
+
+
+class _Worker():
+    def __init__(self, worker_id: int, process, conn) -> None:
+        self.id = worker_id
+        self.process = process
+        self.conn = conn
+        self.readable = True
+        self.last_heartbeat = time.monotonic()
+        self.job: Optional[_FarmJob] = None
+        self.job_started_at: Optional[float] = None
+
+
+class WorkerFarm():
+    """
+    Spreads fetch-and-parse jobs over `size` processes, each owning its own
+    browser pool, so Chromium and HTML parsing are not serialised by the API
+    process's GIL.
+
+    The farm hands each idle worker one job at a time over the worker's own
+    pipe and queues the rest. A supervisor thread restarts workers that die,
+    stop sending heartbeats or exceed the job timeout. The in-flight job of a
+    worker that died or went silent is retried on another worker up to
+    `max_attempts` times; one that ran past the job timeout fails. `drain` stops
+    intake, waits for outstanding jobs and asks the workers to exit, killing
+    only those that do not.
+    """
+
+    def __init__(self, size: int = WORKER_FARM_WORKERS,
+                 heartbeat_interval: float = WORKER_FARM_HEARTBEAT_INTERVAL,
+                 heartbeat_timeout: float = WORKER_FARM_HEARTBEAT_TIMEOUT,
+                 job_timeout: float = WORKER_FARM_JOB_TIMEOUT,
+                 max_attempts: int = WORKER_FARM_MAX_ATTEMPTS) -> None:
+        self.size = size
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.job_timeout = job_timeout
+        self.max_attempts = max_attempts
+        # Playwright and our background threads do not survive fork().
+        self._ctx = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _FarmJob] = {}
+        self._backlog: Deque[_FarmJob] = deque()
+        self._workers: Dict[int, _Worker] = {}
+        self._accepting = True
+        self._stopped = threading.Event()
+        self._restarts = 0
+        self._completed = 0
+        self._failed = 0
+        self._retried = 0
+        self._killed = 0
+        self.latency = LatencyRecorder()
+        for worker_id in range(size):
+            self._spawn(worker_id)
+        threading.Thread(target=self._collect, name='worker-farm-collector', daemon=True).start()
+        threading.Thread(target=self._supervise, name='worker-farm-supervisor', daemon=True).start()
+
+    def submit(self, url: str, target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST,
+               html_processor: Optional[Callable[[str], str]] = None, keep_raw: bool = False) -> Future:
+        """
+        Queue a fetch-and-parse job.
+
+        Args:
+            url (str): Page to fetch.
+            target (Optional[InstagramTarget]): Kind of page.
+            html_processor (Optional[Callable[[str], str]]): Importable, picklable processor.
+            keep_raw (bool): Also send the raw HTML back.
+
+        Returns:
+            Future: Resolves with `(processed, raw_html, sufficient)`: the processed
+            page content, the raw HTML (None unless `keep_raw` is set) and whether
+            the page passed its sufficiency check, i.e. may be cached.
+        """
+        if not self._accepting:
+            raise WorkerFarmException("WorkerFarm is draining and no longer accepts jobs.")
+        job = _FarmJob(url, target, html_processor, keep_raw)
+        with self._lock:
+            self._pending[job.id] = job
+        self._dispatch(job)
+        return job.future
+
+    def run(self, url: str, target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST,
+            html_processor: Optional[Callable[[str], str]] = None,
+            timeout: Optional[float] = None, keep_raw: bool = False):
+        """
+        Blocking variant of `submit`. A job not answered within `timeout`
+        seconds raises TimeoutError; one still queued is withdrawn.
+        """
+        future = self.submit(url, target, html_processor, keep_raw)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Farm job for {url} exceeded {timeout}s")
+
+    async def arun(self, url: str, target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST,
+                   html_processor: Optional[Callable[[str], str]] = None,
+                   timeout: Optional[float] = None, keep_raw: bool = False):
+        """
+        Awaitable variant of `run`.
+        """
+        future = self.submit(url, target, html_processor, keep_raw)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Farm job for {url} exceeded {timeout}s")
+
+    def drain(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop accepting jobs, wait for the outstanding ones and stop every worker:
+        each is sent the sentinel and joined, and only one still running after
+        that is killed. Jobs left once `timeout` has passed fail.
+        """
+        self._accepting = False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                remaining = len(self._pending)
+            if not remaining or (deadline and time.monotonic() > deadline):
+                break
+            time.sleep(0.1)
+        self._stopped.set()
+        with self._lock:
+            workers = list(self._workers.values())
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                logger.warning({'log': f"Farm worker {worker.id} did not exit, killing it"})
+                self._kill(worker)
+            worker.conn.close()
+        with self._lock:
+            leftover = list(self._pending.values())
+            self._pending.clear()
+            self._backlog.clear()
+            self._failed += len(leftover)
+        for job in leftover:
+            self._fail(job, WorkerFarmException(f"WorkerFarm drained before fetching {job.url}"))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "alive": sum(1 for w in self._workers.values() if w.process.is_alive()),
+                "busy": sum(1 for w in self._workers.values() if w.job),
+                "queued": len(self._backlog),
+                "pending": len(self._pending),
+                "completed": self._completed,
+                "failed": self._failed,
+                "retried": self._retried,
+                "restarts": self._restarts,
+                "killed": self._killed,
+                "accepting": self._accepting,
+                "latency": self.latency.to_dict(),
+            }
+
+    def _spawn(self, worker_id: int) -> None:
+        conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main, name=f'worker-farm-{worker_id}', daemon=True,
+            args=(worker_id, child_conn, self.heartbeat_interval))
+        process.start()
+        child_conn.close()
+        worker = _Worker(worker_id, process, conn)
+        with self._lock:
+            self._workers[worker_id] = worker
+            self._next_job(worker)
+
+    def _dispatch(self, job: _FarmJob) -> None:
+        job.attempts += 1
+        with self._lock:
+            self._backlog.append(job)
+            for worker in self._workers.values():
+                if worker.job is None:
+                    self._next_job(worker)
+
+    def _next_job(self, worker: _Worker) -> None:
+        # Called with the lock held: send an idle worker the oldest queued job.
+        if worker.job is not None or not self._backlog or not worker.process.is_alive():
+            return
+        job = self._backlog.popleft()
+        if not job.future.running() and not job.future.set_running_or_notify_cancel():
+            # Withdrawn by a caller that stopped waiting.
+            self._pending.pop(job.id, None)
+            self._next_job(worker)
+            return
+        try:
+            worker.conn.send(job.message())
+        except OSError:
+            # The worker is gone; the supervisor restarts it.
+            self._backlog.appendleft(job)
+            return
+        worker.job = job
+        worker.job_started_at = time.monotonic()
+
+    def _collect(self) -> None:
+        while not self._stopped.is_set():
+            with self._lock:
+                workers = {w.conn: w for w in self._workers.values() if w.readable}
+            if not workers:
+                time.sleep(0.1)
+                continue
+            for conn in connection.wait(list(workers), timeout=1):
+                worker = workers[conn]
+                try:
+                    message = conn.recv()
+                except Exception:
+                    # Closed, or cut off mid-message by a dying worker.
+                    worker.readable = False
+                    continue
+                self._handle(worker, *message)
+
+    def _handle(self, worker: _Worker, kind: str, worker_id: int, job_id: Optional[str], payload) -> None:
+        with self._lock:
+            worker.last_heartbeat = time.monotonic()
+            if kind not in ('done', 'error'):
+                return
+            if worker.job is not None and worker.job.id == job_id:
+                worker.job = None
+                worker.job_started_at = None
+                self._next_job(worker)
+            job = self._pending.pop(job_id, None)
+            if job is None:
+                return
+            if kind == 'done':
+                self._completed += 1
+            else:
+                self._failed += 1
+        self.latency.record(time.monotonic() - job.submitted_at)
+        if kind == 'done':
+            job.future.set_result((payload[0], payload[2], payload[3]))
+        else:
+            name, message, tb = payload
+            logger.error({'log': tb})
+            self._fail(job, WorkerFarmException(f"{name}: {message}"))
+
+    def _supervise(self) -> None:
+        while not self._stopped.wait(self.heartbeat_interval):
+            now = time.monotonic()
+            with self._lock:
+                workers = list(self._workers.values())
+            for worker in workers:
+                if worker.process.is_alive():
+                    reason = None
+                    if now - worker.last_heartbeat > self.heartbeat_timeout:
+                        reason = 'heartbeat timeout'
+                    elif worker.job_started_at and now - worker.job_started_at > self.job_timeout:
+                        reason = 'job timeout'
+                    if reason is None:
+                        continue
+                    logger.warning({'log': f"Restarting farm worker {worker.id}: {reason}"})
+                    self._kill(worker)
+                    # A job past the timeout outlived every budget of a healthy fetch;
+                    # sending it out again would only queue it behind the same throttling.
+                    self._recover(worker, retry=reason != 'job timeout')
+                else:
+                    logger.warning({'log': f"Farm worker {worker.id} died (exit code {worker.process.exitcode})"})
+                    self._recover(worker)
+
+    def _kill(self, worker: _Worker) -> None:
+        # Safe only because the worker's pipe is its own: nothing else reads or writes it.
+        worker.process.kill()
+        worker.process.join(timeout=5)
+        with self._lock:
+            self._killed += 1
+
+    def _recover(self, worker: _Worker, retry: bool = True) -> None:
+        with self._lock:
+            self._restarts += 1
+            job = worker.job
+            worker.job = None
+            worker.readable = False
+            if self._workers.get(worker.id) is worker:
+                del self._workers[worker.id]
+        worker.conn.close()
+        if not self._stopped.is_set():
+            self._spawn(worker.id)
+        if job is None or job.id not in self._pending:
+            return
+        if retry and job.attempts < self.max_attempts:
+            with self._lock:
+                self._retried += 1
+            self._dispatch(job)
+            return
+        with self._lock:
+            self._pending.pop(job.id, None)
+            self._failed += 1
+        if retry:
+            error = WorkerFarmException(f"Worker crashed {job.attempts} times while fetching {job.url}")
+        else:
+            error = WorkerFarmException(f"Fetching {job.url} exceeded the {self.job_timeout:.0f}s job timeout")
+        self._fail(job, error)
+
+    @staticmethod
+    def _fail(job: _FarmJob, error: Exception) -> None:
+        # A job still queued may have been withdrawn (cancelled) by its caller.
+        if job.future.done():
+            return
+        if job.future.running() or job.future.set_running_or_notify_cancel():
+            job.future.set_exception(error)
+
+
+_farm: Optional[WorkerFarm] = None
+_farm_lock = threading.Lock()
+
+
+def get_worker_farm() -> Optional[WorkerFarm]:
+    """
+    Return the process-wide worker farm, or None when WORKER_FARM_WORKERS is 0
+    or when called inside a farm process. Server processes started by uvicorn
+    are multiprocessing children too, and do get a farm.
+    """
+    global _farm
+    if WORKER_FARM_WORKERS <= 0 or _farm_child:
+        return None
+    with _farm_lock:
+        if _farm is None:
+            _farm = WorkerFarm()
+            MetricsService.register('worker_farm', _farm.stats)
+            atexit.register(_farm.drain, WORKER_FARM_JOB_TIMEOUT)
+        return _farm
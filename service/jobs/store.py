@@ -0,0 +1,401 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 'sqlite': durable file shared by the host's processes, 'firestore': shared across hosts
+# (set FIRESTORE_EMULATOR_HOST to run it locally)
+JOB_QUEUE_BACKEND = os.environ.get('JOB_QUEUE_BACKEND', 'sqlite')
+JOB_QUEUE_PATH = os.environ.get('JOB_QUEUE_PATH', '/tmp/llm_scrapper/jobs.sqlite')
+JOB_QUEUE_COLLECTION = os.environ.get('JOB_QUEUE_COLLECTION', 'scrape_jobs')
+# Seconds a worker holds a job between stage updates; past it the job is handed to another worker.
+JOB_LEASE = float(os.environ.get('JOB_LEASE', 300))
+# Runs of a job whose worker disappeared before it is failed.
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+# Seconds finished jobs stay queryable.
+JOB_RETENTION = int(os.environ.get('JOB_RETENTION', 86400))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+
+logger = logging.getLogger(__name__)
+
+
+class Job():
+    """
+    A unit of background work. `stages` lists each stage the job entered with
+    its start time; the time spent in a stage is the gap to the next one.
+    """
+
+    def __init__(self, id: str, kind: str, payload: dict, trace_id: Optional[str] = None,
+                 status: str = QUEUED, attempts: int = 0, worker: Optional[str] = None,
+                 created_at: Optional[float] = None, started_at: Optional[float] = None,
+                 finished_at: Optional[float] = None, lease_until: Optional[float] = None,
+                 stages: Optional[List[Tuple[str, float]]] = None, result: Any = None,
+                 error: Optional[str] = None, error_type: Optional[str] = None) -> None:
+        self.id = id
+        self.kind = kind
+        self.payload = payload
+        self.trace_id = trace_id
+        self.status = status
+        self.attempts = attempts
+        self.worker = worker
+        self.created_at = created_at if created_at is not None else time.time()
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.lease_until = lease_until
+        self.stages = stages if stages is not None else [(QUEUED, self.created_at)]
+        self.result = result
+        self.error = error
+        # Class name of the exception that failed the job, so callers can tell timeouts apart.
+        self.error_type = error_type
+
+    @property
+    def stage(self) -> str:
+        return self.stages[-1][0]
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def timings(self) -> Dict[str, float]:
+        """
+        Milliseconds spent in each stage, the one in progress counted up to now, plus the total.
+        """
+        timings: Dict[str, float] = {}
+        end = self.finished_at or time.time()
+        for (stage, started_at), following in zip(self.stages, self.stages[1:] + [(None, end)]):
+            if stage in (SUCCEEDED, FAILED):
+                continue
+            timings[f'{stage}_ms'] = timings.get(f'{stage}_ms', 0.0) + round((following[1] - started_at) * 1000, 2)
+        timings['total_ms'] = round((end - self.created_at) * 1000, 2)
+        return timings
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "status": self.status,
+            "stage": self.stage,
+            "attempts": self.attempts,
+            "created_at": _isoformat(self.created_at),
+            "started_at": _isoformat(self.started_at),
+            "finished_at": _isoformat(self.finished_at),
+            "timings": self.timings(),
+            "error": self.error,
+            "error_type": self.error_type,
+        }
+
+    def __repr__(self) -> str:
+        return f"<Job (id={self.id}, kind={self.kind}, status={self.status}, stage={self.stage})>"
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp is not None else None
+
+
+class JobStore():
+    """
+    Durable queue of jobs. Workers `claim` the oldest queued job under a lease,
+    which every `set_stage` renews; jobs whose lease lapsed (worker crashed or
+    was stopped) are queued again, up to `max_attempts` runs.
+    """
+
+    def __init__(self, lease: float = JOB_LEASE, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 retention: int = JOB_RETENTION) -> None:
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retention = retention
+
+    def submit(self, kind: str, payload: dict, trace_id: Optional[str] = None) -> Job:
+        raise NotImplementedError
+
+    def claim(self, worker: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    def set_stage(self, job_id: str, worker: str, stage: str) -> None:
+        raise NotImplementedError
+
+    def finish(self, job_id: str, worker: str, result: Any = None, error: Optional[str] = None,
+               error_type: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class SQLiteJobStore(JobStore):
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        trace_id TEXT,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        worker TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        lease_until REAL,
+        stages TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        error_type TEXT
+    );
+    CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+    """
+    _COLUMNS = ('id, kind, payload, trace_id, status, attempts, worker, created_at, started_at, '
+                'finished_at, lease_until, stages, result, error, error_type')
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connection()
+        conn.executescript(self._SCHEMA)
+        try:
+            # Tables created before error_type existed.
+            conn.execute("ALTER TABLE jobs ADD COLUMN error_type TEXT")
+        except sqlite3.OperationalError:
+            pass
+
+    def submit(self, kind: str, payload: dict, trace_id: Optional[str] = None) -> Job:
+        job = Job(uuid.uuid4().hex, kind, payload, trace_id)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, trace_id, status, created_at, stages) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job.id, kind, json.dumps(payload), trace_id, QUEUED, job.created_at, json.dumps(job.stages)))
+            conn.execute("DELETE FROM jobs WHERE finished_at < ?", (job.created_at - self.retention,))
+        return job
+
+    def claim(self, worker: str) -> Optional[Job]:
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)).fetchone()
+            if row is None:
+                return None
+            job = self._job(row)
+            job.status, job.worker, job.attempts = RUNNING, worker, job.attempts + 1
+            job.started_at, job.lease_until = now, now + self.lease
+            job.stages.append((RUNNING, now))
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = ?, started_at = ?, lease_until = ?, stages = ? "
+                "WHERE id = ?",
+                (RUNNING, worker, job.attempts, now, job.lease_until, json.dumps(job.stages), job.id))
+            return job
+
+    def set_stage(self, job_id: str, worker: str, stage: str) -> None:
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT stages FROM jobs WHERE id = ? AND worker = ? AND status = ?",
+                               (job_id, worker, RUNNING)).fetchone()
+            if row is None:
+                return
+            stages = json.loads(row[0]) + [(stage, now)]
+            conn.execute("UPDATE jobs SET stages = ?, lease_until = ? WHERE id = ?",
+                         (json.dumps(stages), now + self.lease, job_id))
+
+    def finish(self, job_id: str, worker: str, result: Any = None, error: Optional[str] = None,
+               error_type: Optional[str] = None) -> None:
+        now = time.time()
+        status = FAILED if error is not None else SUCCEEDED
+        with self._transaction() as conn:
+            row = conn.execute("SELECT stages FROM jobs WHERE id = ? AND worker = ? AND status = ?",
+                               (job_id, worker, RUNNING)).fetchone()
+            if row is None:
+                logger.warning({'log': f"Job {job_id} was taken from {worker} before it finished"})
+                return
+            stages = json.loads(row[0]) + [(status, now)]
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, lease_until = NULL, stages = ?, result = ?, error = ?, "
+                "error_type = ? WHERE id = ?",
+                (status, now, json.dumps(stages), json.dumps(result, default=str) if error is None else None,
+                 error, error_type, job_id))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._connection().execute(
+            f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row is not None else None
+
+    def stats(self) -> dict:
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def _expire_leases(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute(
+            "UPDATE jobs SET status = ?, worker = NULL, lease_until = NULL "
+            "WHERE status = ? AND lease_until < ? AND attempts < ?",
+            (QUEUED, RUNNING, now, self.max_attempts))
+        conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, lease_until = NULL, error = ? "
+            "WHERE status = ? AND lease_until < ?",
+            (FAILED, now, f"Worker lease expired {self.max_attempts} times", RUNNING, now))
+
+    @staticmethod
+    def _job(row: tuple) -> Job:
+        (id, kind, payload, trace_id, status, attempts, worker, created_at, started_at,
+         finished_at, lease_until, stages, result, error, error_type) = row
+        return Job(id, kind, json.loads(payload), trace_id, status, attempts, worker, created_at, started_at,
+                   finished_at, lease_until, [tuple(stage) for stage in json.loads(stages)],
+                   json.loads(result) if result is not None else None, error, error_type)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class FirestoreJobStore(JobStore):
+    """
+    Queue shared by every instance through a Firestore collection; claims run
+    in transactions so a job goes to one worker. The client honours
+    FIRESTORE_EMULATOR_HOST. Finished jobs can be purged with a Firestore TTL
+    policy on `expires_at`. Claiming needs a composite index on (status, created_at).
+    """
+
+    def __init__(self, collection: str = JOB_QUEUE_COLLECTION, **kwargs) -> None:
+        super().__init__(**kwargs)
+        from google.cloud import firestore
+
+        self._firestore = firestore
+        self._client = firestore.Client(project=os.environ.get('GCP_PROJECT_ID'))
+        self._collection = self._client.collection(collection)
+
+    def submit(self, kind: str, payload: dict, trace_id: Optional[str] = None) -> Job:
+        job = Job(uuid.uuid4().hex, kind, payload, trace_id)
+        self._collection.document(job.id).set(self._document(job))
+        return job
+
+    def claim(self, worker: str) -> Optional[Job]:
+        now = time.time()
+        self._expire_leases(now)
+        for snapshot in self._collection.where('status', '==', QUEUED).order_by('created_at').limit(5).stream():
+            job = self._claim(self._client.transaction(), snapshot.reference, worker, now)
+            if job is not None:
+                return job
+        return None
+
+    def set_stage(self, job_id: str, worker: str, stage: str) -> None:
+        now = time.time()
+        ref = self._collection.document(job_id)
+        snapshot = ref.get()
+        if not snapshot.exists or snapshot.get('worker') != worker or snapshot.get('status') != RUNNING:
+            return
+        ref.update({'stages': self._firestore.ArrayUnion([{'stage': stage, 'at': now}]),
+                    'lease_until': now + self.lease})
+
+    def finish(self, job_id: str, worker: str, result: Any = None, error: Optional[str] = None,
+               error_type: Optional[str] = None) -> None:
+        now = time.time()
+        status = FAILED if error is not None else SUCCEEDED
+        ref = self._collection.document(job_id)
+        snapshot = ref.get()
+        if not snapshot.exists or snapshot.get('worker') != worker or snapshot.get('status') != RUNNING:
+            logger.warning({'log': f"Job {job_id} was taken from {worker} before it finished"})
+            return
+        ref.update({
+            'status': status,
+            'finished_at': now,
+            'expires_at': datetime.fromtimestamp(now + self.retention),
+            'lease_until': None,
+            'stages': self._firestore.ArrayUnion([{'stage': status, 'at': now}]),
+            'result': json.dumps(result, default=str) if error is None else None,
+            'error': error,
+            'error_type': error_type,
+        })
+
+    def get(self, job_id: str) -> Optional[Job]:
+        snapshot = self._collection.document(job_id).get()
+        return self._job(snapshot.to_dict()) if snapshot.exists else None
+
+    def _claim(self, transaction, ref, worker: str, now: float) -> Optional[Job]:
+        @self._firestore.transactional
+        def claim(transaction):
+            snapshot = ref.get(transaction=transaction)
+            if not snapshot.exists or snapshot.get('status') != QUEUED:
+                return None
+            job = self._job(snapshot.to_dict())
+            job.status, job.worker, job.attempts = RUNNING, worker, job.attempts + 1
+            job.started_at, job.lease_until = now, now + self.lease
+            job.stages.append((RUNNING, now))
+            transaction.update(ref, {
+                'status': RUNNING, 'worker': worker, 'attempts': job.attempts, 'started_at': now,
+                'lease_until': job.lease_until,
+                'stages': [{'stage': stage, 'at': at} for stage, at in job.stages],
+            })
+            return job
+
+        return claim(transaction)
+
+    def _expire_leases(self, now: float) -> None:
+        for snapshot in self._collection.where('status', '==', RUNNING).where('lease_until', '<', now).stream():
+            if snapshot.get('attempts') < self.max_attempts:
+                snapshot.reference.update({'status': QUEUED, 'worker': None, 'lease_until': None})
+            else:
+                snapshot.reference.update({'status': FAILED, 'finished_at': now, 'lease_until': None,
+                                           'error': f"Worker lease expired {self.max_attempts} times"})
+
+    @staticmethod
+    def _document(job: Job) -> dict:
+        return {
+            'id': job.id, 'kind': job.kind, 'payload': json.dumps(job.payload), 'trace_id': job.trace_id,
+            'status': job.status, 'attempts': job.attempts, 'worker': job.worker, 'created_at': job.created_at,
+            'started_at': job.started_at, 'finished_at': job.finished_at, 'lease_until': job.lease_until,
+            'stages': [{'stage': stage, 'at': at} for stage, at in job.stages], 'result': None, 'error': None,
+            'error_type': None,
+        }
+
+    @staticmethod
+    def _job(doc: dict) -> Job:
+        return Job(doc['id'], doc['kind'], json.loads(doc['payload']), doc.get('trace_id'), doc['status'],
+                   doc.get('attempts', 0), doc.get('worker'), doc['created_at'], doc.get('started_at'),
+                   doc.get('finished_at'), doc.get('lease_until'),
+                   [(stage['stage'], stage['at']) for stage in doc.get('stages', [])],
+                   json.loads(doc['result']) if doc.get('result') is not None else None, doc.get('error'),
+                   doc.get('error_type'))
+
+
+JOB_QUEUE_BACKENDS = {
+    'sqlite': SQLiteJobStore,
+    'firestore': FirestoreJobStore,
+}
+
+
+def create_job_store(name: str = JOB_QUEUE_BACKEND) -> JobStore:
+    """
+    Build the job store selected by JOB_QUEUE_BACKEND.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    if name not in JOB_QUEUE_BACKENDS:
+        raise ValueError(f"Unknown job queue backend {name!r}, expected one of {', '.join(JOB_QUEUE_BACKENDS)}")
+    return JOB_QUEUE_BACKENDS[name]()
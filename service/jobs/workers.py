@@ -0,0 +1,166 @@
+import os
+import socket
+import logging
+import threading
+import traceback
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from service.jobs.store import Job, JobStore, create_job_store
+from service.metrics_service import LatencyRecorder, MetricsService
+
+# Threads per process draining the job queue; 0 leaves jobs to other processes.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+# Seconds an idle worker waits before looking for jobs submitted by other processes.
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+
+# Runs a job's payload, reporting the stages it goes through, and returns its JSON-serialisable result.
+JobHandler = Callable[[dict, Callable[[str], None]], Any]
+
+logger = logging.getLogger(__name__)
+
+
+def _error_type(error: BaseException) -> str:
+    """
+    Name of the first timeout in `error`'s cause chain, since handlers wrap the
+    errors they raise, or else of `error` itself.
+    """
+    seen = set()
+    cause = error
+    while cause is not None and id(cause) not in seen:
+        if isinstance(cause, TimeoutError):
+            return cause.__class__.__name__
+        seen.add(id(cause))
+        cause = cause.__cause__ or cause.__context__
+    return error.__class__.__name__
+
+
+class JobWorkerPool():
+    """
+    Threads that claim jobs from a `JobStore` and run them with the handler
+    registered for their kind. Submissions from this process wake an idle
+    worker at once; jobs from other processes are picked up on the next poll.
+    """
+
+    def __init__(self, store: JobStore, handlers: Dict[str, JobHandler], workers: int = JOB_WORKERS,
+                 poll_interval: float = JOB_POLL_INTERVAL) -> None:
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.latency = LatencyRecorder()
+        self._name = f"{socket.gethostname()}:{os.getpid()}"
+        self._threads: List[threading.Thread] = []
+        self._wake = threading.Condition()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._busy = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, args=(f"{self._name}:{index}",),
+                                          name=f'job-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop claiming jobs and wait up to `timeout` seconds for running ones to
+        finish; jobs still running are picked up elsewhere once their lease lapses.
+        """
+        self._stopping.set()
+        with self._wake:
+            self._wake.notify_all()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, kind: str, payload: dict, trace_id: Optional[str] = None) -> Job:
+        """
+        Queue a job and return it without waiting for it to run.
+
+        Raises:
+            ValueError: If no handler is registered for `kind`.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind {kind!r}, expected one of {', '.join(self.handlers)}")
+        job = self.store.submit(kind, payload, trace_id)
+        self._count('submitted')
+        with self._wake:
+            self._wake.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            busy = self._busy
+        return {
+            "workers": len(self._threads),
+            "busy": busy,
+            **counters,
+            "queue": self.store.stats(),
+            "latency": self.latency.to_dict(),
+        }
+
+    def _run(self, worker: str) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = self.store.claim(worker)
+            except Exception:
+                logger.exception({'log': "Could not claim a job"})
+                job = None
+            if job is None:
+                with self._wake:
+                    self._wake.wait(self.poll_interval)
+                continue
+            self._execute(job, worker)
+
+    def _execute(self, job: Job, worker: str) -> None:
+        with self._lock:
+            self._busy += 1
+        try:
+            handler = self.handlers.get(job.kind)
+            if handler is None:
+                raise ValueError(f"No handler for job kind {job.kind!r}")
+            result = handler(job.payload, lambda stage: self.store.set_stage(job.id, worker, stage))
+            self.store.finish(job.id, worker, result=result)
+            self._count('succeeded')
+        except Exception as e:
+            logger.error({'log': f"Job {job.id} failed", 'traceback': traceback.format_exc()})
+            self.store.finish(job.id, worker, error=str(e) or e.__class__.__name__, error_type=_error_type(e))
+            self._count('failed')
+        finally:
+            with self._lock:
+                self._busy -= 1
+            self.latency.record(max(0.0, job.timings()['total_ms'] / 1000))
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+
+_pool: Optional[JobWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_job_workers(handlers: Optional[Dict[str, JobHandler]] = None) -> JobWorkerPool:
+    """
+    Return the process-wide job worker pool, creating and starting it with
+    `handlers` on first call.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = JobWorkerPool(create_job_store(), handlers or {})
+            _pool.start()
+            MetricsService.register('jobs', _pool.stats)
+        return _pool
@@ -0,0 +1,124 @@
+import os
+import time
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Optional
+
+from service.event_loop import get_background_loop
+from service.metrics_service import LatencyRecorder, MetricsService
+
+GEMINI_ASYNC_ENABLED = os.environ.get('GEMINI_ASYNC_ENABLED', 'true').lower() == 'true'
+GEMINI_CONCURRENCY = int(os.environ.get('GEMINI_CONCURRENCY', 8))
+GEMINI_TIMEOUT = float(os.environ.get('GEMINI_TIMEOUT', 60))
+
+
+class AsyncGenerationClient():
+    """
+    Runs the SDK's `generate_content_async` on the shared background loop, so
+    a model round-trip holds no thread while it waits.
+
+    The async gRPC channel is bound to the loop that first uses it, which is
+    why every call is scheduled on the background loop whatever loop awaits it.
+    At most `concurrency` calls are in flight and each one is bounded by
+    `timeout` seconds.
+    """
+
+    def __init__(self, concurrency: int = GEMINI_CONCURRENCY, timeout: float = GEMINI_TIMEOUT) -> None:
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._background = get_background_loop()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._timeouts = 0
+        self.wait_time = LatencyRecorder()
+        self.call_time = LatencyRecorder()
+
+    async def agenerate(self, model, contents: Any, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Await `model.generate_content_async(contents, **kwargs)` from any event loop.
+        """
+        return await self._background.arun(self._bounded(
+            model, lambda: model.generate_content_async(contents, **kwargs), timeout))
+
+    async def astream(self, model, contents: Any, on_text: Callable[[str], bool],
+                      timeout: Optional[float] = None, **kwargs) -> None:
+        """
+        Stream `model.generate_content_async(contents, stream=True, **kwargs)`,
+        passing the text of each chunk to `on_text` (called on the background
+        loop) until it returns True or the stream ends. The timeout bounds the
+        whole stream.
+        """
+        await self._background.arun(self._bounded(
+            model, lambda: self._consume(model, contents, on_text, kwargs), timeout))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "concurrency": self.concurrency,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "timeouts": self._timeouts,
+                "wait_time": self.wait_time.to_dict(),
+                "call_time": self.call_time.to_dict(),
+            }
+
+    async def _bounded(self, model, call: Callable[[], Awaitable], timeout: Optional[float]) -> Any:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        timeout = min(timeout, self.timeout) if timeout else self.timeout
+        queued_at = time.monotonic()
+        async with self._semaphore:
+            self.wait_time.record(time.monotonic() - queued_at)
+            with self._stats_lock:
+                self._in_flight += 1
+            started_at = time.monotonic()
+            try:
+                response = await asyncio.wait_for(call(), timeout)
+                with self._stats_lock:
+                    self._completed += 1
+                return response
+            except asyncio.TimeoutError:
+                with self._stats_lock:
+                    self._timeouts += 1
+                raise TimeoutError(f"{getattr(model, 'model_name', 'Model')} call exceeded {timeout}s")
+            except Exception:
+                with self._stats_lock:
+                    self._failed += 1
+                raise
+            finally:
+                self.call_time.record(time.monotonic() - started_at)
+                with self._stats_lock:
+                    self._in_flight -= 1
+
+    @staticmethod
+    async def _consume(model, contents: Any, on_text: Callable[[str], bool], kwargs: dict) -> None:
+        response = await model.generate_content_async(contents, stream=True, **kwargs)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except Exception:
+                continue
+            if on_text(text):
+                break
+
+
+_client: Optional[AsyncGenerationClient] = None
+_client_lock = threading.Lock()
+
+
+def get_async_generation_client() -> Optional[AsyncGenerationClient]:
+    """
+    Return the process-wide async generation client, or None when GEMINI_ASYNC_ENABLED is false.
+    """
+    global _client
+    if not GEMINI_ASYNC_ENABLED:
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = AsyncGenerationClient()
+            MetricsService.register('gemini_async', _client.stats)
+        return _client
@@ -0,0 +1,256 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Any, AsyncIterator, Iterator, Optional
+
+# 'gemini': Google AI Studio, 'openai': any OpenAI-compatible endpoint, 'stub': the local stub server
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'gemini')
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
+LLM_STUB_URL = os.environ.get('LLM_STUB_URL', 'http://127.0.0.1:8089/v1')
+# Append every non-streamed answer to this JSONL file, for replay by the stub server.
+LLM_RECORD_PATH = os.environ.get('LLM_RECORD_PATH')
+
+# OpenAI finish reasons mapped to the Gemini names the pipeline checks.
+_FINISH_REASONS = {'stop': 'STOP', 'length': 'MAX_TOKENS', 'content_filter': 'SAFETY'}
+
+
+def prompt_key(contents: Any) -> str:
+    """
+    Key of a prompt in recordings, shared by the recorder and the stub server.
+    """
+    text = contents if isinstance(contents, str) else json.dumps(contents, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class _FinishReason():
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+
+class _Candidate():
+    def __init__(self, finish_reason: str) -> None:
+        self.finish_reason = _FinishReason(finish_reason)
+
+
+class _Usage():
+    def __init__(self, prompt_tokens: int = 0, output_tokens: int = 0, cached_tokens: int = 0) -> None:
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.cached_content_token_count = cached_tokens
+
+
+class LLMResponse():
+    """
+    Backend-neutral answer exposing the parts of a `GenerateContentResponse` the
+    pipeline reads: `text`, `candidates[0].finish_reason.name` and `usage_metadata`.
+    """
+
+    def __init__(self, text: str, model_name: Optional[str] = None, finish_reason: str = 'STOP',
+                 prompt_tokens: int = 0, output_tokens: int = 0, cached_tokens: int = 0) -> None:
+        self.text = text
+        self.model_name = model_name
+        self.candidates = [_Candidate(finish_reason)]
+        self.usage_metadata = _Usage(prompt_tokens, output_tokens, cached_tokens)
+
+
+class LLMModel():
+    """
+    A model of a backend, with the `google.generativeai.GenerativeModel` call
+    surface: `generate_content` and `generate_content_async`, both taking
+    `stream=True` to return an iterator of chunks exposing `text`.
+    """
+
+    def __init__(self, model_name: str) -> None:
+        self.model_name = model_name
+
+    def generate_content(self, contents: Any, generation_config: Optional[dict] = None, stream: bool = False,
+                         request_options: Optional[dict] = None):
+        raise NotImplementedError
+
+    async def generate_content_async(self, contents: Any, generation_config: Optional[dict] = None, stream: bool = False,
+                                     request_options: Optional[dict] = None):
+        raise NotImplementedError
+
+
+class LLMBackend():
+    """
+    Factory of the models the scraper calls. `name` tells provider-specific
+    features (context caching) which backend they run against.
+    """
+    name = ''
+
+    def model(self, model_name: str) -> Any:
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    name = 'gemini'
+
+    def __init__(self, api_key: Optional[str] = None) -> None:
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key or os.environ["GOOGLE_API_KEY"])
+        self._genai = genai
+
+    def model(self, model_name: str) -> Any:
+        return self._genai.GenerativeModel(model_name)
+
+
+class OpenAICompatibleModel(LLMModel):
+    """
+    Chat completions model of an OpenAI-compatible endpoint. JSON output is
+    requested with `response_format` when the generation config asks for it;
+    a `response_schema` is not forwarded, the answer is validated locally.
+    """
+
+    def __init__(self, model_name: str, client, async_client) -> None:
+        super().__init__(model_name)
+        self._client = client
+        self._async_client = async_client
+
+    def generate_content(self, contents: Any, generation_config: Optional[dict] = None, stream: bool = False,
+                         request_options: Optional[dict] = None):
+        request = self._request(contents, generation_config or {}, request_options or {})
+        if stream:
+            return self._chunks(self._client.chat.completions.create(stream=True, **request))
+        return self._response(self._client.chat.completions.create(**request))
+
+    async def generate_content_async(self, contents: Any, generation_config: Optional[dict] = None, stream: bool = False,
+                                     request_options: Optional[dict] = None):
+        request = self._request(contents, generation_config or {}, request_options or {})
+        if stream:
+            return self._achunks(await self._async_client.chat.completions.create(stream=True, **request))
+        return self._response(await self._async_client.chat.completions.create(**request))
+
+    def _request(self, contents: Any, generation_config: dict, request_options: dict) -> dict:
+        if isinstance(contents, str):
+            messages = [{"role": "user", "content": contents}]
+        else:
+            messages = [{"role": "user", "content": str(part)} for part in contents]
+        request = {"model": self.model_name, "messages": messages}
+        if generation_config.get('response_mime_type') == 'application/json':
+            request["response_format"] = {"type": "json_object"}
+        if 'temperature' in generation_config:
+            request["temperature"] = generation_config['temperature']
+        if 'max_output_tokens' in generation_config:
+            request["max_tokens"] = generation_config['max_output_tokens']
+        if request_options.get('timeout'):
+            request["timeout"] = request_options['timeout']
+        return request
+
+    def _response(self, completion) -> LLMResponse:
+        choice = completion.choices[0]
+        usage = getattr(completion, 'usage', None)
+        details = getattr(usage, 'prompt_tokens_details', None)
+        return LLMResponse(
+            choice.message.content or '',
+            self.model_name,
+            _FINISH_REASONS.get(choice.finish_reason, str(choice.finish_reason).upper()),
+            getattr(usage, 'prompt_tokens', 0) or 0,
+            getattr(usage, 'completion_tokens', 0) or 0,
+            getattr(details, 'cached_tokens', 0) or 0)
+
+    def _chunks(self, stream) -> Iterator[LLMResponse]:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield LLMResponse(chunk.choices[0].delta.content, self.model_name)
+
+    async def _achunks(self, stream) -> AsyncIterator[LLMResponse]:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield LLMResponse(chunk.choices[0].delta.content, self.model_name)
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    name = 'openai'
+
+    def __init__(self, base_url: str = OPENAI_BASE_URL, api_key: str = OPENAI_API_KEY) -> None:
+        import openai
+
+        # Retries are left to the caller, which knows the request's deadline.
+        self._client = openai.OpenAI(base_url=base_url, api_key=api_key or 'unused', max_retries=0)
+        self._async_client = openai.AsyncOpenAI(base_url=base_url, api_key=api_key or 'unused', max_retries=0)
+
+    def model(self, model_name: str) -> Any:
+        return OpenAICompatibleModel(model_name, self._client, self._async_client)
+
+
+class StubBackend(OpenAICompatibleBackend):
+    """
+    The local stub server (`python -m service.llm_scrap.stub_server`), which
+    speaks the OpenAI chat completions protocol and replays recorded answers.
+    """
+    name = 'stub'
+
+    def __init__(self, base_url: str = LLM_STUB_URL) -> None:
+        super().__init__(base_url=base_url, api_key='stub')
+
+
+class RecordingModel():
+    """
+    Wraps a model and appends each non-streamed answer, keyed by `prompt_key`,
+    to a JSONL recording the stub server can replay.
+    """
+    _lock = threading.Lock()
+
+    def __init__(self, model, path: str) -> None:
+        self._model = model
+        self.path = path
+        self.model_name = getattr(model, 'model_name', None)
+
+    def generate_content(self, contents: Any, **kwargs):
+        response = self._model.generate_content(contents, **kwargs)
+        if not kwargs.get('stream'):
+            self._record(contents, response)
+        return response
+
+    async def generate_content_async(self, contents: Any, **kwargs):
+        response = await self._model.generate_content_async(contents, **kwargs)
+        if not kwargs.get('stream'):
+            self._record(contents, response)
+        return response
+
+    def _record(self, contents: Any, response) -> None:
+        try:
+            text = response.text
+        except Exception:
+            return
+        line = json.dumps({"key": prompt_key(contents), "model": self.model_name, "text": text}, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+LLM_BACKENDS = {
+    'gemini': GeminiBackend,
+    'openai': OpenAICompatibleBackend,
+    'stub': StubBackend,
+}
+
+
+class _RecordingBackend(LLMBackend):
+    def __init__(self, backend: LLMBackend, path: str) -> None:
+        self._backend = backend
+        self.name = backend.name
+        self.path = path
+
+    def model(self, model_name: str) -> Any:
+        return RecordingModel(self._backend.model(model_name), self.path)
+
+
+def create_llm_backend(name: str = LLM_BACKEND, record_path: Optional[str] = LLM_RECORD_PATH) -> LLMBackend:
+    """
+    Build the backend selected by LLM_BACKEND, recording its answers when LLM_RECORD_PATH is set.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}, expected one of {', '.join(LLM_BACKENDS)}")
+    backend = LLM_BACKENDS[name]()
+    if record_path:
+        os.makedirs(os.path.dirname(record_path) or '.', exist_ok=True)
+        return _RecordingBackend(backend, record_path)
+    return backend
@@ -1,19 +1,27 @@
-from playwright.sync_api import sync_playwright
-from typing import Callable, Optional
+import asyncio
+from typing import Callable, Optional, Tuple
 from abc import ABC
 from proto import Message
+from service.fetch.tiered_fetcher import FetchResult, get_tiered_fetcher
+from service.cache.html_cache import get_html_cache
+from service.fetch.worker_farm import WORKER_FARM_RESULT_TIMEOUT, get_worker_farm
+from service.llm_scrap.backends import LLMBackend
+from constants.prompt.instagram import InstagramTarget
 
 
 class BaseLLMScraperService(ABC):
-    def __init__(self, llm_model: Callable, base_prompt: Optional[str] = None):
+    def __init__(self, llm_model: Callable, base_prompt: Optional[str] = None,
+                 backend: Optional[LLMBackend] = None):
         """
         Initialize the scraper service.
 
         :param llm_model: Callable that invokes the LLM for processing.
         :param base_prompt: Default prompt for the LLM.
+        :param backend: Backend the service's models come from (Gemini, OpenAI-compatible, stub).
         """
         self.llm_model = llm_model
         self.base_prompt = base_prompt
+        self.backend = backend
 
     def set_scrap_prompt(self, prompt: str):
         """
@@ -33,10 +41,7 @@ class BaseLLMScraperService(ABC):
         :param html_processor: A callable that processes HTML and extracts relevant content.
         :return: A dictionary containing structured data parsed by the LLM.
         """
-        html_content = self._fetch_page_content(url)
-
-        processed_html = html_processor(
-            html_content) if html_processor else html_content
+        processed_html = self._fetch_processed(url, html_processor)
 
         if not self.base_prompt:
             raise ValueError(
@@ -45,22 +50,129 @@ class BaseLLMScraperService(ABC):
 
         return self.llm_model(prompt)
 
-    def _fetch_page_content(self, url: str) -> str:
+    def _fetch_page_content(self, url: str, target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST) -> str:
         """
-        Fetches the page content using Playwright.
+        Fetches the page content, over plain HTTP when sufficient, otherwise with Playwright.
 
         :param url: The URL to scrape.
+        :param target: Kind of page, selects the sufficiency check and readiness strategy.
         :return: The HTML content of the page.
         """
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context()
-            page = context.new_page()
+        return self._fetch_page(url, target).html
+
+    async def _afetch_page_content(self, url: str, target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST) -> str:
+        """
+        Awaitable variant of `_fetch_page_content`.
+        """
+        return (await self._afetch_page(url, target)).html
+
+    def _fetch_page(self, url: str, target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST) -> FetchResult:
+        """
+        Like `_fetch_page_content` but also reports which tier served the page.
+        """
+        return get_tiered_fetcher().fetch(url, target)
+
+    async def _afetch_page(self, url: str, target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST) -> FetchResult:
+        return await get_tiered_fetcher().afetch(url, target)
+
+    def _fetch_processed(self, url: str, html_processor: Optional[Callable[[str], str]] = None,
+                         target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST) -> str:
+        """
+        Fetch a page and run `html_processor` on it, reusing cached raw and processed HTML.
+
+        :param url: The URL to scrape.
+        :param html_processor: A callable that processes HTML and extracts relevant content.
+        :param target: Kind of page, selects fetch behaviour and cache TTL.
+        :return: The processed (or raw, without a processor) page content.
+        """
+        return self._fetch_with_raw(url, html_processor, target, keep_raw=False)[0]
+
+    async def _afetch_processed(self, url: str, html_processor: Optional[Callable[[str], str]] = None,
+                                target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST) -> str:
+        """
+        Awaitable variant of `_fetch_processed`.
+        """
+        return (await self._afetch_with_raw(url, html_processor, target, keep_raw=False))[0]
+
+    def _fetch_with_raw(self, url: str, html_processor: Optional[Callable[[str], str]] = None,
+                        target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST,
+                        keep_raw: bool = True) -> Tuple[str, Optional[str]]:
+        """
+        Like `_fetch_processed`, but also hand back the raw HTML the page was processed from.
+
+        :param keep_raw: Look the raw HTML up (or ship it back from the worker farm) at all.
+            Pages failing the target's sufficiency check are returned but not cached.
+        :return: The processed page content and the raw HTML, None when only the
+            processed content was cached.
+        """
+        cache = get_html_cache()
+        processor = self._processor_name(html_processor)
+        if cache and processor:
+            cached = cache.get_processed(url, processor)
+            if cached is not None:
+                return cached, cache.get_raw(url) if keep_raw else None
+
+        farm = get_worker_farm()
+        if farm:
+            processed_html, html_content, sufficient = farm.run(
+                url, target, html_processor, timeout=WORKER_FARM_RESULT_TIMEOUT, keep_raw=keep_raw)
+            if cache and processor and sufficient:
+                cache.set_processed(url, processor, processed_html, target)
+            return processed_html, html_content
+
+        html_content = cache.get_raw(url) if cache else None
+        sufficient = True
+        if html_content is None:
+            fetched = self._fetch_page(url, target)
+            html_content, sufficient = fetched.html, fetched.sufficient
+            if cache and sufficient:
+                cache.set_raw(url, html_content, target)
+
+        if not html_processor:
+            return html_content, html_content
+        processed_html = html_processor(html_content)
+        if cache and sufficient:
+            cache.set_processed(url, processor, processed_html, target)
+        return processed_html, html_content
+
+    async def _afetch_with_raw(self, url: str, html_processor: Optional[Callable[[str], str]] = None,
+                               target: Optional[InstagramTarget] = InstagramTarget.SINGLE_POST,
+                               keep_raw: bool = True) -> Tuple[str, Optional[str]]:
+        """
+        Awaitable variant of `_fetch_with_raw`; cache I/O and processing run off the event loop.
+        """
+        cache = get_html_cache()
+        processor = self._processor_name(html_processor)
+        if cache and processor:
+            cached = await asyncio.to_thread(cache.get_processed, url, processor)
+            if cached is not None:
+                return cached, await asyncio.to_thread(cache.get_raw, url) if keep_raw else None
+
+        farm = get_worker_farm()
+        if farm:
+            processed_html, html_content, sufficient = await farm.arun(
+                url, target, html_processor, timeout=WORKER_FARM_RESULT_TIMEOUT, keep_raw=keep_raw)
+            if cache and processor and sufficient:
+                await asyncio.to_thread(cache.set_processed, url, processor, processed_html, target)
+            return processed_html, html_content
 
-            page.goto(url, timeout=60000)
-            page.wait_for_timeout(5000)  # Adjust as needed for page loading
-            html_content = page.content()
+        html_content = await asyncio.to_thread(cache.get_raw, url) if cache else None
+        sufficient = True
+        if html_content is None:
+            fetched = await self._afetch_page(url, target)
+            html_content, sufficient = fetched.html, fetched.sufficient
+            if cache and sufficient:
+                await asyncio.to_thread(cache.set_raw, url, html_content, target)
 
-            browser.close()
+        if not html_processor:
+            return html_content, html_content
+        processed_html = await asyncio.to_thread(html_processor, html_content)
+        if cache and sufficient:
+            await asyncio.to_thread(cache.set_processed, url, processor, processed_html, target)
+        return processed_html, html_content
 
-        return html_content
+    @staticmethod
+    def _processor_name(html_processor: Optional[Callable]) -> Optional[str]:
+        if html_processor is None:
+            return None
+        return f"{html_processor.__module__}.{getattr(html_processor, '__qualname__', repr(html_processor))}"
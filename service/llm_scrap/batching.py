@@ -0,0 +1,198 @@
+import os
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Union
+
+from service.parser.tokens import count_tokens
+from service.parser.structured_output import loads_lenient
+
+# Input tokens of page content packed into one request.
+BATCH_TOKEN_BUDGET = int(os.environ.get('BATCH_TOKEN_BUDGET', 24000))
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 20))
+# Output tokens the model may produce per request, and what one record needs.
+BATCH_MAX_OUTPUT_TOKENS = int(os.environ.get('BATCH_MAX_OUTPUT_TOKENS', 8192))
+BATCH_OUTPUT_TOKENS_PER_ITEM = int(os.environ.get('BATCH_OUTPUT_TOKENS_PER_ITEM', 250))
+# Seconds an item submitted to a BatchCollector waits for others to share its batch.
+BATCH_LINGER = float(os.environ.get('BATCH_LINGER', 1.0))
+
+# Extracts a batch of items, returning the record or the error per item id.
+BatchExtractor = Callable[[List['BatchItem']], Awaitable[Dict[str, Union[dict, Exception]]]]
+
+
+class BatchItem():
+    def __init__(self, item_id: str, url: str, content: str) -> None:
+        self.id = str(item_id)
+        self.url = url
+        self.content = content
+        self.tokens = count_tokens(content)
+
+    def render(self) -> str:
+        return f'<item id="{self.id}" url="{self.url}">\n{self.content}\n</item>'
+
+
+def split_batch_response(text: str, item_ids: List[str]) -> Dict[str, dict]:
+    """
+    Map the records of a batch answer back to their item ids. Records with an
+    unknown id, duplicates and anything that is not an object are dropped.
+
+    Raises:
+        ValueError: If the answer is not (repairable into) a JSON array or an object holding one.
+    """
+    records = loads_lenient(text)
+    if isinstance(records, dict):
+        records = records.get('items', records.get('posts'))
+    if not isinstance(records, list):
+        raise ValueError("Batch response is not a JSON array")
+    wanted = set(item_ids)
+    results: Dict[str, dict] = {}
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        item_id = str(record.pop('id', ''))
+        if item_id in wanted and item_id not in results:
+            results[item_id] = record
+    return results
+
+
+class BatchSizer():
+    """
+    Packs items into batches under the input token budget and an item limit
+    that adapts to the answers: halved when a response is truncated or
+    unparsable, raised by one after every complete batch.
+    """
+
+    def __init__(self, token_budget: int = BATCH_TOKEN_BUDGET, max_items: int = BATCH_MAX_ITEMS,
+                 max_output_tokens: int = BATCH_MAX_OUTPUT_TOKENS,
+                 output_tokens_per_item: int = BATCH_OUTPUT_TOKENS_PER_ITEM) -> None:
+        self.token_budget = token_budget
+        self.limit = max(1, min(max_items, max_output_tokens // max(1, output_tokens_per_item)))
+        self.max_items = self.limit
+        self._lock = threading.Lock()
+
+    def plan(self, items: List[BatchItem]) -> List[List[BatchItem]]:
+        with self._lock:
+            max_items = self.max_items
+        batches: List[List[BatchItem]] = []
+        current: List[BatchItem] = []
+        tokens = 0
+        for item in items:
+            if current and (len(current) >= max_items or tokens + item.tokens > self.token_budget):
+                batches.append(current)
+                current, tokens = [], 0
+            current.append(item)
+            tokens += item.tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def report(self, size: int, complete: bool, failed: bool = False) -> None:
+        """
+        Args:
+            size (int): Items in the batch.
+            complete (bool): Every item came back.
+            failed (bool): The answer was truncated or could not be parsed.
+        """
+        with self._lock:
+            if failed and size > 1:
+                self.max_items = max(1, min(self.max_items, size) // 2)
+            elif complete:
+                self.max_items = min(self.limit, self.max_items + 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"max_items": self.max_items, "limit": self.limit, "token_budget": self.token_budget}
+
+
+class BatchCollector():
+    """
+    Gathers items that concurrent tasks submit one at a time and extracts them
+    together. A batch goes out once it holds `max_items`, once its oldest item
+    has waited `linger` seconds, or on `flush`; each submitter's future
+    resolves with its own record or error. Must be used from one event loop.
+    """
+
+    def __init__(self, extract: BatchExtractor, max_items: int = BATCH_MAX_ITEMS,
+                 linger: float = BATCH_LINGER) -> None:
+        self.extract = extract
+        self.max_items = max(1, max_items)
+        self.linger = linger
+        self._items: List[BatchItem] = []
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(self, item: BatchItem) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._items.append(item)
+        self._futures[item.id] = future
+        if len(self._items) >= self.max_items:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self.flush)
+        return future
+
+    def flush(self) -> None:
+        """
+        Send the items collected so far without waiting for more.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._items:
+            return
+        batch, self._items = self._items, []
+        futures = {item.id: self._futures.pop(item.id) for item in batch}
+        task = asyncio.ensure_future(self._run(batch, futures))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def close(self) -> None:
+        """
+        Cancel the batches in flight and fail the items still waiting.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for task in list(self._tasks):
+            task.cancel()
+        for future in self._futures.values():
+            future.cancel()
+        self._items, self._futures = [], {}
+
+    async def _run(self, batch: List[BatchItem], futures: Dict[str, asyncio.Future]) -> None:
+        try:
+            extracted = await self.extract(batch)
+        except Exception as e:
+            extracted = {item.id: e for item in batch}
+        except asyncio.CancelledError:
+            for future in futures.values():
+                future.cancel()
+            raise
+        for item in batch:
+            future = futures[item.id]
+            if future.done():
+                continue
+            result = extracted.get(item.id)
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            elif result is None:
+                future.set_exception(ValueError(f"No record extracted for {item.url}"))
+            else:
+                future.set_result(result)
+
+
+def is_truncated(response) -> bool:
+    """
+    True when the model stopped because it ran out of output tokens.
+    """
+    candidates = getattr(response, 'candidates', None) or []
+    reason = getattr(candidates[0], 'finish_reason', None) if candidates else None
+    return getattr(reason, 'name', str(reason)) == 'MAX_TOKENS'
+
+
+def response_text(response) -> Optional[str]:
+    try:
+        return response.text
+    except Exception:
+        return None
@@ -0,0 +1,78 @@
+import os
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from service.metrics_service import LatencyRecorder
+
+# Models tried in order, cheapest/fastest first; an answer failing validation escalates to the next.
+GEMINI_MODEL_CASCADE = [
+    name.strip() for name in os.environ.get(
+        'GEMINI_MODEL_CASCADE', 'gemini-1.5-flash-8b,gemini-1.5-flash-002,gemini-1.5-pro-002').split(',')
+    if name.strip()
+]
+
+# Returns the problems found in a record extracted from a URL, an empty list accepts it.
+Validator = Callable[[dict, str], List[str]]
+
+
+class CascadeStage():
+    def __init__(self, model_name: str, model: Any, generation_config: Optional[dict] = None) -> None:
+        self.model_name = model_name
+        self.model = model
+        self.generation_config = generation_config or {}
+        self.latency = LatencyRecorder()
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, outcome: str, seconds: float, items: int = 1) -> None:
+        """
+        Args:
+            outcome (str): 'accepted', 'rejected' or 'error'.
+            seconds (float): Duration of the model call.
+            items (int): Records the call covered (batches count every item).
+        """
+        self.latency.record(seconds)
+        with self._lock:
+            self._counters['calls'] += 1
+            self._counters[outcome] += items
+
+    def count(self, outcome: str, items: int = 1) -> None:
+        """
+        Add to an outcome's count without recording a call, e.g. for the items a
+        batch call left out, whose call was already recorded.
+        """
+        with self._lock:
+            self._counters[outcome] += items
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        judged = counters.get('accepted', 0) + counters.get('rejected', 0) + counters.get('error', 0)
+        return {
+            **counters,
+            "acceptance_rate": round(counters.get('accepted', 0) / judged, 4) if judged else 0.0,
+            "latency": self.latency.to_dict(),
+        }
+
+
+class ModelCascade():
+    """
+    Ordered model stages. Callers try stage 0 first and move to the next
+    stage only for the records whose answer fails validation; per-stage
+    acceptance rates and latency show where the cascade should be tuned.
+    """
+
+    def __init__(self, stages: List[CascadeStage]) -> None:
+        if not stages:
+            raise ValueError("A model cascade needs at least one stage.")
+        self.stages = stages
+
+    def __len__(self) -> int:
+        return len(self.stages)
+
+    def __getitem__(self, index: int) -> CascadeStage:
+        return self.stages[index]
+
+    def stats(self) -> Dict[str, dict]:
+        return {stage.model_name: stage.stats() for stage in self.stages}
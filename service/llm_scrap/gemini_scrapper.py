@@ -1,15 +1,30 @@
 import os
+import time
+import typing
+import asyncio
 import traceback
-from typing import Optional
+from typing import Dict, List, Optional, Tuple, Union
 from model.Error.ErrorModel import ErrorModel, ErrorCode
 from service.logger_service import LoggerService
 from service.llm_scrap.base import BaseLLMScraperService
+from service.llm_scrap.backends import LLMBackend, LLMResponse, create_llm_backend
+from service.fetch.tiered_fetcher import FetchResult
+from service.cache.llm_cache import get_llm_cache, llm_cache_key
+from service.llm_scrap.async_client import GEMINI_TIMEOUT, get_async_generation_client
+from service.llm_scrap.resilience import call_timeout, get_resilient_caller
+from service.llm_scrap.cascade import GEMINI_MODEL_CASCADE, CascadeStage, ModelCascade, Validator
+from service.llm_scrap.batching import BatchItem, BatchSizer, is_truncated, response_text, split_batch_response
+from service.llm_scrap.streaming import FieldCallback, FieldStream, StreamStats
+from service.parser.structured_output import parse_structured, required_fields, validate_typed_dict
+from service.metrics_service import MetricsService
+from exceptions.common import DeadlineExceededException
+from constants.prompt.instagram import InstagramTarget
 from typing import Callable
-import google.generativeai as genai
 
-GEMINI_API_KEY = os.environ["GOOGLE_API_KEY"]
-GCP_PROJECT_ID = os.environ["GCP_PROJECT_ID"]
-LOCATION = os.environ["LOCATION"]
+GCP_PROJECT_ID = os.environ.get("GCP_PROJECT_ID")
+LOCATION = os.environ.get("LOCATION")
+# Ask for JSON output constrained by the caller's response_schema.
+STRUCTURED_OUTPUT_ENABLED = os.environ.get('STRUCTURED_OUTPUT_ENABLED', 'true').lower() == 'true'
 
 
 class GeminiScraperService(BaseLLMScraperService):
@@ -17,18 +32,597 @@ class GeminiScraperService(BaseLLMScraperService):
     A specialized scraper service leveraging Google Gemini to extract structured data.
     """
 
-    def __init__(self, base_prompt: Optional[str] = None):
+    def __init__(self, base_prompt: Optional[str] = None, backend: Optional[LLMBackend] = None):
         """
         Initialize the Gemini scraper service.
 
         Args:
-            model_name (str): The Gemini model to use.
             base_prompt (Optional[str]): Default base prompt for the LLM.
+            backend (Optional[LLMBackend]): Backend serving the models, LLM_BACKEND by default.
         """
-        genai.configure(api_key=GEMINI_API_KEY)
-        self.model = genai.GenerativeModel("gemini-1.5-flash-002")
+        backend = backend or create_llm_backend()
+        self.cascade = ModelCascade([
+            CascadeStage(model_name, backend.model(model_name))
+            for model_name in GEMINI_MODEL_CASCADE
+        ])
+        MetricsService.register('model_cascade', self.cascade.stats)
+        self.model = self.cascade[0].model
+        self.generation_config: dict = {}
+        self.batch_sizer = BatchSizer()
+        MetricsService.register('batching', self.batch_sizer.stats)
+        self.stream_stats = StreamStats()
+        MetricsService.register('streaming', self.stream_stats.stats)
         self.logger = LoggerService()
-        super().__init__(llm_model=self.model, base_prompt=base_prompt)
+        super().__init__(llm_model=self.model, base_prompt=base_prompt, backend=backend)
+
+    def _fetch_page(self, url: str, target=InstagramTarget.SINGLE_POST) -> FetchResult:
+        fetched = super()._fetch_page(url, target)
+        self.logger.info(
+            f"Fetched {url} via {fetched.tier} tier in {fetched.elapsed_ms:.0f}ms")
+        return fetched
+
+    async def _afetch_page(self, url: str, target=InstagramTarget.SINGLE_POST) -> FetchResult:
+        fetched = await super()._afetch_page(url, target)
+        self.logger.info(
+            f"Fetched {url} via {fetched.tier} tier in {fetched.elapsed_ms:.0f}ms")
+        return fetched
+
+    def fetch_page_data(self, url: str, html_processor: Optional[Callable[[str], str]] = None, trace_id=None) -> str:
+        """
+        Fetch a page and run the HTML processor on it, without calling the model.
+
+        Args:
+            url (str): URL of the Instagram page to scrape.
+            html_processor (Optional[Callable[[str], str]]): Processor to preprocess HTML content.
+
+        Returns:
+            str: Processed page content.
+        """
+        self.logger.set_trace_id(trace_id)
+        return self._fetch_processed(url, html_processor)
+
+    async def afetch_page_data(self, url: str, html_processor: Optional[Callable[[str], str]] = None, trace_id=None) -> str:
+        """
+        Awaitable variant of `fetch_page_data`.
+        """
+        self.logger.set_trace_id(trace_id)
+        return await self._afetch_processed(url, html_processor)
+
+    def fetch_page_data_with_html(self, url: str, html_processor: Optional[Callable[[str], str]] = None,
+                                  trace_id=None) -> Tuple[str, Optional[str]]:
+        """
+        Like `fetch_page_data`, for callers that also need the raw HTML (selector templates).
+
+        Returns:
+            Tuple[str, Optional[str]]: Processed page content, and the raw HTML or None when
+            only the processed content was cached.
+        """
+        self.logger.set_trace_id(trace_id)
+        return self._fetch_with_raw(url, html_processor)
+
+    async def afetch_page_data_with_html(self, url: str, html_processor: Optional[Callable[[str], str]] = None,
+                                         trace_id=None) -> Tuple[str, Optional[str]]:
+        """
+        Awaitable variant of `fetch_page_data_with_html`.
+        """
+        self.logger.set_trace_id(trace_id)
+        return await self._afetch_with_raw(url, html_processor)
+
+    def extract_page_data(self, prompt: str, url: str, processed_html: str, response_schema=list[Callable], trace_id=None):
+        """
+        Ask Gemini to extract structured data from already processed page content.
+
+        Args:
+            prompt (str): Prompt template with an `html_content` placeholder.
+            url (str): URL the content was fetched from.
+            processed_html (str): Output of the HTML processor.
+            response_schema: TypedDict (or list of one) the answer must follow.
+
+        Returns:
+            GenerateContentResponse: Raw Gemini response.
+        """
+        self.logger.set_trace_id(trace_id)
+        contents = prompt.format(
+            html_content=processed_html)
+
+        return self._generate(contents + f'fetched from {url}', self._generation_config(response_schema))
+
+    async def aextract_page_data(self, prompt: str, url: str, processed_html: str, response_schema=list[Callable], trace_id=None):
+        """
+        Awaitable variant of `extract_page_data`.
+        """
+        self.logger.set_trace_id(trace_id)
+        contents = prompt.format(
+            html_content=processed_html)
+
+        return await self._agenerate(contents + f'fetched from {url}', self._generation_config(response_schema))
+
+    def extract_validated(self, prompt: str, url: str, processed_html: str, response_schema=list[Callable],
+                          validator: Optional[Validator] = None, trace_id=None,
+                          start_stage: int = 0) -> Tuple[dict, str]:
+        """
+        Extract structured data through the model cascade: the answer of each stage is
+        decoded, checked against `response_schema` and `validator`, and only a rejected
+        answer is escalated to the next (stronger) model.
+
+        Args:
+            prompt (str): Prompt template with an `html_content` placeholder.
+            url (str): URL the content was fetched from.
+            processed_html (str): Output of the HTML processor.
+            response_schema: TypedDict the answer must follow.
+            validator (Optional[Validator]): Extra checks on the decoded record.
+            start_stage (int): First cascade stage to try.
+
+        Returns:
+            Tuple[dict, str]: The accepted record and the model that produced it.
+
+        Raises:
+            ValueError: If no stage produced an acceptable answer.
+            DeadlineExceededException: If the request deadline passed; later stages are not tried.
+        """
+        self.logger.set_trace_id(trace_id)
+        contents = prompt.format(html_content=processed_html) + f'fetched from {url}'
+        config = self._generation_config(response_schema)
+        problems: List[str] = []
+        for stage in self.cascade.stages[start_stage:]:
+            started_at = time.monotonic()
+            stage_config = {**config, **stage.generation_config}
+            try:
+                response = self._generate(contents, stage_config, stage.model, remember=False)
+                data, problems = self._judge(response, url, response_schema, validator)
+            except DeadlineExceededException:
+                # No time left for a stronger model either.
+                stage.record('error', time.monotonic() - started_at)
+                raise
+            except Exception as e:
+                stage.record('error', time.monotonic() - started_at)
+                problems = [f"{e.__class__.__name__}: {e}"]
+            else:
+                stage.record('rejected' if problems else 'accepted', time.monotonic() - started_at)
+                if not problems:
+                    # Rejected answers are not cached, so a retry asks the model again.
+                    self._cache_answer(contents, stage_config, stage.model_name, response)
+                    return data, stage.model_name
+            self.logger.info(f"{stage.model_name} answer for {url} rejected: {'; '.join(problems)}")
+        raise ValueError(f"No model in the cascade produced a valid answer for {url}: {'; '.join(problems)}")
+
+    async def aextract_validated(self, prompt: str, url: str, processed_html: str, response_schema=list[Callable],
+                                 validator: Optional[Validator] = None, trace_id=None,
+                                 start_stage: int = 0) -> Tuple[dict, str]:
+        """
+        Awaitable variant of `extract_validated`.
+        """
+        self.logger.set_trace_id(trace_id)
+        contents = prompt.format(html_content=processed_html) + f'fetched from {url}'
+        config = self._generation_config(response_schema)
+        problems: List[str] = []
+        for stage in self.cascade.stages[start_stage:]:
+            started_at = time.monotonic()
+            stage_config = {**config, **stage.generation_config}
+            try:
+                response = await self._agenerate(contents, stage_config, stage.model, remember=False)
+                data, problems = self._judge(response, url, response_schema, validator)
+            except DeadlineExceededException:
+                # No time left for a stronger model either.
+                stage.record('error', time.monotonic() - started_at)
+                raise
+            except Exception as e:
+                stage.record('error', time.monotonic() - started_at)
+                problems = [f"{e.__class__.__name__}: {e}"]
+            else:
+                stage.record('rejected' if problems else 'accepted', time.monotonic() - started_at)
+                if not problems:
+                    # Rejected answers are not cached, so a retry asks the model again.
+                    await self._acache_answer(contents, stage_config, stage.model_name, response)
+                    return data, stage.model_name
+            self.logger.info(f"{stage.model_name} answer for {url} rejected: {'; '.join(problems)}")
+        raise ValueError(f"No model in the cascade produced a valid answer for {url}: {'; '.join(problems)}")
+
+    def _judge(self, response, url: str, response_schema, validator: Optional[Validator]) -> Tuple[Optional[dict], List[str]]:
+        """
+        Decode and validate one answer.
+
+        Returns:
+            Tuple[Optional[dict], List[str]]: The record and the problems found with it.
+        """
+        try:
+            data = parse_structured(response.text, self._record_schema(response_schema))
+        except ValueError as e:
+            return None, [str(e)]
+        return data, validator(data, url) if validator else []
+
+    def stream_validated(self, prompt: str, url: str, processed_html: str, response_schema=list[Callable],
+                         validator: Optional[Validator] = None, on_field: Optional[FieldCallback] = None,
+                         trace_id=None) -> Tuple[dict, str]:
+        """
+        Streaming variant of `extract_validated`: the first cascade stage's answer is
+        parsed as it arrives, each field is handed to `on_field` once complete and
+        reading stops as soon as every required field of `response_schema` is in.
+        A streamed record failing validation is re-extracted through the rest of
+        the cascade, and the fields that changed are reported again.
+
+        Returns:
+            Tuple[dict, str]: The accepted record and the model that produced it.
+        """
+        self.logger.set_trace_id(trace_id)
+        contents = prompt.format(html_content=processed_html) + f'fetched from {url}'
+        stage = self.cascade[0]
+        stream = self._field_stream(response_schema, on_field)
+        config = self._generation_config(response_schema)
+        try:
+            fresh = self._stream(contents, config, stage, stream)
+            data, problems = self._judge_fields(stream, url, response_schema, validator)
+        except DeadlineExceededException:
+            stage.record('error', time.monotonic() - stream.started_at)
+            raise
+        except Exception as e:
+            stage.record('error', time.monotonic() - stream.started_at)
+            data, problems = None, [f"{e.__class__.__name__}: {e}"]
+        else:
+            stage.record('rejected' if problems else 'accepted', stream.elapsed)
+            if fresh and not problems:
+                self._cache_answer(contents, config, stage.model_name, LLMResponse(stream.text, stage.model_name))
+        self.stream_stats.record(stream, fallback=bool(problems))
+        if not problems:
+            return data, stage.model_name
+        self.logger.info(f"Streamed {stage.model_name} answer for {url} rejected: {'; '.join(problems)}")
+        data, model_name = self.extract_validated(
+            prompt, url, processed_html, response_schema, validator, trace_id, self._escalation_stage())
+        self._report_changes(stream, data, on_field)
+        return data, model_name
+
+    async def astream_validated(self, prompt: str, url: str, processed_html: str, response_schema=list[Callable],
+                                validator: Optional[Validator] = None, on_field: Optional[FieldCallback] = None,
+                                trace_id=None) -> Tuple[dict, str]:
+        """
+        Awaitable variant of `stream_validated`.
+        """
+        self.logger.set_trace_id(trace_id)
+        contents = prompt.format(html_content=processed_html) + f'fetched from {url}'
+        stage = self.cascade[0]
+        stream = self._field_stream(response_schema, on_field)
+        config = self._generation_config(response_schema)
+        try:
+            fresh = await self._astream(contents, config, stage, stream)
+            data, problems = self._judge_fields(stream, url, response_schema, validator)
+        except DeadlineExceededException:
+            stage.record('error', time.monotonic() - stream.started_at)
+            raise
+        except Exception as e:
+            stage.record('error', time.monotonic() - stream.started_at)
+            data, problems = None, [f"{e.__class__.__name__}: {e}"]
+        else:
+            stage.record('rejected' if problems else 'accepted', stream.elapsed)
+            if fresh and not problems:
+                await self._acache_answer(contents, config, stage.model_name, LLMResponse(stream.text, stage.model_name))
+        self.stream_stats.record(stream, fallback=bool(problems))
+        if not problems:
+            return data, stage.model_name
+        self.logger.info(f"Streamed {stage.model_name} answer for {url} rejected: {'; '.join(problems)}")
+        data, model_name = await self.aextract_validated(
+            prompt, url, processed_html, response_schema, validator, trace_id, self._escalation_stage())
+        self._report_changes(stream, data, on_field)
+        return data, model_name
+
+    def _field_stream(self, response_schema, on_field: Optional[FieldCallback]) -> FieldStream:
+        schema = self._record_schema(response_schema)
+        return FieldStream(on_field, required_fields(schema) if schema is not None else None)
+
+    def _judge_fields(self, stream: FieldStream, url: str, response_schema,
+                      validator: Optional[Validator]) -> Tuple[dict, List[str]]:
+        if not stream.complete and not stream.stopped_early:
+            return stream.fields, ["stream ended before the answer was complete"]
+        schema = self._record_schema(response_schema)
+        data, problems = validate_typed_dict(stream.fields, schema) if schema is not None else (stream.fields, [])
+        if not problems and validator is not None:
+            problems = validator(data, url)
+        return data, problems
+
+    @staticmethod
+    def _report_changes(stream: FieldStream, data: dict, on_field: Optional[FieldCallback]) -> None:
+        if on_field is None:
+            return
+        for field, value in data.items():
+            if stream.fields.get(field, object()) != value:
+                on_field(field, value)
+
+    def _stream(self, contents: str, generation_config: dict, stage: CascadeStage, stream: FieldStream) -> bool:
+        """
+        Feed the stage's streamed answer to `stream` until it has what it needs.
+        Cached answers are replayed in one chunk.
+
+        Returns:
+            bool: True for a fresh answer read to the end, which the caller may cache once accepted.
+        """
+        cache = get_llm_cache()
+        key = llm_cache_key(stage.model_name, contents, generation_config)
+        cached = cache.get(key, stage.model_name) if cache is not None else None
+        if cached is not None:
+            self.logger.info(f"Replaying cached {stage.model_name} response")
+            stream.feed(cached.text)
+            stream.finish()
+            return False
+        response = stage.model.generate_content(
+            contents=contents, generation_config=generation_config, stream=True,
+            request_options={'timeout': call_timeout(GEMINI_TIMEOUT)})
+        for chunk in response:
+            if stream.feed(response_text(chunk) or ''):
+                break
+        stream.finish()
+        return stream.complete
+
+    async def _astream(self, contents: str, generation_config: dict, stage: CascadeStage, stream: FieldStream) -> bool:
+        """
+        Awaitable variant of `_stream`; on the async client the stream is read on
+        the background loop, so `on_field` must be thread-safe.
+        """
+        client = get_async_generation_client()
+        if client is None:
+            return await asyncio.to_thread(self._stream, contents, generation_config, stage, stream)
+        cache = get_llm_cache()
+        key = llm_cache_key(stage.model_name, contents, generation_config)
+        cached = await asyncio.to_thread(cache.get, key, stage.model_name) if cache is not None else None
+        if cached is not None:
+            self.logger.info(f"Replaying cached {stage.model_name} response")
+            stream.feed(cached.text)
+            stream.finish()
+            return False
+        await client.astream(stage.model, contents, stream.feed, timeout=call_timeout(GEMINI_TIMEOUT),
+                             generation_config=generation_config)
+        stream.finish()
+        return stream.complete
+
+    def extract_batch(self, prompt: str, items: List[BatchItem], single_prompt: str,
+                      response_schema=list[Callable], batch_schema=list[Callable],
+                      validator: Optional[Validator] = None, trace_id=None) -> Dict[str, Union[dict, Exception]]:
+        """
+        Extract structured data for many processed pages with as few Gemini calls as possible.
+
+        Items are packed into batches by `self.batch_sizer`, each batch is sent as one
+        prompt to the first cascade stage and the JSON array answer is split back per
+        item id. Items missing from an answer, or failing validation against
+        `response_schema` and `validator`, are retried one by one with `single_prompt`,
+        starting at the next cascade stage.
+
+        Args:
+            prompt (str): Batch prompt template with an `items` placeholder.
+            items (List[BatchItem]): Processed pages with stable ids.
+            single_prompt (str): Prompt template with an `html_content` placeholder, for retries.
+            response_schema: TypedDict of one record.
+            batch_schema: Schema of the batch answer, a list of records carrying an `id`.
+            validator (Optional[Validator]): Extra checks on each decoded record.
+
+        Returns:
+            Dict[str, Union[dict, Exception]]: Extracted record, or the error, per item id.
+        """
+        self.logger.set_trace_id(trace_id)
+        results: Dict[str, Union[dict, Exception]] = {}
+        # (item, first cascade stage to try)
+        retries: List[Tuple[BatchItem, int]] = []
+        for batch in self.batch_sizer.plan(items):
+            if len(batch) == 1:
+                retries.append((batch[0], 0))
+                continue
+            contents = self._batch_contents(prompt, batch)
+            config = self._generation_config(batch_schema)
+            started_at = time.monotonic()
+            try:
+                response = self._generate(contents, config, remember=False)
+                done = self._split_batch(batch, response, response_schema, validator)
+                if done and not is_truncated(response):
+                    self._cache_answer(contents, config, self.model.model_name, response)
+            except Exception:
+                self.logger.error(ErrorModel(
+                    self.__class__, ErrorCode.FLASK_ERR_CREATE, traceback.format_exc()))
+                done = {}
+            self._record_batch(batch, done, time.monotonic() - started_at)
+            results.update(done)
+            retries.extend((item, self._escalation_stage()) for item in batch if item.id not in done)
+
+        for item, stage in retries:
+            try:
+                results[item.id], _ = self.extract_validated(
+                    single_prompt, item.url, item.content, response_schema, validator, trace_id, stage)
+            except Exception as e:
+                self.logger.error(ErrorModel(
+                    self.__class__, ErrorCode.FLASK_ERR_CREATE, traceback.format_exc()))
+                results[item.id] = e
+        return results
+
+    async def aextract_batch(self, prompt: str, items: List[BatchItem], single_prompt: str,
+                             response_schema=list[Callable], batch_schema=list[Callable],
+                             validator: Optional[Validator] = None, trace_id=None) -> Dict[str, Union[dict, Exception]]:
+        """
+        Awaitable variant of `extract_batch`; batches and retries run concurrently.
+        """
+        self.logger.set_trace_id(trace_id)
+        batches = self.batch_sizer.plan(items)
+        retries: List[Tuple[BatchItem, int]] = [(batch[0], 0) for batch in batches if len(batch) == 1]
+        batches = [batch for batch in batches if len(batch) > 1]
+
+        async def run_batch(batch: List[BatchItem]) -> Dict[str, dict]:
+            contents = self._batch_contents(prompt, batch)
+            config = self._generation_config(batch_schema)
+            started_at = time.monotonic()
+            try:
+                response = await self._agenerate(contents, config, remember=False)
+                done = self._split_batch(batch, response, response_schema, validator)
+                if done and not is_truncated(response):
+                    await self._acache_answer(contents, config, self.model.model_name, response)
+            except Exception:
+                self.logger.error(ErrorModel(
+                    self.__class__, ErrorCode.FLASK_ERR_CREATE, traceback.format_exc()))
+                done = {}
+            self._record_batch(batch, done, time.monotonic() - started_at)
+            return done
+
+        results: Dict[str, Union[dict, Exception]] = {}
+        for batch, done in zip(batches, await asyncio.gather(*(run_batch(batch) for batch in batches))):
+            results.update(done)
+            retries.extend((item, self._escalation_stage()) for item in batch if item.id not in done)
+
+        async def retry(item: BatchItem, stage: int) -> Union[dict, Exception]:
+            try:
+                data, _ = await self.aextract_validated(
+                    single_prompt, item.url, item.content, response_schema, validator, trace_id, stage)
+                return data
+            except Exception as e:
+                self.logger.error(ErrorModel(
+                    self.__class__, ErrorCode.FLASK_ERR_CREATE, traceback.format_exc()))
+                return e
+
+        outcomes = await asyncio.gather(*(retry(item, stage) for item, stage in retries))
+        for (item, _), result in zip(retries, outcomes):
+            results[item.id] = result
+        return results
+
+    def _escalation_stage(self) -> int:
+        """
+        Cascade stage for items the first stage already failed on in a batch.
+        """
+        return min(1, len(self.cascade) - 1)
+
+    def _record_batch(self, batch: List[BatchItem], done: Dict[str, dict], seconds: float) -> None:
+        stage = self.cascade[0]
+        stage.record('accepted', seconds, len(done))
+        if len(done) < len(batch):
+            stage.count('rejected', len(batch) - len(done))
+
+    @staticmethod
+    def _batch_contents(prompt: str, batch: List[BatchItem]) -> str:
+        return prompt.format(items='\n'.join(item.render() for item in batch))
+
+    def _split_batch(self, batch: List[BatchItem], response, response_schema=None,
+                     validator: Optional[Validator] = None) -> Dict[str, dict]:
+        ids = [item.id for item in batch]
+        text = response_text(response)
+        truncated = is_truncated(response)
+        try:
+            if text is None:
+                raise ValueError("Batch response has no text")
+            done = split_batch_response(text, ids)
+        except ValueError:
+            self.batch_sizer.report(len(batch), complete=False, failed=True)
+            raise
+        if truncated and done:
+            # The last record of a cut-off answer may have been closed by the JSON repair.
+            del done[list(done)[-1]]
+        self.batch_sizer.report(len(batch), complete=len(done) == len(batch), failed=truncated)
+        schema = self._record_schema(response_schema)
+        urls = {item.id: item.url for item in batch}
+        if schema is not None or validator is not None:
+            for item_id, record in list(done.items()):
+                record, errors = validate_typed_dict(record, schema) if schema is not None else (record, [])
+                if not errors and validator is not None:
+                    errors = validator(record, urls[item_id])
+                if errors:
+                    self.logger.info(f"Batch record {item_id} failed validation: {'; '.join(errors)}")
+                    del done[item_id]
+                else:
+                    done[item_id] = record
+        self.logger.info(
+            f"Batch of {len(batch)} pages ({sum(item.tokens for item in batch)} tokens) "
+            f"returned {len(done)} valid records{' (truncated)' if truncated else ''}")
+        return done
+
+    def _generation_config(self, response_schema=None) -> dict:
+        """
+        Generation config for one call: JSON output constrained by `response_schema`
+        when structured output is enabled and a schema is given.
+        """
+        if not STRUCTURED_OUTPUT_ENABLED:
+            return self.generation_config
+        config = {**self.generation_config, 'response_mime_type': 'application/json'}
+        if response_schema is not None and response_schema != list[Callable]:
+            config['response_schema'] = response_schema
+        return config
+
+    @staticmethod
+    def _record_schema(response_schema) -> Optional[type]:
+        """
+        The TypedDict records are validated against, if `response_schema` is one.
+        """
+        return response_schema if typing.is_typeddict(response_schema) else None
+
+    def _generate(self, contents: str, generation_config: Optional[dict] = None, model=None,
+                  remember: bool = True):
+        """
+        Call the model (the first cascade stage by default), replaying a cached
+        response when the same prompt was already answered with the same model
+        and generation config. With `remember` False the answer is not cached here; the caller caches
+        it with `_cache_answer` once it has accepted it.
+        """
+        generation_config = self.generation_config if generation_config is None else generation_config
+        model = model or self.model
+        cache = get_llm_cache()
+        if cache is None:
+            return self._call_model(contents, generation_config, model)
+        key = llm_cache_key(model.model_name, contents, generation_config)
+        cached = cache.get(key, model.model_name)
+        if cached is not None:
+            self.logger.info(f"Replaying cached {model.model_name} response")
+            return cached
+        response = self._call_model(contents, generation_config, model)
+        if remember:
+            cache.set(key, response)
+        return response
+
+    def _cache_answer(self, contents: str, generation_config: dict, model_name: str, response) -> None:
+        """
+        Cache an answer the caller has accepted; replayed answers are already cached.
+        """
+        cache = get_llm_cache()
+        if cache is not None and not getattr(response, 'cached', False):
+            cache.set(llm_cache_key(model_name, contents, generation_config), response)
+
+    async def _acache_answer(self, contents: str, generation_config: dict, model_name: str, response) -> None:
+        await asyncio.to_thread(self._cache_answer, contents, generation_config, model_name, response)
+
+    async def _agenerate(self, contents: str, generation_config: Optional[dict] = None, model=None,
+                         remember: bool = True):
+        """
+        Awaitable variant of `_generate`; cache I/O runs off the event loop.
+        """
+        generation_config = self.generation_config if generation_config is None else generation_config
+        model = model or self.model
+        cache = get_llm_cache()
+        if cache is None:
+            return await self._acall_model(contents, generation_config, model)
+        key = llm_cache_key(model.model_name, contents, generation_config)
+        cached = await asyncio.to_thread(cache.get, key, model.model_name)
+        if cached is not None:
+            self.logger.info(f"Replaying cached {model.model_name} response")
+            return cached
+        response = await self._acall_model(contents, generation_config, model)
+        if remember:
+            await asyncio.to_thread(cache.set, key, response)
+        return response
+
+    def _call_model(self, contents: str, generation_config: dict, model):
+        """
+        Call the model under the request deadline, retrying retryable errors and
+        hedging slow calls (see `ResilientCaller`).
+        """
+        def attempt(timeout: Optional[float]):
+            return model.generate_content(
+                contents=contents, generation_config=generation_config,
+                request_options={'timeout': min(timeout, GEMINI_TIMEOUT) if timeout else GEMINI_TIMEOUT})
+
+        return get_resilient_caller().call(attempt, contents)
+
+    async def _acall_model(self, contents: str, generation_config: dict, model):
+        """
+        Call the model without holding a thread, through the SDK's async client
+        (bounded by GEMINI_CONCURRENCY and GEMINI_TIMEOUT), or on a worker
+        thread when the async path is disabled. Retries and hedging as in `_call_model`.
+        """
+        client = get_async_generation_client()
+        if client is None:
+            return await asyncio.to_thread(
+                self._call_model, contents, generation_config, model)
+        return await get_resilient_caller().acall(
+            lambda timeout: client.agenerate(model, contents, timeout=timeout, generation_config=generation_config),
+            contents)
 
     def scrape_page(self, prompt: str, url: str, html_processor: Optional[Callable[[str], str]] = None, response_schema=list[Callable], trace_id=None) -> dict:
         """
@@ -42,20 +636,33 @@ class GeminiScraperService(BaseLLMScraperService):
             List[PostModel]: List of structured Instagram posts.
         """
         try:
-            self.logger.set_trace_id(trace_id)
-            html_content = self._fetch_page_content(url)
+            processed_html = self.fetch_page_data(url, html_processor, trace_id)
+
+            return self.extract_page_data(
+                prompt, url, processed_html, response_schema, trace_id)
+        except Exception as e:
+            self.logger.error(ErrorModel(
+                self.__class__, ErrorCode.FLASK_ERR_CREATE, traceback.format_exc()))
+            print(traceback.format_exc())
+            raise ValueError(
+                f"Failed to parse Gemini response: {e.__traceback__}") from e
 
-            processed_html = html_processor(
-                html_content) if html_processor else html_content
+    async def ascrape_page(self, prompt: str, url: str, html_processor: Optional[Callable[[str], str]] = None, response_schema=list[Callable], trace_id=None) -> dict:
+        """
+        Awaitable variant of `scrape_page`; the page is fetched without blocking the event loop.
 
-            prompt = prompt.format(
-                html_content=processed_html)
+        Args:
+            url (str): URL of the Instagram page to scrape.
+            html_processor (Optional[Callable[[str], str]]): Processor to preprocess HTML content.
 
-            structured_data = self.model.generate_content(
-                contents=prompt + f'fetched from {url}'
-            )
+        Returns:
+            GenerateContentResponse: Raw Gemini response.
+        """
+        try:
+            processed_html = await self.afetch_page_data(url, html_processor, trace_id)
 
-            return structured_data
+            return await self.aextract_page_data(
+                prompt, url, processed_html, response_schema, trace_id)
         except Exception as e:
             self.logger.error(ErrorModel(
                 self.__class__, ErrorCode.FLASK_ERR_CREATE, traceback.format_exc()))
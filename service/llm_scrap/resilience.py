@@ -0,0 +1,298 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from exceptions.common import DeadlineExceededException
+from service.metrics_service import LatencyRecorder, MetricsService
+from service.parser.tokens import count_tokens
+
+# Seconds a scrape request may spend in model calls, retries and cascade escalations included.
+LLM_REQUEST_DEADLINE = float(os.environ.get('LLM_REQUEST_DEADLINE', 90))
+LLM_MAX_ATTEMPTS = int(os.environ.get('LLM_MAX_ATTEMPTS', 3))
+LLM_RETRY_BASE_DELAY = float(os.environ.get('LLM_RETRY_BASE_DELAY', 0.5))
+LLM_RETRY_MAX_DELAY = float(os.environ.get('LLM_RETRY_MAX_DELAY', 8))
+# Send a second, identical request when the first is slower than the p95 of recent calls.
+LLM_HEDGE_ENABLED = os.environ.get('LLM_HEDGE_ENABLED', 'false').lower() == 'true'
+LLM_HEDGE_PERCENTILE = float(os.environ.get('LLM_HEDGE_PERCENTILE', 95))
+LLM_HEDGE_MIN_DELAY = float(os.environ.get('LLM_HEDGE_MIN_DELAY', 1.0))
+# Calls observed before hedging starts, so the percentile means something.
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get('LLM_HEDGE_MIN_SAMPLES', 20))
+LLM_HEDGE_THREADS = int(os.environ.get('LLM_HEDGE_THREADS', 16))
+
+# google.api_core and openai exceptions worth another attempt, by class name so
+# neither SDK has to be importable.
+RETRYABLE_ERRORS = {
+    'TimeoutError', 'ConnectionError', 'ServiceUnavailable', 'TooManyRequests', 'ResourceExhausted',
+    'InternalServerError', 'DeadlineExceeded', 'GatewayTimeout', 'BadGateway', 'RetryError',
+    'APIConnectionError', 'APITimeoutError', 'RateLimitError',
+}
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('llm_deadline', default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: float = LLM_REQUEST_DEADLINE) -> Iterator[float]:
+    """
+    Bound every model call made inside the block (in this thread or task, and
+    the threads and tasks it starts) to a shared deadline. A nested scope can
+    only shorten it.
+    """
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """
+    Seconds left before the current deadline, None outside a deadline scope.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def call_timeout(default: float) -> float:
+    """
+    Timeout for one model call: `default`, shortened to the time left before the deadline.
+
+    Raises:
+        DeadlineExceededException: If the deadline has already passed.
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return default
+    if remaining <= 0:
+        raise DeadlineExceededException("Request deadline exceeded before the model call")
+    return min(remaining, default)
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, DeadlineExceededException):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    if isinstance(status, int) and status in RETRYABLE_STATUSES:
+        return True
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+class ResilientCaller():
+    """
+    Runs model calls under the request deadline with jittered exponential
+    retries of retryable errors and, optionally, a hedged duplicate request
+    once the first has taken longer than the recent p95 latency. The first
+    answer wins; the other request is cancelled (abandoned on the sync path,
+    where a running thread cannot be interrupted) and its prompt tokens are
+    counted as wasted.
+
+    Calls are given as `call(timeout)` factories; `timeout` is the time left
+    before the deadline (None without one).
+    """
+
+    def __init__(self, max_attempts: int = LLM_MAX_ATTEMPTS, base_delay: float = LLM_RETRY_BASE_DELAY,
+                 max_delay: float = LLM_RETRY_MAX_DELAY, hedge: bool = LLM_HEDGE_ENABLED,
+                 hedge_percentile: float = LLM_HEDGE_PERCENTILE, hedge_min_delay: float = LLM_HEDGE_MIN_DELAY,
+                 hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES) -> None:
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyRecorder()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def call(self, call: Callable[[Optional[float]], Any], contents: Any = None) -> Any:
+        """
+        Run a blocking model call with retries and hedging.
+
+        Raises:
+            DeadlineExceededException: If the deadline passes before an answer arrives.
+        """
+        self._count('calls')
+        for attempt in range(self.max_attempts):
+            timeout = self._timeout()
+            started_at = time.monotonic()
+            try:
+                response = self._hedged(call, timeout, contents)
+                self.latency.record(time.monotonic() - started_at)
+                return response
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                time.sleep(delay)
+
+    async def acall(self, call: Callable[[Optional[float]], Awaitable], contents: Any = None) -> Any:
+        """
+        Awaitable variant of `call`; the losing hedge is cancelled.
+        """
+        self._count('calls')
+        for attempt in range(self.max_attempts):
+            timeout = self._timeout()
+            started_at = time.monotonic()
+            try:
+                response = await self._ahedged(call, timeout, contents)
+                self.latency.record(time.monotonic() - started_at)
+                return response
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            "hedge_delay_ms": round((self._hedge_delay() or 0.0) * 1000, 2),
+            "latency": self.latency.to_dict(),
+        }
+
+    def _timeout(self) -> Optional[float]:
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            self._count('deadline_exceeded')
+            raise DeadlineExceededException("Request deadline exceeded before the model call")
+        return remaining
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """
+        Delay before the next attempt, or re-raise `error` when it should not be retried.
+        """
+        remaining = remaining_time()
+        if isinstance(error, (TimeoutError, asyncio.TimeoutError)) and remaining is not None and remaining <= 0:
+            self._count('deadline_exceeded')
+            raise DeadlineExceededException("Request deadline exceeded during the model call") from error
+        if not is_retryable(error):
+            raise error
+        if attempt + 1 >= self.max_attempts:
+            self._count('retries_exhausted')
+            raise error
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if remaining is not None and remaining <= delay:
+            self._count('deadline_exceeded')
+            raise DeadlineExceededException("Request deadline leaves no time for a retry") from error
+        self._count('retries')
+        logger.warning({'log': f"Retrying model call in {delay:.2f}s after {error.__class__.__name__}: {error}"})
+        return delay
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge or self.latency.count < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latency.percentile(self.hedge_percentile))
+
+    def _should_hedge(self, timeout: Optional[float]) -> Optional[float]:
+        delay = self._hedge_delay()
+        if delay is None or (timeout is not None and timeout <= delay):
+            return None
+        return delay
+
+    def _hedged(self, call: Callable[[Optional[float]], Any], timeout: Optional[float], contents: Any) -> Any:
+        delay = self._should_hedge(timeout)
+        if delay is None:
+            return call(timeout)
+        pool = self._hedge_pool()
+        started_at = time.monotonic()
+        primary = pool.submit(call, timeout)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        self._count('hedges')
+        hedge_timeout = None if timeout is None else timeout - (time.monotonic() - started_at)
+        pending = {primary, pool.submit(call, hedge_timeout)}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=hedge_timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    self._finish_hedge(future is not primary, pending, contents)
+                    return future.result()
+                error = future.exception()
+        for future in pending:
+            future.cancel()
+        raise error or TimeoutError("Hedged model calls exceeded the deadline")
+
+    async def _ahedged(self, call: Callable[[Optional[float]], Awaitable], timeout: Optional[float],
+                       contents: Any) -> Any:
+        delay = self._should_hedge(timeout)
+        if delay is None:
+            if timeout is None:
+                return await call(timeout)
+            return await asyncio.wait_for(call(timeout), timeout)
+        started_at = time.monotonic()
+        primary = asyncio.ensure_future(call(timeout))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        self._count('hedges')
+        hedge_timeout = None if timeout is None else timeout - (time.monotonic() - started_at)
+        pending = {primary, asyncio.ensure_future(call(hedge_timeout))}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=hedge_timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        self._finish_hedge(task is not primary, pending, contents)
+                        return task.result()
+                    error = task.exception()
+            raise error or TimeoutError("Hedged model calls exceeded the deadline")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _finish_hedge(self, hedge_won: bool, losers, contents: Any) -> None:
+        if hedge_won:
+            self._count('hedge_wins')
+        if losers and contents is not None:
+            tokens = count_tokens(contents if isinstance(contents, str) else str(contents))
+            with self._lock:
+                self._counters['wasted_tokens'] += tokens * len(losers)
+        for loser in losers:
+            if isinstance(loser, Future) and not loser.cancel():
+                self._count('hedges_abandoned')
+
+    def _hedge_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=LLM_HEDGE_THREADS, thread_name_prefix='llm-hedge')
+            return self._pool
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+
+_caller: Optional[ResilientCaller] = None
+_caller_lock = threading.Lock()
+
+
+def get_resilient_caller() -> ResilientCaller:
+    global _caller
+    with _caller_lock:
+        if _caller is None:
+            _caller = ResilientCaller()
+            MetricsService.register('llm_resilience', _caller.stats)
+        return _caller
@@ -0,0 +1,189 @@
+import os
+import time
+import queue
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from service.metrics_service import LatencyRecorder, MetricsService
+from service.parser.incremental_json import IncrementalJSONParser
+
+# Stop reading the model's stream once every required field has arrived.
+STREAM_EARLY_STOP = os.environ.get('STREAM_EARLY_STOP', 'true').lower() == 'true'
+# Seconds a subscriber waits for the next partial result before giving up.
+STREAM_IDLE_TIMEOUT = float(os.environ.get('STREAM_IDLE_TIMEOUT', 120))
+
+# Called with (field, value) as soon as a field of the answer is complete.
+FieldCallback = Callable[[str, Any], None]
+
+
+class FieldStream():
+    """
+    Feeds the text chunks of a streamed answer to an `IncrementalJSONParser`,
+    hands every completed field to `on_field` and tells the caller when it can
+    stop reading: once the object is closed, or once all `required` fields are
+    in when early stop is enabled.
+    """
+
+    def __init__(self, on_field: Optional[FieldCallback] = None,
+                 required: Optional[Iterable[str]] = None, early_stop: bool = STREAM_EARLY_STOP) -> None:
+        self.on_field = on_field
+        self.required = set(required or [])
+        self.early_stop = early_stop and bool(self.required)
+        self.parser = IncrementalJSONParser()
+        self.stopped_early = False
+        self.started_at = time.monotonic()
+        self.first_field_after: Optional[float] = None
+        self.elapsed: Optional[float] = None
+
+    @property
+    def fields(self) -> Dict[str, Any]:
+        return self.parser.fields
+
+    @property
+    def complete(self) -> bool:
+        return self.parser.done
+
+    @property
+    def text(self) -> str:
+        return self.parser.text
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Returns:
+            bool: True when no more chunks are needed.
+        """
+        completed = self.parser.feed(chunk)
+        if completed and self.first_field_after is None:
+            self.first_field_after = time.monotonic() - self.started_at
+        if self.on_field is not None:
+            for field, value in completed.items():
+                self.on_field(field, value)
+        if self.parser.done:
+            return True
+        if self.early_stop and self.required.issubset(self.parser.fields):
+            self.stopped_early = True
+            return True
+        return False
+
+    def finish(self) -> None:
+        self.elapsed = time.monotonic() - self.started_at
+
+
+class StreamStats():
+    def __init__(self) -> None:
+        self.time_to_first_field = LatencyRecorder()
+        self.duration = LatencyRecorder()
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, stream: FieldStream, fallback: bool = False) -> None:
+        if stream.first_field_after is not None:
+            self.time_to_first_field.record(stream.first_field_after)
+        if stream.elapsed is not None:
+            self.duration.record(stream.elapsed)
+        with self._lock:
+            self._counters['streams'] += 1
+            self._counters['early_stops'] += int(stream.stopped_early)
+            self._counters['incomplete'] += int(not stream.complete and not stream.stopped_early)
+            self._counters['fallbacks'] += int(fallback)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            "time_to_first_field": self.time_to_first_field.to_dict(),
+            "duration": self.duration.to_dict(),
+        }
+
+
+class _Topic():
+    def __init__(self) -> None:
+        self.history: List[dict] = []
+        self.subscribers: List[queue.Queue] = []
+
+
+class PartialResultBroker():
+    """
+    In-process fan-out of partial results keyed by trace id. A topic lives
+    from `open` to `close`; subscribers joining late first receive the events
+    published so far. `listen` yields events until the topic is closed.
+    """
+
+    def __init__(self, idle_timeout: float = STREAM_IDLE_TIMEOUT) -> None:
+        self.idle_timeout = idle_timeout
+        self._topics: Dict[str, _Topic] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def open(self, key: str) -> None:
+        with self._lock:
+            self._topics.setdefault(key, _Topic())
+
+    def is_open(self, key: str) -> bool:
+        with self._lock:
+            return key in self._topics
+
+    def subscribe(self, key: str) -> Optional[queue.Queue]:
+        """
+        Returns:
+            Optional[queue.Queue]: The subscriber's event queue, or None when the topic is not open.
+        """
+        with self._lock:
+            topic = self._topics.get(key)
+            if topic is None:
+                return None
+            events: queue.Queue = queue.Queue()
+            for event in topic.history:
+                events.put(event)
+            topic.subscribers.append(events)
+            return events
+
+    def publish(self, key: str, event: dict) -> None:
+        with self._lock:
+            topic = self._topics.get(key)
+            if topic is None:
+                return
+            topic.history.append(event)
+            self.published += 1
+            for events in topic.subscribers:
+                events.put(event)
+
+    def close(self, key: str) -> None:
+        with self._lock:
+            topic = self._topics.pop(key, None)
+        if topic is not None:
+            for events in topic.subscribers:
+                events.put(None)
+
+    def listen(self, events: queue.Queue) -> Iterator[dict]:
+        while True:
+            try:
+                event = events.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                return
+            if event is None:
+                return
+            yield event
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "topics": len(self._topics),
+                "subscribers": sum(len(topic.subscribers) for topic in self._topics.values()),
+                "published": self.published,
+            }
+
+
+_broker: Optional[PartialResultBroker] = None
+_broker_lock = threading.Lock()
+
+
+def get_partial_result_broker() -> PartialResultBroker:
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = PartialResultBroker()
+            MetricsService.register('partial_results', _broker.stats)
+        return _broker
@@ -0,0 +1,248 @@
+"""
+Local LLM stub speaking the OpenAI chat completions protocol, for load
+testing the pipeline without spending model quota.
+
+Answers are replayed from a JSONL recording (written by the scraper with
+LLM_RECORD_PATH set) by prompt hash; prompts that were never recorded get a
+recorded answer picked by hash, or an error with --on-miss error. Every
+answer is delayed by a sample of the latency distribution and a share of
+requests fails with a retryable status.
+
+    python -m service.llm_scrap.stub_server --recordings calls.jsonl \
+        --latency lognormal:800,0.6 --error-rate 0.02
+
+then run the app with LLM_BACKEND=stub.
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from service.metrics_service import LatencyRecorder
+from service.parser.tokens import count_tokens
+from service.llm_scrap.backends import prompt_key
+
+LLM_STUB_HOST = os.environ.get('LLM_STUB_HOST', '127.0.0.1')
+LLM_STUB_PORT = int(os.environ.get('LLM_STUB_PORT', 8089))
+LLM_STUB_RECORDINGS = os.environ.get('LLM_STUB_RECORDINGS')
+# fixed:MS, uniform:LOW_MS,HIGH_MS, normal:MEAN_MS,STDDEV_MS or lognormal:MEDIAN_MS,SIGMA
+LLM_STUB_LATENCY = os.environ.get('LLM_STUB_LATENCY', 'lognormal:800,0.5')
+LLM_STUB_ERROR_RATE = float(os.environ.get('LLM_STUB_ERROR_RATE', 0.0))
+LLM_STUB_ERROR_STATUSES = os.environ.get('LLM_STUB_ERROR_STATUSES', '429,500,503')
+# Answer for prompts without a recording when the recording is empty.
+LLM_STUB_DEFAULT_TEXT = os.environ.get('LLM_STUB_DEFAULT_TEXT', '{}')
+# Characters per streamed chunk.
+LLM_STUB_CHUNK_CHARS = int(os.environ.get('LLM_STUB_CHUNK_CHARS', 40))
+
+logger = logging.getLogger(__name__)
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Build a sampler returning delays in seconds from a distribution spec.
+
+    Raises:
+        ValueError: If the spec is not one of the supported distributions.
+    """
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',') if v.strip()]
+    if kind == 'fixed' and len(values) == 1:
+        return lambda: values[0] / 1000
+    if kind == 'uniform' and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == 'normal' and len(values) == 2:
+        return lambda: max(0.0, random.gauss(values[0], values[1])) / 1000
+    if kind == 'lognormal' and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1]) / 1000
+    raise ValueError(f"Unsupported latency distribution {spec!r}")
+
+
+class Recordings():
+    def __init__(self, path: Optional[str] = None, default_text: str = LLM_STUB_DEFAULT_TEXT) -> None:
+        self.by_key: Dict[str, str] = {}
+        self.texts: List[str] = []
+        self.default_text = default_text
+        if path:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    self.by_key[record['key']] = record['text']
+            self.texts = list(self.by_key.values())
+
+    def lookup(self, key: str) -> Tuple[str, bool]:
+        """
+        Returns:
+            Tuple[str, bool]: The answer and whether it was recorded for this exact prompt.
+        """
+        if key in self.by_key:
+            return self.by_key[key], True
+        if self.texts:
+            return self.texts[int(key, 16) % len(self.texts)], False
+        return self.default_text, False
+
+
+class StubLLM():
+    def __init__(self, recordings: Recordings, latency: Callable[[], float],
+                 error_rate: float = 0.0, error_statuses: Optional[List[int]] = None,
+                 on_miss: str = 'replay', chunk_chars: int = LLM_STUB_CHUNK_CHARS) -> None:
+        self.recordings = recordings
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses or [503]
+        self.on_miss = on_miss
+        self.chunk_chars = chunk_chars
+        self.served = LatencyRecorder()
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {**counters, "recordings": len(self.recordings.by_key), "latency": self.served.to_dict()}
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    stub: StubLLM = None
+
+    def do_GET(self) -> None:
+        if self.path.rstrip('/') == '/stats':
+            self._json(200, self.stub.stats())
+        else:
+            self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        started_at = time.monotonic()
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        stub = self.stub
+        stub.count('requests')
+        delay = stub.latency()
+
+        if random.random() < stub.error_rate:
+            time.sleep(delay)
+            status = random.choice(stub.error_statuses)
+            stub.count(f'errors_{status}')
+            self._json(status, {"error": {"message": "stub: injected failure", "type": "server_error"}})
+            return
+
+        messages = body.get('messages') or []
+        prompt = messages[0]['content'] if len(messages) == 1 else messages
+        text, hit = stub.recordings.lookup(prompt_key(prompt))
+        stub.count('hits' if hit else 'misses')
+        if not hit and stub.on_miss == 'error':
+            time.sleep(delay)
+            self._json(404, {"error": {"message": "stub: prompt not recorded", "type": "invalid_request_error"}})
+            return
+
+        model = body.get('model', 'stub')
+        if body.get('stream'):
+            self._stream(model, text, delay)
+        else:
+            time.sleep(delay)
+            prompt_tokens = count_tokens(prompt if isinstance(prompt, str) else json.dumps(prompt))
+            completion_tokens = count_tokens(text)
+            self._json(200, {
+                "id": f"stub-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+        stub.served.record(time.monotonic() - started_at)
+
+    def _stream(self, model: str, text: str, delay: float) -> None:
+        chunks = [text[i:i + self.stub.chunk_chars] for i in range(0, len(text), self.stub.chunk_chars)] or ['']
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        completion_id = f"stub-{uuid.uuid4().hex}"
+        for index, chunk in enumerate(chunks):
+            time.sleep(delay / len(chunks))
+            last = index == len(chunks) - 1
+            self._event({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": "stop" if last else None}],
+            })
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _event(self, payload: dict) -> None:
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def _json(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug({'log': format % args})
+
+
+def create_server(stub: StubLLM, host: str = LLM_STUB_HOST, port: int = LLM_STUB_PORT) -> ThreadingHTTPServer:
+    handler = type('BoundStubRequestHandler', (StubRequestHandler,), {'stub': stub})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default=LLM_STUB_HOST)
+    parser.add_argument('--port', type=int, default=LLM_STUB_PORT)
+    parser.add_argument('--recordings', default=LLM_STUB_RECORDINGS)
+    parser.add_argument('--latency', default=LLM_STUB_LATENCY)
+    parser.add_argument('--error-rate', type=float, default=LLM_STUB_ERROR_RATE)
+    parser.add_argument('--error-statuses', default=LLM_STUB_ERROR_STATUSES)
+    parser.add_argument('--on-miss', choices=['replay', 'error'], default='replay')
+    args = parser.parse_args(argv)
+
+    stub = StubLLM(
+        Recordings(args.recordings),
+        parse_latency(args.latency),
+        error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.error_statuses.split(',') if s.strip()],
+        on_miss=args.on_miss)
+    server = create_server(stub, args.host, args.port)
+    print(f"LLM stub listening on http://{args.host}:{args.port}/v1 "
+          f"({len(stub.recordings.by_key)} recorded answers)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
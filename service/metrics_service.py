@@ -0,0 +1,59 @@
+import threading
+from collections import deque
+from typing import Callable, Dict
+
+
+class LatencyRecorder():
+    """
+    Thread-safe rolling window of latency samples (in seconds).
+    """
+
+    def __init__(self, window: int = 1000) -> None:
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def percentile(self, pct: float) -> float:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 2),
+            "p95_ms": round(self.percentile(95) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+        }
+
+
+class MetricsService():
+    """
+    Registry of named stats providers exposed through the metrics endpoint.
+    """
+    _providers: Dict[str, Callable[[], dict]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def register(cls, name: str, provider: Callable[[], dict]) -> None:
+        with cls._lock:
+            cls._providers[name] = provider
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        with cls._lock:
+            providers = dict(cls._providers)
+        return {name: provider() for name, provider in providers.items()}
@@ -0,0 +1,208 @@
+import os
+import re
+import logging
+import threading
+from typing import Iterable, List, Optional, Set, Tuple
+
+from service.parser.tokens import TOKEN_ENCODING, count_tokens, truncate_tokens
+from service.metrics_service import MetricsService
+
+COMPACTION_ENABLED = os.environ.get('COMPACTION_ENABLED', 'true').lower() == 'true'
+# Tokens of page text sent to the model on top of the meta tags.
+COMPACTION_TOKEN_BUDGET = int(os.environ.get('COMPACTION_TOKEN_BUDGET', 800))
+SHORT_STRING_WORDS = 3
+# Bump when a code change alters the compacted text, so caches drop what the old code produced.
+COMPACTION_VERSION = 2
+
+# UI strings Instagram renders on every page, compared case-insensitively.
+BOILERPLATE_STRINGS = {
+    'log in', 'sign up', 'meta', 'about', 'blog', 'jobs', 'help', 'api', 'privacy', 'terms',
+    'locations', 'instagram lite', 'threads', 'contact uploading & non-users', 'meta verified',
+    'consumer health privacy', 'forgot password?', "don't have an account?", 'or', 'more',
+    'see translation', 'reply', 'follow', 'following', 'message', 'share', 'save', 'like',
+    'view all comments', 'more posts from', 'log in to like or comment.', 'home', 'search',
+    'explore', 'reels', 'messages', 'notifications', 'create', 'profile', 'english', '·',
+    'verified', 'add a comment…', 'add a comment...', 'post', 'view more comments',
+    'open app', 'see more', 'also from meta', 'related accounts', 'see all',
+}
+_BOILERPLATE_PATTERN = re.compile(r'^(?:©\s*\d{4}\s*instagram.*|\d+\s*[smhdw]|\d+\s+(?:seconds?|minutes?|hours?|days?|weeks?)\s+ago)$',
+                                  re.IGNORECASE)
+
+_WORD = re.compile(r'[#@]?\w+', re.UNICODE)
+_DIGIT = re.compile(r'\d')
+
+logger = logging.getLogger(__name__)
+
+
+def _words(text: str) -> Set[str]:
+    # Numbers and very short words match too much to say anything about closeness.
+    return {w.lower() for w in _WORD.findall(text) if len(w) > 2 and not w.isdigit()}
+
+
+def _is_numeric(text: str) -> bool:
+    """
+    Counts and dates: strings of a few words, at least one of them a number.
+    """
+    words = text.split()
+    return len(words) <= 4 and any(_DIGIT.search(w) for w in words)
+
+
+def _is_boilerplate(text: str) -> bool:
+    return text.lower() in BOILERPLATE_STRINGS or bool(_BOILERPLATE_PATTERN.match(text))
+
+
+def _is_short(text: str) -> bool:
+    return len(text.split()) <= SHORT_STRING_WORDS and not _DIGIT.search(text)
+
+
+class TextCompactor():
+    """
+    Shrinks the visible page text before it is put into a prompt:
+
+    1. normalises whitespace and drops repeated strings;
+    2. drops known UI strings, strings already present in the meta tags, and
+       short strings surrounded by UI strings (menus, footers);
+    3. ranks what is left by word overlap with the anchors (caption and title)
+       and by distance to where the caption sits in the page, keeping short
+       strings with numbers (counts, dates) ahead of plain text;
+    4. keeps the best strings, in document order, within `token_budget`.
+    """
+
+    def __init__(self, token_budget: int = COMPACTION_TOKEN_BUDGET) -> None:
+        self.token_budget = token_budget
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._tokens_in = 0
+        self._tokens_out = 0
+
+    def compact(self, strings: Iterable[str], anchors: Iterable[Optional[str]] = ()) -> str:
+        """
+        Args:
+            strings (Iterable[str]): Visible text strings in document order.
+            anchors (Iterable[Optional[str]]): Text the model receives anyway (meta content);
+                used for ranking and to drop duplicates of it.
+
+        Returns:
+            str: Compacted text, one string per line.
+        """
+        strings = list(strings)
+        anchors = [a for a in anchors if a]
+        tokens_in = count_tokens(' '.join(strings))
+
+        candidates, focus = self._filter(self._dedupe(strings), anchors)
+        selected = self._select(candidates, anchors, focus)
+        text = '\n'.join(selected)
+        tokens_out = count_tokens(text)
+
+        with self._lock:
+            self._calls += 1
+            self._tokens_in += tokens_in
+            self._tokens_out += tokens_out
+        logger.info({'log': f"Compacted page text from {tokens_in} to {tokens_out} tokens "
+                            f"({len(strings)} -> {len(selected)} strings)"})
+        return text
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "tokens_in": self._tokens_in,
+                "tokens_out": self._tokens_out,
+                "token_budget": self.token_budget,
+                "reduction": round(1 - self._tokens_out / self._tokens_in, 4) if self._tokens_in else 0.0,
+            }
+
+    @staticmethod
+    def _dedupe(strings: List[str]) -> List[str]:
+        seen = set()
+        unique = []
+        for text in strings:
+            text = ' '.join(text.split())
+            key = text.lower()
+            if text and key not in seen:
+                seen.add(key)
+                unique.append(text)
+        return unique
+
+    @staticmethod
+    def _filter(strings: List[str], anchors: List[str]) -> Tuple[List[str], Optional[int]]:
+        """
+        Returns:
+            Tuple[List[str], Optional[int]]: The kept strings, and the position among them
+            where the first anchor duplicate (usually the caption) was dropped.
+        """
+        # Whole strings only: a short string found inside a caption is not a copy of it.
+        anchor_strings = {' '.join(a.split()).lower() for a in anchors}
+        boilerplate = [_is_boilerplate(text) for text in strings]
+        kept = []
+        focus = None
+        for i, text in enumerate(strings):
+            if boilerplate[i]:
+                continue
+            if text.lower() in anchor_strings:
+                if focus is None:
+                    focus = len(kept)
+                continue
+            # Unknown short strings wedged between UI strings are menu or footer items.
+            neighbours = [boilerplate[j] for j in (i - 1, i + 1) if 0 <= j < len(strings)]
+            if _is_short(text) and neighbours and all(neighbours):
+                continue
+            kept.append(text)
+        return kept, focus
+
+    def _select(self, strings: List[str], anchors: List[str], focus: Optional[int] = None) -> List[str]:
+        if not strings:
+            return []
+        anchor_words = set().union(*(_words(a) for a in anchors)) if anchors else set()
+        overlaps = [len(_words(text) & anchor_words) / (len(_words(text)) or 1) for text in strings]
+        if focus is None:
+            best = max(range(len(strings)), key=lambda i: overlaps[i])
+            focus = best if overlaps[best] else 0
+        scores = [
+            overlaps[i] + (0.5 if _is_numeric(text) else 0.0) + 1.0 / (1 + abs(i - focus))
+            for i, text in enumerate(strings)
+        ]
+
+        chosen = set()
+        remaining = self.token_budget
+        for i in sorted(range(len(strings)), key=lambda i: -scores[i]):
+            # Each string costs one extra token for the line break.
+            cost = count_tokens(strings[i]) + 1
+            if cost <= remaining:
+                chosen.add(i)
+                remaining -= cost
+            elif not chosen and remaining > 0:
+                strings[i] = truncate_tokens(strings[i], remaining - 1)
+                chosen.add(i)
+                remaining = 0
+            if remaining <= 1:
+                break
+        return [strings[i] for i in sorted(chosen)]
+
+
+def compaction_settings() -> str:
+    """
+    Everything that shapes the compacted text, for the keys of caches holding it.
+    """
+    if not COMPACTION_ENABLED:
+        return 'off'
+    return f"v{COMPACTION_VERSION}:{COMPACTION_TOKEN_BUDGET}:{SHORT_STRING_WORDS}:{TOKEN_ENCODING}:" \
+           f"{'|'.join(sorted(BOILERPLATE_STRINGS))}:{_BOILERPLATE_PATTERN.pattern}"
+
+
+_compactor: Optional[TextCompactor] = None
+_compactor_lock = threading.Lock()
+
+
+def get_text_compactor() -> Optional[TextCompactor]:
+    """
+    Return the process-wide compactor, or None when compaction is disabled.
+    """
+    global _compactor
+    if not COMPACTION_ENABLED:
+        return None
+    with _compactor_lock:
+        if _compactor is None:
+            _compactor = TextCompactor()
+            MetricsService.register('compaction', _compactor.stats)
+        return _compactor
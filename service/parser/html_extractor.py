@@ -0,0 +1,115 @@
+import os
+import logging
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover - lxml is optional, BeautifulSoup is the fallback
+    etree = None
+
+# 'fast': single-pass lxml extractor, 'soup': BeautifulSoup html.parser
+HTML_EXTRACTOR = os.environ.get('HTML_EXTRACTOR', 'fast')
+
+SKIPPED_TAGS = {'script', 'style'}
+
+logger = logging.getLogger(__name__)
+
+
+class _ExtractorTarget():
+    """
+    lxml parser target collecting `og:` meta tags and visible text in one pass.
+
+    Text is emitted the way BeautifulSoup's `stripped_strings` does: every run
+    of character data between two tags is one string, stripped, empties dropped.
+    """
+
+    def __init__(self, properties: List[str]) -> None:
+        self.wanted = set(properties)
+        self.meta: Dict[str, Optional[str]] = {}
+        self.strings: List[str] = []
+        self._buffer: List[str] = []
+        self._skip_depth = 0
+
+    def start(self, tag, attrib) -> None:
+        self._flush()
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag == 'meta':
+            prop = attrib.get('property')
+            if prop in self.wanted and prop not in self.meta:
+                self.meta[prop] = attrib.get('content')
+
+    def end(self, tag) -> None:
+        self._flush()
+        if tag in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def data(self, data) -> None:
+        self._buffer.append(data)
+
+    def comment(self, text) -> None:
+        self._flush()
+
+    def close(self) -> Tuple[Dict[str, Optional[str]], List[str]]:
+        self._flush()
+        return self.meta, self.strings
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        text = ''.join(self._buffer).strip()
+        self._buffer = []
+        if text and not self._skip_depth:
+            self.strings.append(text)
+
+
+def extract_fast(html_content: str, properties: List[str]) -> Tuple[Dict[str, Optional[str]], List[str]]:
+    """
+    Single streaming pass over the document with lxml, no tree is built.
+
+    Returns:
+        Tuple[Dict[str, Optional[str]], List[str]]: First `content` of each requested meta property,
+        and the visible text strings in document order.
+    """
+    target = _ExtractorTarget(properties)
+    parser = etree.HTMLParser(target=target, remove_comments=True, recover=True)
+    parser.feed(html_content)
+    return parser.close()
+
+
+def extract_soup(html_content: str, properties: List[str]) -> Tuple[Dict[str, Optional[str]], List[str]]:
+    """
+    Reference implementation with BeautifulSoup's html.parser.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, "html.parser")
+    meta = {}
+    for prop in properties:
+        tag = soup.find("meta", {"property": prop})
+        if tag:
+            meta[prop] = tag.get("content")
+    for data in soup(list(SKIPPED_TAGS)):
+        data.decompose()
+    return meta, list(soup.stripped_strings)
+
+
+def extract_strings(html_content: str, properties: List[str]) -> Tuple[Dict[str, Optional[str]], List[str]]:
+    """
+    Extract meta properties and the visible text strings, preferring the fast
+    extractor and falling back to BeautifulSoup when lxml is unavailable or fails.
+    """
+    if HTML_EXTRACTOR == 'fast' and etree is not None:
+        try:
+            return extract_fast(html_content, properties)
+        except Exception:
+            logger.warning({'log': "Fast HTML extractor failed, falling back to BeautifulSoup"})
+    return extract_soup(html_content, properties)
+
+
+def extract(html_content: str, properties: List[str]) -> Tuple[Dict[str, Optional[str]], str]:
+    """
+    Like `extract_strings`, with the visible text joined into one string.
+    """
+    meta, strings = extract_strings(html_content, properties)
+    return meta, ' '.join(strings)
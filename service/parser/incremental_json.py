@@ -0,0 +1,81 @@
+import json
+from typing import Any, Dict, Optional
+
+from service.parser.structured_output import loads_lenient
+
+
+class IncrementalJSONParser():
+    """
+    Parses a JSON object as it is streamed in, reporting each top-level member
+    as soon as its value is complete (at the following ',' or the closing '}').
+
+    Anything before the first '{' (code fences, prose) is skipped. Members that
+    do not decode even after `repair_json` are dropped.
+    """
+
+    def __init__(self) -> None:
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+        self._buffer = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._member_start: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        return self._buffer
+
+    def feed(self, chunk: str) -> Dict[str, Any]:
+        """
+        Consume the next piece of the answer.
+
+        Returns:
+            Dict[str, Any]: The members completed by this chunk.
+        """
+        self._buffer += chunk
+        completed: Dict[str, Any] = {}
+        buffer = self._buffer
+        while self._pos < len(buffer) and not self.done:
+            ch = buffer[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == '\\':
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif self._member_start is None:
+                if ch == '{':
+                    self._depth = 1
+                    self._member_start = self._pos + 1
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete(self._member_start, self._pos, completed)
+                    self.done = True
+            elif ch == ',' and self._depth == 1:
+                self._complete(self._member_start, self._pos, completed)
+                self._member_start = self._pos + 1
+            self._pos += 1
+        return completed
+
+    def _complete(self, start: int, end: int, completed: Dict[str, Any]) -> None:
+        member = self._buffer[start:end].strip()
+        if not member:
+            return
+        try:
+            decoded = json.loads('{' + member + '}')
+        except ValueError:
+            try:
+                decoded = loads_lenient('{' + member + '}')
+            except ValueError:
+                return
+        if isinstance(decoded, dict):
+            completed.update(decoded)
+            self.fields.update(decoded)
@@ -0,0 +1,131 @@
+import re
+from datetime import datetime
+from typing import Optional
+
+# Instagram renders og:description as
+#   "1,234 likes, 56 comments - username on March 3, 2024: "caption"."
+# with the words, separators and date format localised.
+LIKE_WORDS = [
+    r'likes?', r'Me gusta', r'J[’\']aime', r'„?Gefällt mir“?-Angaben', r'Gefällt mir',
+    r'curtidas?', r'Mi piace', r'vind-ik-leuks?',
+]
+COMMENT_WORDS = [
+    r'comments?', r'comentarios?', r'commentaires?', r'Kommentare?', r'comentários?',
+    r'commenti', r'commento', r'reacties?',
+]
+DATE_PREPOSITIONS = [r'on', r'el', r'le', r'am', r'em', r'il', r'op', r'en']
+
+_NUMBER = r'\d[\d.,\s  ]*?(?:\s?(?:[KkMmBb]|mil|Mio\.?|Mrd\.?|mln|Tsd\.?))?'
+
+OG_DESCRIPTION_PATTERN = re.compile(
+    rf'^\s*(?P<likes>{_NUMBER})\s*(?:{"|".join(LIKE_WORDS)})\s*,\s*'
+    rf'(?P<comments>{_NUMBER})\s*(?:{"|".join(COMMENT_WORDS)})\s*[-–—]\s*'
+    rf'(?P<username>[A-Za-z0-9._]+)\s+(?:{"|".join(DATE_PREPOSITIONS)})\s+'
+    r'(?P<date>[^:]+?)\s*:\s*["“„«]?(?P<caption>.*?)["”“»]?\.?\s*$',
+    re.DOTALL)
+
+OG_TITLE_PATTERN = re.compile(
+    r'^\s*(?:(?P<name>.*?)\s+\()?@?(?P<username>[A-Za-z0-9._]+)\)?\s+(?:on|en|sur|auf|em|su|op)\s+Instagram\s*:',
+    re.DOTALL)
+
+_MULTIPLIERS = {
+    'k': 1_000, 'tsd': 1_000, 'mil': 1_000,
+    'm': 1_000_000, 'mio': 1_000_000, 'mln': 1_000_000,
+    'b': 1_000_000_000, 'mrd': 1_000_000_000,
+}
+
+DATE_FORMATS = ['%B %d, %Y', '%b %d, %Y', '%d %B %Y']
+
+REQUIRED_FIELDS = ['likes', 'comments', 'owner_username', 'caption']
+
+
+def parse_count(text: str) -> Optional[int]:
+    """
+    Parse a localised, possibly abbreviated count: "1,234", "1.234", "1 234", "1.2K", "3,4 mil".
+    """
+    text = text.strip().replace(' ', ' ').replace(' ', ' ')
+    match = re.match(r'^([\d.,\s]+?)\s*([A-Za-z]+)?\.?$', text)
+    if not match:
+        return None
+    digits, suffix = match.group(1).strip(), (match.group(2) or '').lower()
+    if suffix:
+        multiplier = _MULTIPLIERS.get(suffix)
+        if multiplier is None:
+            return None
+        try:
+            return int(round(float(digits.replace(' ', '').replace(',', '.')) * multiplier))
+        except ValueError:
+            return None
+    digits = re.sub(r'[.,\s]', '', digits)
+    return int(digits) if digits.isdigit() else None
+
+
+def parse_date(text: str) -> Optional[str]:
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text.strip(), fmt).isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+class OgDescriptionParser():
+    """
+    Rule-based extraction of post fields from Instagram's og: meta tags.
+    """
+
+    @staticmethod
+    def parse(description: Optional[str], title: Optional[str] = None) -> Optional[dict]:
+        """
+        Args:
+            description (Optional[str]): og:description content.
+            title (Optional[str]): og:title content, used to cross-check the owner.
+
+        Returns:
+            Optional[dict]: Post fields in the shape the LLM returns, or None if the
+            description does not follow a known template or the tags disagree.
+        """
+        if not description:
+            return None
+        match = OG_DESCRIPTION_PATTERN.match(description)
+        if not match:
+            return None
+        likes = parse_count(match.group('likes'))
+        comments = parse_count(match.group('comments'))
+        username = match.group('username')
+        caption = match.group('caption').strip()
+        if likes is None or comments is None:
+            return None
+
+        if title:
+            title_match = OG_TITLE_PATTERN.match(title)
+            if title_match and title_match.group('username').lower() != username.lower():
+                return None
+
+        return {
+            "likes": likes,
+            "comments": comments,
+            "owner_username": username,
+            "caption": caption,
+            "timestamp": parse_date(match.group('date')),
+        }
+
+    @staticmethod
+    def reference(description: Optional[str], title: Optional[str] = None) -> dict:
+        """
+        The fields the og: tags give even when they are incomplete, for checking
+        other extractors against.
+
+        Returns:
+            dict: Subset of the post fields; empty when the tags give nothing.
+        """
+        data = OgDescriptionParser.parse(description, title) or {}
+        reference = {field: data[field] for field in REQUIRED_FIELDS if data.get(field) not in (None, '')}
+        title_match = OG_TITLE_PATTERN.match(title) if title else None
+        if title_match:
+            reference.setdefault('owner_username', title_match.group('username'))
+        return reference
+
+    @staticmethod
+    def is_complete(data: Optional[dict]) -> bool:
+        return bool(data) and all(data.get(field) not in (None, '') for field in REQUIRED_FIELDS)
@@ -0,0 +1,526 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:  # pragma: no cover - templates are disabled without lxml
+    etree = lxml_html = None
+
+try:
+    from lxml.cssselect import CSSSelector
+except ImportError:  # pragma: no cover - cssselect is optional, XPath always works
+    CSSSelector = None
+
+try:
+    import regex
+except ImportError:  # pragma: no cover - without it learned regexes only get the static checks
+    regex = None
+
+from service.parser.og_description import parse_count, parse_date
+from service.parser.tokens import truncate_tokens
+from service.metrics_service import MetricsService
+
+SELECTOR_TEMPLATES_ENABLED = os.environ.get('SELECTOR_TEMPLATES_ENABLED', 'true').lower() == 'true'
+SELECTOR_TEMPLATE_PATH = os.environ.get('SELECTOR_TEMPLATE_PATH', '/tmp/llm_scrapper/selector_templates.sqlite')
+# Consecutive validation failures after which a template is dropped and re-learned.
+SELECTOR_TEMPLATE_MAX_FAILURES = int(os.environ.get('SELECTOR_TEMPLATE_MAX_FAILURES', 2))
+# Seconds to wait before asking the model again for a layout it could not template.
+SELECTOR_TEMPLATE_RETRY_AFTER = int(os.environ.get('SELECTOR_TEMPLATE_RETRY_AFTER', 3600))
+SELECTOR_SKELETON_TOKEN_BUDGET = int(os.environ.get('SELECTOR_SKELETON_TOKEN_BUDGET', 6000))
+FINGERPRINT_DEPTH = int(os.environ.get('SELECTOR_FINGERPRINT_DEPTH', 8))
+# Limits on the selectors the model writes, which run on every page of their layout:
+# longest XPath/CSS selector and regex accepted, descendant steps per selector, and
+# seconds a template may spend on one page before it counts as a failure.
+SELECTOR_MAX_LENGTH = int(os.environ.get('SELECTOR_MAX_LENGTH', 300))
+SELECTOR_REGEX_MAX_LENGTH = int(os.environ.get('SELECTOR_REGEX_MAX_LENGTH', 100))
+SELECTOR_MAX_DESCENDANT_STEPS = int(os.environ.get('SELECTOR_MAX_DESCENDANT_STEPS', 4))
+SELECTOR_TEMPLATE_TIME_BUDGET = float(os.environ.get('SELECTOR_TEMPLATE_TIME_BUDGET', 0.25))
+
+# Post fields a template has to locate; the rest is derived from the URL and caption.
+TEMPLATE_FIELDS = ['likes', 'comments', 'caption', 'owner_username', 'timestamp']
+REQUIRED_TEMPLATE_FIELDS = ['likes', 'comments', 'caption', 'owner_username']
+# Fields a numeric XPath result (count(...), sum(...)) may fill.
+COUNT_FIELDS = ['likes', 'comments']
+# Relative difference tolerated against an og: count, which Instagram abbreviates ("1.2K").
+COUNT_TOLERANCE = 0.05
+
+_USERNAME = re.compile(r'^@?([A-Za-z0-9._]{1,30})$')
+_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+_DESCENDANT_STEP = re.compile(r'//|descendant')
+
+# Elements that carry no layout information for the fingerprint or the model.
+_IGNORED_TAGS = {'script', 'style', 'noscript', 'link', 'svg', 'path', 'iframe', 'template'}
+# Attributes kept in the skeleton, everything else is noise for selector induction.
+_SKELETON_ATTRIBUTES = {'id', 'class', 'role', 'href', 'datetime', 'property', 'name', 'content',
+                        'aria-label', 'title', 'alt', 'data-testid'}
+_SKELETON_TEXT_CHARS = 120
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS templates (
+    fingerprint TEXT PRIMARY KEY,
+    template TEXT,
+    failures INTEGER NOT NULL DEFAULT 0,
+    hits INTEGER NOT NULL DEFAULT 0,
+    learned_at REAL NOT NULL
+);
+"""
+
+
+def _parse(html_content: str):
+    return lxml_html.fromstring(html_content)
+
+
+def dom_fingerprint(html_content: str, depth: int = FINGERPRINT_DEPTH) -> str:
+    """
+    Hash the structure of a page: the set of tag paths down to `depth` plus the
+    meta properties it declares. Text, attribute values and repeated siblings
+    are ignored, so two posts rendered by the same layout share a fingerprint.
+    """
+    root = _parse(html_content)
+    paths = set()
+
+    def walk(element, path: str, level: int) -> None:
+        for child in element:
+            if not isinstance(child.tag, str) or child.tag in _IGNORED_TAGS:
+                continue
+            child_path = f'{path}/{child.tag}'
+            if child.tag == 'meta' and child.get('property'):
+                paths.add(f'meta[{child.get("property")}]')
+            paths.add(child_path)
+            if level < depth:
+                walk(child, child_path, level + 1)
+
+    walk(root, root.tag, 1)
+    return hashlib.sha1('\n'.join(sorted(paths)).encode('utf-8')).hexdigest()[:20]
+
+
+def dom_skeleton(html_content: str, token_budget: int = SELECTOR_SKELETON_TOKEN_BUDGET) -> str:
+    """
+    Strip a page down to what the model needs to write selectors: no scripts or
+    styles, only structural attributes, and shortened text.
+    """
+    root = _parse(html_content)
+    for element in list(root.iter()):
+        if not isinstance(element.tag, str):
+            element.drop_tree()
+            continue
+        if element.tag in _IGNORED_TAGS:
+            element.drop_tree()
+            continue
+        for name in list(element.attrib):
+            if name not in _SKELETON_ATTRIBUTES:
+                del element.attrib[name]
+        if element.text and len(element.text) > _SKELETON_TEXT_CHARS:
+            element.text = element.text[:_SKELETON_TEXT_CHARS] + '…'
+        if element.tail and len(element.tail) > _SKELETON_TEXT_CHARS:
+            element.tail = element.tail[:_SKELETON_TEXT_CHARS] + '…'
+    skeleton = etree.tostring(root, encoding='unicode', method='html')
+    return truncate_tokens(re.sub(r'\s+', ' ', skeleton), token_budget)
+
+
+def _regex_problem(pattern: str) -> Optional[str]:
+    """
+    Why a learned regex may not run on every page, or None. Backreferences and
+    quantified groups that repeat something themselves, e.g. `(a+)+` or
+    `(a|ab)*`, are refused: they are what makes backtracking exponential.
+    """
+    if len(pattern) > SELECTOR_REGEX_MAX_LENGTH:
+        return 'regex too long'
+    if _BACKREFERENCE.search(pattern):
+        return 'regex backreference'
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        return f'invalid regex: {e}'
+    # For every open group: whether something inside it repeats or alternates.
+    repeats = [False]
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if ch == '[':
+            i += 1
+            if pattern[i:i + 1] == '^':
+                i += 1
+            if pattern[i:i + 1] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+        elif ch == '(':
+            repeats.append(False)
+            if pattern[i + 1:i + 2] == '?':
+                i += 1
+        elif ch == ')':
+            inner = repeats.pop()
+            quantified = pattern[i + 1:i + 2] in ('*', '+', '{')
+            if inner and quantified:
+                return 'regex nested quantifier'
+            repeats[-1] = repeats[-1] or inner or quantified or pattern[i + 1:i + 2] == '?'
+        elif ch in '*+?{|':
+            repeats[-1] = True
+        i += 1
+    return None
+
+
+def _selector_problem(spec: dict) -> Optional[str]:
+    """
+    Why a field selector learned from the model may not be stored, or None.
+    """
+    selector = spec.get('xpath') or spec.get('css')
+    if not isinstance(selector, str) or not selector:
+        return 'no selector'
+    if len(selector) > SELECTOR_MAX_LENGTH:
+        return 'selector too long'
+    try:
+        path = etree.XPath(selector).path if spec.get('xpath') else CSSSelector(selector).path
+    except Exception as e:
+        return f'invalid selector: {e}'
+    if len(_DESCENDANT_STEP.findall(path)) > SELECTOR_MAX_DESCENDANT_STEPS:
+        return 'too many descendant steps'
+    if spec.get('regex') is not None:
+        if not isinstance(spec['regex'], str):
+            return 'regex is not a string'
+        return _regex_problem(spec['regex'])
+    return None
+
+
+def _search(pattern: str, value: str, deadline: float):
+    if regex is None:
+        return re.search(pattern, value, re.DOTALL)
+    return regex.search(pattern, value, regex.DOTALL, timeout=max(deadline - time.monotonic(), 0.001))
+
+
+def _select(root, field: str, spec: dict, deadline: float = float('inf')) -> Optional[str]:
+    """
+    Evaluate one field selector: `{"xpath" | "css": ..., "attr": optional, "regex": optional}`.
+    """
+    if spec.get('xpath'):
+        found = root.xpath(spec['xpath'])
+    elif spec.get('css') and CSSSelector is not None:
+        found = CSSSelector(spec['css'])(root)
+    else:
+        return None
+    if isinstance(found, bool):
+        return None
+    if isinstance(found, float):
+        # Numeric XPath expressions such as count(...) return a float; they can only be counts.
+        if field not in COUNT_FIELDS:
+            return None
+        found = [str(int(found))] if found.is_integer() else [str(found)]
+    elif isinstance(found, str):
+        found = [found]
+    if not found:
+        return None
+    node = found[0]
+    if isinstance(node, str):
+        value = str(node)
+    elif spec.get('attr'):
+        value = node.get(spec['attr'])
+    else:
+        value = node.text_content()
+    if value is None:
+        return None
+    value = ' '.join(value.split())
+    if spec.get('regex'):
+        match = _search(spec['regex'], value, deadline)
+        if not match:
+            return None
+        value = match.group(1) if match.groups() else match.group(0)
+    return value.strip() or None
+
+
+def _coerce(field: str, value: Optional[str]):
+    """
+    Convert a selected string into the field's type, or None when it does not fit.
+    """
+    if value is None:
+        return None
+    if field in ('likes', 'comments'):
+        return parse_count(value)
+    if field == 'owner_username':
+        match = _USERNAME.match(value)
+        return match.group(1) if match else None
+    if field == 'timestamp':
+        return parse_date(value) or value
+    return value
+
+
+def _disagreements(data: dict, reference: dict) -> List[str]:
+    """
+    Fields of `data` contradicting the `reference` values (from the og: tags).
+    """
+    problems = []
+    for field, expected in reference.items():
+        value = data.get(field)
+        if value in (None, '') or expected in (None, ''):
+            continue
+        if field in COUNT_FIELDS:
+            agree = abs(value - expected) <= expected * COUNT_TOLERANCE
+        elif field == 'caption':
+            # og:description may cut the caption short.
+            value, expected = (' '.join(str(text).split()).casefold() for text in (value, expected))
+            agree = value.startswith(expected) or expected.startswith(value)
+        elif field == 'owner_username':
+            agree = str(value).lower() == str(expected).lower()
+        else:
+            continue
+        if not agree:
+            problems.append(field)
+    return problems
+
+
+class SelectorTemplate():
+    def __init__(self, selectors: Dict[str, dict]) -> None:
+        self.selectors = {field: spec for field, spec in selectors.items()
+                          if field in TEMPLATE_FIELDS and isinstance(spec, dict)}
+        # Set by `apply` when the template ran out of its time budget.
+        self.timed_out = False
+
+    def problems(self) -> List[str]:
+        """
+        Selectors that may not run on every page of the layout (too long, too
+        costly or invalid), as "field: reason".
+        """
+        problems = []
+        for field, spec in self.selectors.items():
+            problem = _selector_problem(spec)
+            if problem:
+                problems.append(f'{field}: {problem}')
+        return problems
+
+    def apply(self, html_content: str, reference: Optional[dict] = None) -> Optional[dict]:
+        """
+        Args:
+            html_content (str): Raw page HTML.
+            reference (Optional[dict]): Field values known from the og: tags, which
+                the template's values must agree with.
+
+        Returns:
+            Optional[dict]: Post fields in the shape the LLM returns, or None if a
+            required field is missing or does not validate, or the selectors took
+            longer than SELECTOR_TEMPLATE_TIME_BUDGET.
+        """
+        deadline = time.monotonic() + SELECTOR_TEMPLATE_TIME_BUDGET
+        self.timed_out = False
+        root = _parse(html_content)
+        data = {}
+        for field in TEMPLATE_FIELDS:
+            spec = self.selectors.get(field)
+            try:
+                data[field] = _coerce(field, _select(root, field, spec, deadline)) if spec else None
+            except TimeoutError:
+                self.timed_out = True
+            except (etree.XPathError, ValueError):
+                data[field] = None
+            # XPath evaluation cannot be interrupted, so its time is checked after the fact.
+            if self.timed_out or time.monotonic() > deadline:
+                self.timed_out = True
+                logger.warning({'log': f"Selector template exceeded its {SELECTOR_TEMPLATE_TIME_BUDGET}s budget"})
+                return None
+        if any(data.get(field) in (None, '') for field in REQUIRED_TEMPLATE_FIELDS):
+            return None
+        mismatched = _disagreements(data, reference or {})
+        if mismatched:
+            logger.info({'log': f"Selector template disagrees with the og: tags on {', '.join(mismatched)}"})
+            return None
+        return data
+
+    def to_json(self) -> str:
+        return json.dumps(self.selectors, ensure_ascii=False, separators=(',', ':'))
+
+
+class SelectorTemplateStore():
+    """
+    Selector templates learned from the model, keyed by DOM fingerprint.
+
+    Pages whose layout already has a template are extracted locally. A template
+    that fails validation `max_failures` times in a row is dropped so the next
+    page with that layout re-learns it; a layout the model could not template
+    is not retried for `retry_after` seconds. SQLite in WAL mode shares the
+    templates between worker processes.
+    """
+
+    def __init__(self, path: str = SELECTOR_TEMPLATE_PATH,
+                 max_failures: int = SELECTOR_TEMPLATE_MAX_FAILURES,
+                 retry_after: int = SELECTOR_TEMPLATE_RETRY_AFTER) -> None:
+        self.path = path
+        self.max_failures = max_failures
+        self.retry_after = retry_after
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def extract(self, html_content: str, fingerprint: Optional[str] = None,
+                reference: Optional[dict] = None) -> Optional[dict]:
+        """
+        Extract post fields with the template stored for the page's layout.
+
+        Args:
+            html_content (str): Raw page HTML.
+            fingerprint (Optional[str]): Precomputed `dom_fingerprint` of the page.
+            reference (Optional[dict]): Field values known from the og: tags.
+
+        Returns:
+            Optional[dict]: The fields, or None on a miss or a validation failure.
+        """
+        fingerprint = fingerprint or dom_fingerprint(html_content)
+        row = self._connection().execute(
+            "SELECT template FROM templates WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        if row is None or row[0] is None:
+            self._count('misses')
+            return None
+        template = SelectorTemplate(json.loads(row[0]))
+        problems = template.problems()
+        if problems:
+            # Stored before the selector checks existed.
+            self._reject(fingerprint, problems)
+            return None
+        data = template.apply(html_content, reference)
+        if template.timed_out:
+            self._count('timeouts')
+        with self._transaction() as conn:
+            if data is None:
+                conn.execute("UPDATE templates SET failures = failures + 1 WHERE fingerprint = ?",
+                             (fingerprint,))
+                dropped = conn.execute(
+                    "DELETE FROM templates WHERE fingerprint = ? AND failures >= ?",
+                    (fingerprint, self.max_failures)).rowcount
+            else:
+                conn.execute("UPDATE templates SET failures = 0, hits = hits + 1 WHERE fingerprint = ?",
+                             (fingerprint,))
+        if data is None:
+            self._count('validation_failures')
+            if dropped:
+                self._count('dropped')
+                logger.warning({'log': f"Dropped selector template {fingerprint} after repeated validation failures"})
+            return None
+        self._count('hits')
+        return data
+
+    def should_learn(self, fingerprint: str) -> bool:
+        """
+        True when the layout has no template and no recent failed attempt to learn one.
+        """
+        row = self._connection().execute(
+            "SELECT template, learned_at FROM templates WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        if row is None:
+            return True
+        template, learned_at = row
+        return template is None and time.time() - learned_at > self.retry_after
+
+    def learn(self, html_content: str, induce: Callable[[str], dict],
+              fingerprint: Optional[str] = None, reference: Optional[dict] = None) -> Optional[dict]:
+        """
+        Ask the model for selectors, validate them on this page and store them.
+
+        Args:
+            html_content (str): Raw page HTML.
+            induce (Callable[[str], dict]): Sends the page skeleton to the model and
+                returns the parsed `{field: selector}` mapping.
+            fingerprint (Optional[str]): Precomputed `dom_fingerprint` of the page.
+            reference (Optional[dict]): Field values known from the og: tags.
+
+        Returns:
+            Optional[dict]: Post fields extracted by the new template, or None if the
+            model's selectors do not validate.
+        """
+        fingerprint = fingerprint or dom_fingerprint(html_content)
+        self._count('learn_attempts')
+        started_at = time.monotonic()
+        try:
+            template = SelectorTemplate(induce(dom_skeleton(html_content)))
+            problems = template.problems()
+            if problems:
+                self._count('rejected')
+                logger.warning({'log': f"Refused selectors for layout {fingerprint}: {'; '.join(problems)}"})
+                data = None
+            else:
+                data = template.apply(html_content, reference)
+                if template.timed_out:
+                    self._count('timeouts')
+        except Exception:
+            logger.exception({'log': f"Selector induction failed for layout {fingerprint}"})
+            template, data = None, None
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO templates (fingerprint, template, failures, hits, learned_at) "
+                "VALUES (?, ?, 0, 0, ?)",
+                (fingerprint, template.to_json() if data else None, time.time()))
+        if data is None:
+            self._count('learn_failures')
+            logger.warning({'log': f"Selector template for layout {fingerprint} did not validate"})
+            return None
+        self._count('learned')
+        logger.info({'log': f"Learned selector template for layout {fingerprint} "
+                            f"in {(time.monotonic() - started_at) * 1000:.0f}ms"})
+        return data
+
+    def _reject(self, fingerprint: str, problems: List[str]) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM templates WHERE fingerprint = ?", (fingerprint,))
+        self._count('rejected')
+        logger.warning({'log': f"Dropped selector template {fingerprint}: {'; '.join(problems)}"})
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        conn = self._connection()
+        templates, = conn.execute("SELECT COUNT(*) FROM templates WHERE template IS NOT NULL").fetchone()
+        return {**counters, "templates": templates}
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+_store: Optional[SelectorTemplateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_selector_template_store() -> Optional[SelectorTemplateStore]:
+    """
+    Return the process-wide template store, or None when templates are disabled.
+    """
+    global _store
+    if not SELECTOR_TEMPLATES_ENABLED or lxml_html is None:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = SelectorTemplateStore()
+            MetricsService.register('selector_templates', _store.stats)
+        return _store
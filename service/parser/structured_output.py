@@ -0,0 +1,223 @@
+import re
+import json
+import typing
+from typing import Any, List, Tuple
+
+from service.parser.og_description import parse_count
+
+_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null', 'NaN': 'null', 'undefined': 'null'}
+_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}
+# A number running up to the end of the text, which may have lost digits.
+_TRAILING_NUMBER = re.compile(r'(?<![\w.])[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d*)?$|(?<![\w.])[-+.]$')
+
+
+def repair_json(text: str) -> str:
+    """
+    Turn a near-miss model answer into parseable JSON: drops code fences and
+    text around the value, escapes raw newlines inside strings, converts single
+    quotes, bare keys and Python literals, removes trailing commas and closes strings and
+    brackets left open by a truncated answer (dropping the incomplete member, also
+    when it ends in a number that may have lost digits).
+    """
+    start = min((i for i in (text.find('{'), text.find('[')) if i >= 0), default=-1)
+    if start < 0:
+        return text
+    text = text[start:]
+
+    out: List[str] = []
+    stack: List[str] = []
+    # Positions after which the value is still complete, with the brackets open there.
+    checkpoints: List[Tuple[int, List[str]]] = []
+    # Positions just inside each opened bracket, the fallback for a cut-off first member.
+    openings: List[Tuple[int, List[str]]] = []
+    quote = None
+    escaped = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+                out.append(ch)
+            elif ch == '\\':
+                escaped = True
+                out.append(ch)
+            elif ch == quote:
+                quote = None
+                out.append('"')
+            elif ch == '"':
+                out.append('\\"')
+            else:
+                out.append(_ESCAPES.get(ch, ch))
+            i += 1
+            continue
+
+        if ch in '"\'':
+            quote = ch
+            out.append('"')
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+            out.append(ch)
+            openings.append((len(out), list(stack)))
+        elif ch in '}]':
+            while out and out[-1] in ' \n\r\t,':
+                out.pop()
+            if not stack:
+                break
+            out.append(stack.pop())
+            if not stack:
+                break
+            checkpoints.append((len(out), list(stack)))
+        elif ch == ',':
+            checkpoints.append((len(out), list(stack)))
+            out.append(ch)
+        elif ch.isalpha():
+            end = i
+            while end < len(text) and (text[end].isalnum() or text[end] == '_'):
+                end += 1
+            word = text[i:end]
+            rest = text[end:].lstrip()
+            if rest.startswith(':'):
+                out.append(f'"{word}"')
+            else:
+                out.append(_LITERALS.get(word, word))
+            i = end
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    candidate = _close(out, stack)
+    if quote or (stack and _TRAILING_NUMBER.search(text)):
+        # The answer stopped inside a string or a number, so its member is
+        # incomplete even though closing it would parse: drop it, or the whole
+        # container when it was the first member.
+        checkpoints = sorted(checkpoints + openings, key=lambda checkpoint: checkpoint[0])
+    elif _parses(candidate):
+        return candidate
+    # The last member was cut off mid-way: fall back to the last complete one.
+    for position, open_brackets in reversed(checkpoints):
+        candidate = _close(out[:position], open_brackets)
+        if _parses(candidate):
+            return candidate
+    return candidate
+
+
+def _close(out: List[str], stack: List[str]) -> str:
+    text = ''.join(out).rstrip().rstrip(',')
+    if text.endswith(':'):
+        text += 'null'
+    return text + ''.join(reversed(stack))
+
+
+def _parses(text: str) -> bool:
+    try:
+        json.loads(text)
+        return True
+    except ValueError:
+        return False
+
+
+def loads_lenient(text: str) -> Any:
+    """
+    `json.loads`, falling back to `repair_json` for near-miss answers.
+
+    Raises:
+        ValueError: If the text cannot be repaired into JSON.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        return json.loads(repair_json(text))
+
+
+def _coerce(value: Any, annotation) -> Any:
+    """
+    Convert `value` to `annotation` (str, int, float, bool, their Optional forms).
+
+    Raises:
+        ValueError: If the value does not fit.
+    """
+    args = typing.get_args(annotation)
+    if typing.get_origin(annotation) is typing.Union:
+        if value is None and type(None) in args:
+            return None
+        annotation = next(arg for arg in args if arg is not type(None))
+    if value is None:
+        raise ValueError("null")
+    if annotation is bool:
+        if isinstance(value, bool):
+            return value
+        if str(value).strip().lower() in ('true', 'yes', '1'):
+            return True
+        if str(value).strip().lower() in ('false', 'no', '0'):
+            return False
+        raise ValueError(f"not a boolean: {value!r}")
+    if annotation is int:
+        if isinstance(value, bool):
+            raise ValueError(f"not an integer: {value!r}")
+        if isinstance(value, (int, float)):
+            return int(value)
+        count = parse_count(str(value))
+        if count is None:
+            raise ValueError(f"not an integer: {value!r}")
+        return count
+    if annotation is float:
+        return float(value)
+    if annotation is str:
+        if isinstance(value, (list, tuple)):
+            return ', '.join(str(v) for v in value)
+        return str(value)
+    return value
+
+
+def validate_typed_dict(data: Any, schema) -> Tuple[dict, List[str]]:
+    """
+    Validate a decoded record against a TypedDict, coercing values where the
+    intent is clear ("1,234" for an int, "true" for a bool).
+
+    Returns:
+        Tuple[dict, List[str]]: The coerced record (unknown keys kept) and the
+        problems found; a field that could not be coerced is set to None.
+    """
+    if not isinstance(data, dict):
+        return {}, [f"expected an object, got {type(data).__name__}"]
+    record = dict(data)
+    errors = []
+    for field, annotation in typing.get_type_hints(schema).items():
+        optional = type(None) in typing.get_args(annotation)
+        if field not in record:
+            if not optional:
+                errors.append(f"{field}: missing")
+            record[field] = None
+            continue
+        try:
+            record[field] = _coerce(record[field], annotation)
+        except (ValueError, TypeError, StopIteration) as e:
+            errors.append(f"{field}: {e}")
+            record[field] = None
+    return record, errors
+
+
+def parse_structured(text: str, schema=None) -> dict:
+    """
+    Decode a model answer and validate it against `schema` when given.
+
+    Raises:
+        ValueError: If the answer cannot be decoded or does not match the schema.
+    """
+    data = loads_lenient(text)
+    if schema is None:
+        return data
+    record, errors = validate_typed_dict(data, schema)
+    if errors:
+        raise ValueError(f"Response does not match {schema.__name__}: {'; '.join(errors)}")
+    return record
+
+
+def required_fields(schema) -> List[str]:
+    """
+    Fields of a TypedDict whose annotation is not Optional.
+    """
+    return [field for field, annotation in typing.get_type_hints(schema).items()
+            if type(None) not in typing.get_args(annotation)]
@@ -0,0 +1,62 @@
+import os
+import logging
+import threading
+from typing import Optional
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - fall back to a length estimate
+    tiktoken = None
+
+# Gemini has no public local tokenizer; cl100k_base tracks it closely enough for budgeting.
+TOKEN_ENCODING = os.environ.get('TOKEN_ENCODING', 'cl100k_base')
+
+# Rough characters-per-token ratio used when the encoding cannot be loaded.
+_CHARS_PER_TOKEN = 4
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """
+    Return the shared tiktoken encoding, or None when it is unavailable
+    (tiktoken missing, or the BPE file cannot be downloaded).
+    """
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            _encoding_loaded = True
+            if tiktoken is not None:
+                try:
+                    _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+                except Exception:
+                    logger.warning({'log': f"Could not load tiktoken encoding {TOKEN_ENCODING}, estimating tokens"})
+        return _encoding
+
+
+def count_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, budget: int) -> str:
+    """
+    Cut `text` down to at most `budget` tokens.
+    """
+    if budget <= 0:
+        return ''
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:budget * _CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= budget:
+        return text
+    return encoding.decode(tokens[:budget])
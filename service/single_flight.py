@@ -0,0 +1,306 @@
+import os
+import time
+import socket
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+from exceptions.common import DeadlineExceededException, SingleFlightTimeoutException
+from service.metrics_service import MetricsService
+
+SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+# Coordinate the worker processes of the host through a SQLite file, on top of the in-process map.
+SINGLE_FLIGHT_SHARED = os.environ.get('SINGLE_FLIGHT_SHARED', 'true').lower() == 'true'
+SINGLE_FLIGHT_PATH = os.environ.get('SINGLE_FLIGHT_PATH', '/tmp/llm_scrapper/single_flight.sqlite')
+# Seconds a waiter waits for the running pipeline before giving up.
+SINGLE_FLIGHT_WAIT_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_WAIT_TIMEOUT', 120))
+# Seconds a worker holds a key; a waiter in another worker takes over once it lapses.
+SINGLE_FLIGHT_LEASE = float(os.environ.get('SINGLE_FLIGHT_LEASE', 180))
+# Seconds a finished result is still handed to requests for the same key.
+SINGLE_FLIGHT_RESULT_TTL = float(os.environ.get('SINGLE_FLIGHT_RESULT_TTL', 10))
+SINGLE_FLIGHT_POLL_INTERVAL = float(os.environ.get('SINGLE_FLIGHT_POLL_INTERVAL', 0.2))
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS flights (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    lease_until REAL NOT NULL,
+    result TEXT,
+    error TEXT,
+    error_type TEXT,
+    finished_at REAL
+);
+"""
+
+# Errors re-raised as themselves in other workers, so they keep their HTTP status;
+# any other error of a leader is replayed as a ValueError carrying its message.
+_REPLAYED_ERRORS = {cls.__name__: cls for cls in (DeadlineExceededException, SingleFlightTimeoutException)}
+
+_LEAD, _FOLLOW, _DONE = 'lead', 'follow', 'done'
+# Serialized result, error message and error type of a finished run.
+_Outcome = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+class SingleFlight():
+    """
+    Runs one pipeline per key at a time; concurrent callers with the same key
+    wait for it and all get its result (or its error).
+
+    Within a process waiters share a future. Across the host's worker
+    processes the key is leased in a SQLite table: the leader stores the
+    serialized result there and waiters in other processes poll for it,
+    taking over when the leader's lease lapses (crashed worker). Results stay
+    available for `result_ttl` seconds to catch requests arriving right after.
+    """
+
+    def __init__(self, path: Optional[str] = SINGLE_FLIGHT_PATH, wait_timeout: float = SINGLE_FLIGHT_WAIT_TIMEOUT,
+                 lease: float = SINGLE_FLIGHT_LEASE, result_ttl: float = SINGLE_FLIGHT_RESULT_TTL,
+                 poll_interval: float = SINGLE_FLIGHT_POLL_INTERVAL) -> None:
+        self.path = path
+        self.wait_timeout = wait_timeout
+        self.lease = lease
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._flights: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counters = Counter()
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            conn = self._connection()
+            conn.executescript(_SCHEMA)
+            try:
+                # Tables created before error_type existed.
+                conn.execute("ALTER TABLE flights ADD COLUMN error_type TEXT")
+            except sqlite3.OperationalError:
+                pass
+
+    def run(self, key: str, fn: Callable[[], Any], serialize: Callable[[Any], str],
+            deserialize: Callable[[str], Any]) -> Any:
+        """
+        Run `fn` unless a pipeline for `key` is already running, in which case wait for its result.
+
+        Raises:
+            SingleFlightTimeoutException: If the running pipeline does not finish within `wait_timeout`.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            self._count('coalesced_local')
+            try:
+                return future.result(timeout=self.wait_timeout)
+            except TimeoutError:
+                self._count('timeouts')
+                raise SingleFlightTimeoutException(
+                    f"Timed out after {self.wait_timeout}s waiting for the in-flight scrape of {key}")
+        try:
+            result = self._run_shared(key, fn, serialize, deserialize)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._leave(key)
+
+    async def arun(self, key: str, fn: Callable[[], Awaitable], serialize: Callable[[Any], str],
+                   deserialize: Callable[[str], Any]) -> Any:
+        """
+        Awaitable variant of `run`.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            self._count('coalesced_local')
+            try:
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.wait_timeout)
+            except asyncio.TimeoutError:
+                self._count('timeouts')
+                raise SingleFlightTimeoutException(
+                    f"Timed out after {self.wait_timeout}s waiting for the in-flight scrape of {key}")
+        try:
+            result = await self._arun_shared(key, fn, serialize, deserialize)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._leave(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counters, "in_flight": len(self._flights), "shared": bool(self.path)}
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._flights[key] = future
+            return future, True
+
+    def _leave(self, key: str) -> None:
+        with self._lock:
+            self._flights.pop(key, None)
+
+    def _run_shared(self, key: str, fn: Callable[[], Any], serialize: Callable[[Any], str],
+                    deserialize: Callable[[str], Any]) -> Any:
+        if not self.path:
+            self._count('leaders')
+            return fn()
+        deadline = time.monotonic() + self.wait_timeout
+        state, payload = self._claim(key, False)
+        if state == _FOLLOW:
+            self._count('coalesced_shared')
+        while state == _FOLLOW:
+            if time.monotonic() >= deadline:
+                self._count('timeouts')
+                raise SingleFlightTimeoutException(
+                    f"Timed out after {self.wait_timeout}s waiting for another worker's scrape of {key}")
+            time.sleep(self.poll_interval)
+            state, payload = self._claim(key, True)
+        if state == _DONE:
+            return self._replay(payload, deserialize)
+        self._count('leaders')
+        try:
+            result = fn()
+        except Exception as e:
+            self._finish(key, None, f"{e.__class__.__name__}: {e}", _error_type(e))
+            raise
+        self._finish(key, serialize(result), None)
+        return result
+
+    async def _arun_shared(self, key: str, fn: Callable[[], Awaitable], serialize: Callable[[Any], str],
+                           deserialize: Callable[[str], Any]) -> Any:
+        if not self.path:
+            self._count('leaders')
+            return await fn()
+        deadline = time.monotonic() + self.wait_timeout
+        state, payload = await asyncio.to_thread(self._claim, key, False)
+        if state == _FOLLOW:
+            self._count('coalesced_shared')
+        while state == _FOLLOW:
+            if time.monotonic() >= deadline:
+                self._count('timeouts')
+                raise SingleFlightTimeoutException(
+                    f"Timed out after {self.wait_timeout}s waiting for another worker's scrape of {key}")
+            await asyncio.sleep(self.poll_interval)
+            state, payload = await asyncio.to_thread(self._claim, key, True)
+        if state == _DONE:
+            return self._replay(payload, deserialize)
+        self._count('leaders')
+        try:
+            result = await fn()
+        except Exception as e:
+            await asyncio.to_thread(self._finish, key, None, f"{e.__class__.__name__}: {e}", _error_type(e))
+            raise
+        await asyncio.to_thread(self._finish, key, serialize(result), None)
+        return result
+
+    def _claim(self, key: str, following: bool) -> Tuple[str, Optional[_Outcome]]:
+        """
+        Decide, atomically across processes, whether to lead, follow or reuse a finished run of `key`.
+
+        Returns:
+            Tuple[str, Optional[_Outcome]]: The decision and, for a finished run, its serialized
+            result, error and error type. A failed run is only handed to callers that were
+            already waiting for it; later callers start a new one.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT owner, lease_until, result, error, error_type, finished_at FROM flights "
+                               "WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                owner, lease_until, result, error, error_type, finished_at = row
+                if finished_at is not None and (following or (error is None and now - finished_at <= self.result_ttl)):
+                    return _DONE, (result, error, error_type)
+                if finished_at is None and lease_until > now:
+                    return _FOLLOW, None
+                if finished_at is None:
+                    self._count('takeovers')
+                    logger.warning({'log': f"Taking over {key} from {owner}, whose lease has lapsed"})
+            conn.execute("INSERT OR REPLACE INTO flights (key, owner, lease_until, result, error, error_type, finished_at) "
+                         "VALUES (?, ?, ?, NULL, NULL, NULL, NULL)", (key, self.owner, now + self.lease))
+            return _LEAD, None
+
+    def _finish(self, key: str, result: Optional[str], error: Optional[str],
+                error_type: Optional[str] = None) -> None:
+        now = time.time()
+        try:
+            with self._transaction() as conn:
+                conn.execute("UPDATE flights SET result = ?, error = ?, error_type = ?, finished_at = ? "
+                             "WHERE key = ? AND owner = ?", (result, error, error_type, now, key, self.owner))
+                conn.execute("DELETE FROM flights WHERE finished_at < ?", (now - max(self.result_ttl, self.lease),))
+        except sqlite3.Error:
+            # Waiters in other workers take over once the lease lapses.
+            logger.exception({'log': f"Could not publish the result of {key}"})
+
+    def _replay(self, payload: _Outcome, deserialize: Callable[[str], Any]) -> Any:
+        result, error, error_type = payload
+        self._count('served_shared')
+        if error is not None:
+            raise _REPLAYED_ERRORS.get(error_type, ValueError)(error)
+        return deserialize(result)
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def _error_type(error: BaseException) -> Optional[str]:
+    """
+    Name of the first error in `error`'s cause chain that other workers re-raise as itself.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if error.__class__.__name__ in _REPLAYED_ERRORS:
+            return error.__class__.__name__
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """
+    Return the process-wide single-flight coordinator, or None when coalescing is disabled.
+    """
+    global _single_flight
+    if not SINGLE_FLIGHT_ENABLED:
+        return None
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight(SINGLE_FLIGHT_PATH if SINGLE_FLIGHT_SHARED else None)
+            MetricsService.register('single_flight', _single_flight.stats)
+        return _single_flight